@@ -1,12 +1,19 @@
 import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
 import copy
+import hashlib
+from itertools import izip
+import mmap
 import os
+from struct import Struct
+import weakref
 from zlib import crc32
 
 from coilsnake.exceptions.common.exceptions import OutOfBoundsError, InvalidArgumentError, \
     NotEnoughUnallocatedSpaceError, FileAccessError, CouldNotAllocateError
-from coilsnake.util.common.assets import open_asset
-from coilsnake.util.common.yml import yml_load
+from coilsnake.util.common.assets import load_asset_index
+from coilsnake.util.common.cache import get_cache_filename, load_pickle, save_pickle
 
 
 def check_range_validity(range, size):
@@ -17,10 +24,95 @@ def check_range_validity(range, size):
         raise OutOfBoundsError("Invalid range[(%#x,%#x)] provided" % (begin, end))
 
 
+_UINT16 = Struct("<H")
+_UINT32 = Struct("<I")
+
+
+def _read_multi(data, offset, size):
+    """Reads a little-endian unsigned integer of the given size from an array of bytes."""
+    if size == 1:
+        return data[offset]
+    elif size == 2:
+        return _UINT16.unpack_from(data, offset)[0]
+    elif size == 3:
+        return _UINT16.unpack_from(data, offset)[0] | (data[offset + 2] << 16)
+    elif size == 4:
+        return _UINT32.unpack_from(data, offset)[0]
+
+    out = 0
+    bit_offset = 0
+    for byte in data[offset:offset + size]:
+        out |= byte << bit_offset
+        bit_offset += 8
+    return out
+
+
+def _write_multi(data, offset, item, size):
+    """Writes the lowest bytes of an integer to an array of bytes in little-endian order."""
+    if size == 1:
+        data[offset] = item & 0xff
+    elif size == 2:
+        _UINT16.pack_into(data, offset, item & 0xffff)
+    elif size == 3:
+        _UINT16.pack_into(data, offset, item & 0xffff)
+        data[offset + 2] = (item >> 16) & 0xff
+    elif size == 4:
+        _UINT32.pack_into(data, offset, item & 0xffffffff)
+    else:
+        for i in xrange(offset, offset + size):
+            data[i] = item & 0xff
+            item >>= 8
+
+
 class Block(object):
+    # The views of this block's data which have not yet made their own copy of the data, keyed by their ids
+    _views = None
+    # The (begin, end) ranges written to while writes are being recorded, or None when they are not
+    _written_ranges = None
+
     def __init__(self, size=0):
         self.reset(size)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_views", None)
+        return state
+
+    def _add_view(self, view):
+        if self._views is None:
+            self._views = dict()
+        views = self._views
+        view_id = id(view)
+        views[view_id] = weakref.ref(view, lambda ref: views.pop(view_id, None))
+
+    def _detach_views(self):
+        """Makes each view of this block's data take its own copy of the data, so that they are not affected when
+        this block's data is changed."""
+        views, self._views = self._views, None
+        for view_ref in views.values():
+            view = view_ref()
+            if view is not None:
+                view._detach()
+
+    def start_recording_writes(self):
+        """Starts recording the ranges of this block which are written to, including those written with values which
+        are the same as before."""
+        self._written_ranges = []
+
+    def stop_recording_writes(self):
+        """Stops recording the ranges of this block which are written to.
+        :return: a sorted list of the non-overlapping (begin, end) ranges which were written to since recording
+        started, where end is exclusive"""
+        written_ranges, self._written_ranges = sorted(self._written_ranges or []), None
+        merged_ranges = []
+        for begin, end in written_ranges:
+            if merged_ranges and begin <= merged_ranges[-1][1]:
+                if end > merged_ranges[-1][1]:
+                    merged_ranges[-1] = (merged_ranges[-1][0], end)
+            else:
+                merged_ranges.append((begin, end))
+        return merged_ranges
+
     def __enter__(self):
         return self
 
@@ -59,18 +151,52 @@ class Block(object):
             size = block.size - offset
         with block[offset:offset + size] as sub_block:
             self.size = sub_block.size
-            self.data = sub_block.data
+            self.data = sub_block.to_array_copy()
 
     def to_file(self, filename):
         with open(filename, 'wb') as f:
             self.data.tofile(f)
 
+    def write_back_to_file(self, filename):
+        """Writes this block to a file which may already contain an older version of it.
+        If the file is the same size as this block, it is memory mapped and only the pages whose contents differ are
+        rewritten, otherwise the whole file is rewritten.
+        :return: the number of bytes which were rewritten"""
+        try:
+            file_size = os.path.getsize(filename)
+        except OSError:
+            file_size = None
+        if file_size != self.size or self.size == 0:
+            self.to_file(filename)
+            return self.size
+
+        num_bytes_written = 0
+        try:
+            with open(filename, 'r+b') as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE)
+                try:
+                    for page_begin in xrange(0, self.size, mmap.PAGESIZE):
+                        page_end = min(page_begin + mmap.PAGESIZE, self.size)
+                        page = str(buffer(self.data, page_begin, page_end - page_begin))
+                        if mapping[page_begin:page_end] != page:
+                            mapping[page_begin:page_end] = page
+                            num_bytes_written += page_end - page_begin
+                    mapping.flush()
+                finally:
+                    mapping.close()
+        except (IOError, OSError, mmap.error):
+            raise FileAccessError("Could not access file[%s]" % filename)
+        return num_bytes_written
+
     def to_list(self):
         return self.data.tolist()
 
     def to_array(self):
         return self.data
 
+    def to_array_copy(self):
+        return self.data[:]
+
     def to_block(self, block, offset=0):
         self[offset:offset + block.size] = block
 
@@ -83,12 +209,7 @@ class Block(object):
             raise OutOfBoundsError("Attempted to read size[%d] bytes from offset[%#x], which is out of bounds in this "
                                    "block of size[%#x]" % (size, key, self.size))
         else:
-            out = 0
-            bit_offset = 0
-            for byte in self.data[key:key + size]:
-                out |= byte << bit_offset
-                bit_offset += 8
-            return out
+            return _read_multi(self.data, key, size)
 
     def write_multi(self, key, item, size):
         if size < 0:
@@ -99,9 +220,30 @@ class Block(object):
         elif size == 0:
             return
         else:
-            for i in xrange(key, key+size):
-                self.data[i] = item & 0xff
-                item >>= 8
+            if self._views:
+                self._detach_views()
+            if self._written_ranges is not None:
+                self._written_ranges.append((key, key + size))
+            _write_multi(self.data, key, item, size)
+
+    def read_struct(self, struct, key):
+        """Unpacks a precompiled struct.Struct from this block's data at the given offset.
+        :return: a tuple of the unpacked values"""
+        if (key < 0) or (key + struct.size > self.size):
+            raise OutOfBoundsError("Attempted to read size[%d] bytes from offset[%#x], which is out of bounds in this "
+                                   "block of size[%#x]" % (struct.size, key, self.size))
+        return struct.unpack_from(self.data, key)
+
+    def write_struct(self, struct, key, values):
+        """Packs values into this block's data at the given offset using a precompiled struct.Struct."""
+        if (key < 0) or (key + struct.size > self.size):
+            raise OutOfBoundsError("Attempted to write size[%d] bytes to offset[%#x], which is out of bounds in this "
+                                   "block of size[%#x]" % (struct.size, key, self.size))
+        if self._views:
+            self._detach_views()
+        if self._written_ranges is not None:
+            self._written_ranges.append((key, key + struct.size))
+        struct.pack_into(self.data, key, *values)
 
     def __getitem__(self, key):
         if isinstance(key, slice):
@@ -111,9 +253,7 @@ class Block(object):
                 raise OutOfBoundsError("Attempted to read from range (%#x,%#x) which is out of bounds" % (key.start,
                                                                                                           key.stop - 1))
             else:
-                out = Block()
-                out.from_array(self.data[key])
-                return out
+                return BlockView(self, key.start, key.stop - key.start)
         elif isinstance(key, int):
             if key >= self.size:
                 raise OutOfBoundsError("Attempted to read at offset[%#x] which is out of bounds" % key)
@@ -123,12 +263,16 @@ class Block(object):
             raise TypeError("Argument \"key\" had invalid type of %s" % type(key).__name__)
 
     def __setitem__(self, key, item):
+        if self._views:
+            self._detach_views()
         if isinstance(key, int) and isinstance(item, (int, long)):
             if item < 0 or item > 0xff:
                 raise InvalidArgumentError("Could not write invalid value[%d] as a single byte" % item)
             if key >= self.size:
                 raise OutOfBoundsError("Attempted to write to offset[%#x] which is out of bounds" % key)
             else:
+                if self._written_ranges is not None:
+                    self._written_ranges.append((key, key + 1))
                 self.data[key] = item
         elif isinstance(key, slice) and \
                 (isinstance(item, list) or isinstance(item, array.array) or isinstance(item, Block)):
@@ -143,6 +287,8 @@ class Block(object):
             elif (key.stop - key.start) == 0:
                 raise InvalidArgumentError("Attempted to write data of size 0")
             else:
+                if self._written_ranges is not None:
+                    self._written_ranges.append((key.start, key.stop))
                 if isinstance(item, list):
                     self.data[key] = array.array('B', item)
                 elif isinstance(item, array.array):
@@ -168,70 +314,292 @@ class Block(object):
         return crc32(self.data)
 
 
+class BlockView(Block):
+    """A view of part of another block's data, which is created without copying the data.
+    The view makes its own copy of the data the first time that either it or the block which it views is written to,
+    or when its data array is accessed directly, so it behaves just like a copy of that part of the block."""
+
+    def __init__(self, block, offset, size):
+        if isinstance(block, BlockView) and block._source is not None:
+            offset += block._offset
+            block = block._block
+        self._block = block
+        self._source = block.data
+        self._offset = offset
+        self._data = None
+        self.size = size
+        block._add_view(self)
+
+    def __getstate__(self):
+        self._detach()
+        state = super(BlockView, self).__getstate__()
+        state["_block"] = None
+        return state
+
+    def _detach(self):
+        if self._source is not None:
+            self._data = self._source[self._offset:self._offset + self.size]
+            self._source = None
+            self._block = None
+
+    @property
+    def data(self):
+        self._detach()
+        if self._data is None:
+            raise AttributeError("data")
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._source = None
+        self._block = None
+        self._data = value
+
+    @data.deleter
+    def data(self):
+        self._source = None
+        self._block = None
+        self._data = None
+
+    def to_list(self):
+        if self._source is None:
+            return super(BlockView, self).to_list()
+        return self._source[self._offset:self._offset + self.size].tolist()
+
+    def to_array_copy(self):
+        if self._source is None:
+            return super(BlockView, self).to_array_copy()
+        return self._source[self._offset:self._offset + self.size]
+
+    def read_multi(self, key, size):
+        if self._source is None or size <= 0 or key < 0 or key + size > self.size:
+            return super(BlockView, self).read_multi(key, size)
+        return _read_multi(self._source, self._offset + key, size)
+
+    def read_struct(self, struct, key):
+        if self._source is None or key < 0 or key + struct.size > self.size:
+            return super(BlockView, self).read_struct(struct, key)
+        return struct.unpack_from(self._source, self._offset + key)
+
+    def __getitem__(self, key):
+        if self._source is None:
+            return super(BlockView, self).__getitem__(key)
+        elif isinstance(key, int) and 0 <= key < self.size:
+            return self._source[self._offset + key]
+        return super(BlockView, self).__getitem__(key)
+
+    def __eq__(self, other):
+        return (isinstance(other, Block)) and (self.to_array_copy() == other.to_array_copy())
+
+
+AllocationStatistics = namedtuple("AllocationStatistics", ["num_unallocated_ranges", "unallocated_size",
+                                                           "largest_unallocated_size", "fragmentation"])
+
+
+class FirstFitAllocationPolicy(object):
+    """Allocates data at the lowest address where it fits."""
+    NAME = "first-fit"
+    # Whether allocated data must fit entirely inside of a single bank
+    WITHIN_BANK = False
+
+    def choose(self, candidates):
+        for index, offset, available_size in candidates:
+            return index, offset
+        return None
+
+
+class BestFitAllocationPolicy(FirstFitAllocationPolicy):
+    """Allocates data in the smallest unallocated range in which it fits, preferring lower addresses."""
+    NAME = "best-fit"
+
+    def choose(self, candidates):
+        best_candidate = None
+        for candidate in candidates:
+            if best_candidate is None or candidate[2] < best_candidate[2]:
+                best_candidate = candidate
+        return best_candidate[:2] if best_candidate else None
+
+
+class BankBestFitAllocationPolicy(BestFitAllocationPolicy):
+    """Allocates data in the smallest part of an unallocated range which lies inside of a single bank, so that no
+    allocation ever crosses a bank boundary."""
+    NAME = "bank-best-fit"
+    WITHIN_BANK = True
+
+
+ALLOCATION_POLICIES = dict((policy.NAME, policy) for policy in [FirstFitAllocationPolicy(),
+                                                                 BestFitAllocationPolicy(),
+                                                                 BankBestFitAllocationPolicy()])
+
+
+class _UnallocatedSizeIndex(object):
+    """An index of the unallocated ranges of a block, used to skip over ranges which are too small for an allocation.
+    The block's addresses are split into buckets of a fixed size, and a tree of maximums holds the size of the largest
+    unallocated range which begins in each bucket. Finding the next bucket with a large enough range takes O(log n)
+    time, and the index stays valid when ranges are inserted or removed since the buckets never move."""
+
+    BUCKET_SIZE_BITS = 8
+
+    def __init__(self, begins, ends, size):
+        self.size = size
+        num_buckets = max(1, (size + (1 << self.BUCKET_SIZE_BITS) - 1) >> self.BUCKET_SIZE_BITS)
+        self.num_leaves = 1 << (num_buckets - 1).bit_length()
+        self.tree = [0] * (2 * self.num_leaves)
+        self.update(begins, ends, 0, size - 1)
+
+    def update(self, begins, ends, first_address, last_address):
+        """Recomputes the buckets containing the given addresses, after the ranges beginning in them have changed."""
+        tree, num_leaves = self.tree, self.num_leaves
+        first_bucket = first_address >> self.BUCKET_SIZE_BITS
+        last_bucket = min(last_address >> self.BUCKET_SIZE_BITS, num_leaves - 1)
+        if first_bucket > last_bucket:
+            return
+
+        tree[num_leaves + first_bucket:num_leaves + last_bucket + 1] = [0] * (last_bucket - first_bucket + 1)
+        for i in xrange(bisect_left(begins, first_bucket << self.BUCKET_SIZE_BITS),
+                        bisect_left(begins, (last_bucket + 1) << self.BUCKET_SIZE_BITS)):
+            node = num_leaves + (begins[i] >> self.BUCKET_SIZE_BITS)
+            range_size = ends[i] - begins[i] + 1
+            if range_size > tree[node]:
+                tree[node] = range_size
+
+        first_node, last_node = num_leaves + first_bucket, num_leaves + last_bucket
+        while first_node > 1:
+            first_node >>= 1
+            last_node >>= 1
+            for node in xrange(first_node, last_node + 1):
+                tree[node] = max(tree[2 * node], tree[2 * node + 1])
+
+    def find(self, bucket, size):
+        """Returns the first bucket, starting at the given one, in which a range of at least the given size begins, or
+        None if there is none."""
+        tree = self.tree
+        if bucket >= self.num_leaves:
+            return None
+        node = self.num_leaves + bucket
+        if tree[node] < size:
+            # Climb until there is a subtree to the right which holds a large enough range
+            while True:
+                if node == 1:
+                    return None
+                elif (node & 1) == 0 and tree[node + 1] >= size:
+                    node += 1
+                    break
+                node >>= 1
+            # Descend to the leftmost bucket in that subtree which holds a large enough range
+            while node < self.num_leaves:
+                node <<= 1
+                if tree[node] < size:
+                    node += 1
+        return node - self.num_leaves
+
+    def get_bucket_range(self, bucket):
+        """Returns the first address in a bucket and the first address after it."""
+        return bucket << self.BUCKET_SIZE_BITS, (bucket + 1) << self.BUCKET_SIZE_BITS
+
+
 class AllocatableBlock(Block):
+    allocation_policy = ALLOCATION_POLICIES["first-fit"]
+    # Whether allocate_all places data largest-first with allocate_batch, rather than one piece at a time in order
+    batch_allocation = False
+    # The index of the unallocated ranges, which is created when it is first needed
+    _size_index = None
+
+    # Adjacent unallocated ranges are only merged if they are in the same bank, so that a single allocation never
+    # crosses a bank boundary
+    BANK_SIZE = 0x10000
+
     def reset(self, size=0):
         super(AllocatableBlock, self).reset(size)
-        self.unallocated_ranges = []
+        # The unallocated ranges are stored as two sorted lists of their beginnings and ends
+        self._unallocated_begins = []
+        self._unallocated_ends = []
+        self._size_index = None
+
+    @property
+    def unallocated_ranges(self):
+        return zip(self._unallocated_begins, self._unallocated_ends)
+
+    @unallocated_ranges.setter
+    def unallocated_ranges(self, ranges):
+        # Overlapping and adjacent ranges are merged just as they would be by deallocate
+        begins, ends = [], []
+        for begin, end in sorted(ranges):
+            if ends and (begin <= ends[-1] or (begin == ends[-1] + 1 and begin % self.BANK_SIZE != 0)):
+                ends[-1] = max(ends[-1], end)
+            else:
+                begins.append(begin)
+                ends.append(end)
+        self._unallocated_begins = begins
+        self._unallocated_ends = ends
+        self._size_index = None
+
+    def _get_size_index(self):
+        if self._size_index is None or self._size_index.size != self.size:
+            self._size_index = _UnallocatedSizeIndex(self._unallocated_begins, self._unallocated_ends, self.size)
+        return self._size_index
+
+    def _update_size_index(self, first_address, last_address):
+        """Updates the index after the unallocated ranges beginning between the given addresses have changed."""
+        if self._size_index is not None:
+            if self._size_index.size == self.size:
+                self._size_index.update(self._unallocated_begins, self._unallocated_ends, first_address,
+                                        last_address)
+            else:
+                self._size_index = None
+
+    def _get_index_of_range_containing(self, offset):
+        i = bisect_right(self._unallocated_begins, offset) - 1
+        if i >= 0 and self._unallocated_ends[i] >= offset:
+            return i
+        return None
 
     def get_unallocated_portions_of_range(self, input_range):
         check_range_validity(input_range, self.size)
 
         input_begin, input_end = input_range
+        portions = []
 
-        for unallocated_begin, unallocated_end in self.unallocated_ranges:
-            if unallocated_begin <= input_begin <= unallocated_end:
-                if unallocated_end >= input_end:
-                    return [input_range]
-                else:
-                    return ([(input_begin, unallocated_end)] +
-                            self.get_unallocated_portions_of_range((unallocated_end + 1, input_end)))
-            elif input_begin <= unallocated_begin <= input_end:
-                if input_end <= unallocated_end:
-                    return (self.get_unallocated_portions_of_range((input_begin, unallocated_begin - 1)) +
-                            [(unallocated_begin, input_end)])
-                else:
-                    return (self.get_unallocated_portions_of_range((input_begin, unallocated_begin - 1)) +
-                            [(unallocated_begin, unallocated_end)] +
-                            self.get_unallocated_portions_of_range((unallocated_end + 1, input_end)))
-        return []
+        i = bisect_right(self._unallocated_begins, input_begin) - 1
+        if i < 0 or self._unallocated_ends[i] < input_begin:
+            i += 1
+        while i < len(self._unallocated_begins) and self._unallocated_begins[i] <= input_end:
+            portions.append((max(input_begin, self._unallocated_begins[i]),
+                             min(input_end, self._unallocated_ends[i])))
+            i += 1
+        return portions
 
     def mark_allocated(self, used_range):
         check_range_validity(used_range, self.size)
 
         allocated_begin, allocated_end = used_range
-        for i in range(len(self.unallocated_ranges)):
-            a = self.unallocated_ranges[i]
-            begin, end = a
-            if allocated_begin == begin:
-                if allocated_end < end:
-                    self.unallocated_ranges[i] = (allocated_end + 1, end)
-                elif allocated_end == end:
-                    del (self.unallocated_ranges[i])
-                else:  # allocated_end > end
-                    del (self.unallocated_ranges[i])
-                    self.mark_allocated((end + 1, allocated_end))
-                return
-            elif (allocated_begin > begin) and (allocated_end <= end):
-                self.unallocated_ranges[i] = (begin, allocated_begin - 1)
-                if allocated_end != end:
-                    self.unallocated_ranges.insert(i, (allocated_end + 1, end))
-                    self.unallocated_ranges.sort()
-                return
-            elif (allocated_begin > begin) and (allocated_begin < end) and (allocated_end > end):
-                self.unallocated_ranges[i] = (begin, allocated_begin - 1)
-                self.mark_allocated((end + 1, allocated_end))
-                return
-        raise CouldNotAllocateError("Couldn't mark range (%#x,%#x) as allocated because it is at least "
-                                    "partially already allocated" % (allocated_begin, allocated_end))
+
+        # The range may span multiple unallocated ranges, but only if there are no allocated gaps between them
+        first = self._get_index_of_range_containing(allocated_begin)
+        last = self._get_index_of_range_containing(allocated_end)
+        if first is None or last is None or any(self._unallocated_ends[i] + 1 != self._unallocated_begins[i + 1]
+                                                 for i in xrange(first, last)):
+            raise CouldNotAllocateError("Couldn't mark range (%#x,%#x) as allocated because it is at least "
+                                        "partially already allocated" % (allocated_begin, allocated_end))
+
+        first_begin = self._unallocated_begins[first]
+        remaining_begins, remaining_ends = [], []
+        if first_begin < allocated_begin:
+            remaining_begins.append(first_begin)
+            remaining_ends.append(allocated_begin - 1)
+        if self._unallocated_ends[last] > allocated_end:
+            remaining_begins.append(allocated_end + 1)
+            remaining_ends.append(self._unallocated_ends[last])
+        self._unallocated_begins[first:last + 1] = remaining_begins
+        self._unallocated_ends[first:last + 1] = remaining_ends
+        self._update_size_index(first_begin, allocated_end + 1)
 
     def is_unallocated(self, range):
         check_range_validity(range, self.size)
 
         search_begin, search_end = range
-        for begin, end in self.unallocated_ranges:
-            if (search_begin >= begin) and (search_end <= end):
-                return True
-        return False
+        i = self._get_index_of_range_containing(search_begin)
+        return (i is not None) and (search_end <= self._unallocated_ends[i])
 
     def is_allocated(self, range):
         return not self.is_unallocated(range)
@@ -239,13 +607,63 @@ class AllocatableBlock(Block):
     def deallocate(self, range):
         check_range_validity(range, self.size)
 
-        # TODO do some check so that unallocated ranges don't overlap
-        # TODO attach contiguous unallocated ranges if possible
-
-        self.unallocated_ranges.append(range)
-        self.unallocated_ranges.sort()
-
-    def allocate(self, data=None, size=None, can_write_to=None):
+        begin, end = range
+
+        # Find all ranges which overlap or are adjacent to the deallocated range
+        first = bisect_left(self._unallocated_ends, begin - 1)
+        last = bisect_right(self._unallocated_begins, end + 1)
+
+        # Adjacent ranges which are in a different bank are kept separate
+        if first < last and self._unallocated_ends[first] == begin - 1 and begin % self.BANK_SIZE == 0:
+            first += 1
+        if first < last and self._unallocated_begins[last - 1] == end + 1 and (end + 1) % self.BANK_SIZE == 0:
+            last -= 1
+
+        last_begin = begin
+        if first < last:
+            last_begin = max(begin, self._unallocated_begins[last - 1])
+            begin = min(begin, self._unallocated_begins[first])
+            end = max(end, self._unallocated_ends[last - 1])
+        self._unallocated_begins[first:last] = [begin]
+        self._unallocated_ends[first:last] = [end]
+        self._update_size_index(begin, last_begin)
+
+    def _get_allocation_candidates(self, size, can_write_to, within_bank):
+        """Yields an (index, offset, available size) tuple for each place in which data of the given size could be
+        allocated, in order of address. The can_write_to predicate is tested at the beginning of each unallocated range
+        and at the beginning of each bank inside of it. Ranges which are too small are skipped using the index."""
+        begins, ends = self._unallocated_begins, self._unallocated_ends
+        size_index = self._get_size_index()
+        bucket = size_index.find(0, size)
+        while bucket is not None:
+            bucket_begin, bucket_end = size_index.get_bucket_range(bucket)
+            for i in xrange(bisect_left(begins, bucket_begin), bisect_left(begins, bucket_end)):
+                begin, end = begins[i], ends[i]
+                offset = begin
+                while offset + size - 1 <= end:
+                    bank_end = offset | (self.BANK_SIZE - 1)
+                    available_size = (min(end, bank_end) if within_bank else end) - offset + 1
+                    if (available_size >= size) and ((can_write_to is None) or can_write_to(offset)):
+                        yield i, offset, available_size
+                        if not within_bank:
+                            break
+                    offset = bank_end + 1
+            bucket = size_index.find(bucket + 1, size)
+
+    def _mark_allocated_in_range(self, index, offset, size):
+        begin, end = self._unallocated_begins[index], self._unallocated_ends[index]
+        remaining_begins, remaining_ends = [], []
+        if begin < offset:
+            remaining_begins.append(begin)
+            remaining_ends.append(offset - 1)
+        if offset + size - 1 < end:
+            remaining_begins.append(offset + size)
+            remaining_ends.append(end)
+        self._unallocated_begins[index:index + 1] = remaining_begins
+        self._unallocated_ends[index:index + 1] = remaining_ends
+        self._update_size_index(begin, offset + size)
+
+    def allocate(self, data=None, size=None, can_write_to=None, policy=None):
         if data is None and size is None:
             raise InvalidArgumentError("Insufficient parameters provided")
 
@@ -257,34 +675,68 @@ class AllocatableBlock(Block):
         if size <= 0:
             raise InvalidArgumentError("Cannot allocate a range of size[%d]" % size)
 
-        # First find a free range
-        allocated_range = None
-        for i in xrange(0, len(self.unallocated_ranges)):
-            begin, end = self.unallocated_ranges[i]
-            if size <= end - begin + 1:
-                if (can_write_to is not None) and (not can_write_to(begin)):
-                    continue
-
-                if begin + size - 1 == end:
-                    # Used up the entire free range
-                    del (self.unallocated_ranges[i])
-                else:
-                    self.unallocated_ranges[i] = (begin + size, end)
-
-                allocated_range = (begin, begin + size - 1)
-                break
+        if policy is None:
+            policy = self.allocation_policy
 
-        if allocated_range is None:
+        # First find a free range
+        chosen = policy.choose(self._get_allocation_candidates(size, can_write_to, policy.WITHIN_BANK))
+        if chosen is None:
             raise NotEnoughUnallocatedSpaceError("Not enough free space left")
+        index, offset = chosen
+        self._mark_allocated_in_range(index, offset, size)
 
         if data is not None:
-            self[allocated_range[0]:allocated_range[1] + 1] = data
-
-        return allocated_range[0]
+            self[offset:offset + size] = data
+
+        return offset
+
+    def allocate_batch(self, data_list=None, sizes=None, can_write_to=None, policy=None):
+        """Allocates several pieces of data at once, placing the largest ones first so that they are less likely to
+        be left without a range large enough to fit them.
+        If any of the pieces of data can't be allocated, none of them are.
+        :param data_list: a list of the data to allocate, or None if only sizes are given
+        :param sizes: a list of the sizes to allocate, or None to use the sizes of the data
+        :return: a list of the offsets at which each piece of data was allocated, in the order they were given"""
+        if data_list is None and sizes is None:
+            raise InvalidArgumentError("Insufficient parameters provided")
+        if sizes is None:
+            sizes = [len(data) for data in data_list]
+        elif data_list is not None and len(data_list) != len(sizes):
+            raise InvalidArgumentError("Parameter sizes[%d] and data_list's size[%d] differ" % (len(sizes),
+                                                                                                len(data_list)))
+
+        unallocated_begins, unallocated_ends = list(self._unallocated_begins), list(self._unallocated_ends)
+        offsets = [None] * len(sizes)
+        overwritten_data = []
+        try:
+            for i in sorted(xrange(len(sizes)), key=lambda x: sizes[x], reverse=True):
+                offsets[i] = self.allocate(size=sizes[i], can_write_to=can_write_to, policy=policy)
+
+            if data_list is not None:
+                for offset, data in izip(offsets, data_list):
+                    overwritten_data.append((offset, self.to_array()[offset:offset + len(data)]))
+                    self[offset:offset + len(data)] = data
+        except:
+            for offset, data in reversed(overwritten_data):
+                self[offset:offset + len(data)] = data
+            self._unallocated_begins, self._unallocated_ends = unallocated_begins, unallocated_ends
+            self._size_index = None
+            raise
+        return offsets
+
+    def allocate_all(self, data_list, can_write_to=None):
+        """Allocates several pieces of data which don't depend on where each other are placed. If batch_allocation is
+        enabled they are allocated together with allocate_batch, otherwise they are allocated one at a time in the
+        order given.
+        :param data_list: a list of the data to allocate
+        :return: a list of the offsets at which each piece of data was allocated, in the order they were given"""
+        if self.batch_allocation:
+            return self.allocate_batch(data_list=data_list, can_write_to=can_write_to)
+        return [self.allocate(data=data, can_write_to=can_write_to) for data in data_list]
 
     def get_largest_unallocated_range(self):
         largest_begin, largest_end = 1, 0
-        for begin, end in self.unallocated_ranges:
+        for begin, end in izip(self._unallocated_begins, self._unallocated_ends):
             if end - begin > largest_end - largest_begin:
                 largest_begin = begin
                 largest_end = end
@@ -292,89 +744,246 @@ class AllocatableBlock(Block):
             raise NotEnoughUnallocatedSpaceError("Not enough free space left")
         return largest_begin, largest_end
 
+    def get_allocation_statistics(self):
+        """Returns statistics about how fragmented the unallocated space in this block is.
+        The fragmentation is the fraction of the unallocated space which lies outside of the largest unallocated range,
+        ranging from 0 (all unallocated space is contiguous) to nearly 1."""
+        return _get_allocation_statistics([end - begin + 1 for begin, end in izip(self._unallocated_begins,
+                                                                                  self._unallocated_ends)])
+
+    def get_allocation_statistics_by_bank(self):
+        """Returns a dict mapping the number of each bank which contains unallocated space to the allocation
+        statistics of that bank. Unallocated ranges which cross a bank boundary are counted as separate ranges."""
+        sizes_by_bank = dict()
+        for begin, end in izip(self._unallocated_begins, self._unallocated_ends):
+            while begin <= end:
+                bank_end = min(end, begin | (self.BANK_SIZE - 1))
+                sizes_by_bank.setdefault(begin // self.BANK_SIZE, []).append(bank_end - begin + 1)
+                begin = bank_end + 1
+        return dict((bank, _get_allocation_statistics(sizes)) for bank, sizes in sizes_by_bank.iteritems())
+
+
+def _get_allocation_statistics(sizes):
+    unallocated_size = sum(sizes)
+    largest_unallocated_size = max(sizes) if sizes else 0
+    if unallocated_size == 0:
+        fragmentation = 0.0
+    else:
+        fragmentation = 1.0 - float(largest_unallocated_size) / unallocated_size
+    return AllocationStatistics(num_unallocated_ranges=len(sizes),
+                                unallocated_size=unallocated_size,
+                                largest_unallocated_size=largest_unallocated_size,
+                                fragmentation=fragmentation)
+
+
+def get_rom_type_map():
+    """Returns an AssetIndex of the ROM types in romtypes.yml, keyed on their names."""
+    return load_asset_index(["romtypes.yml"])
 
-with open_asset("romtypes.yml") as f:
-    ROM_TYPE_MAP = yml_load(f)
 
 ROM_TYPE_NAME_UNKNOWN = "Unknown"
 
+# The size of the copier header at the beginning of some SNES ROM files
+SNES_COPIER_HEADER_SIZE = 0x200
+
+# The offsets of the internal checksum complement and checksum in unheadered HiROM and LoROM images
+_SNES_CHECKSUM_OFFSETS = [0xffdc, 0x7fdc]
+
+
+def _get_rom_type_detection_size():
+    """Returns the number of bytes at the beginning of a ROM file which need to be read in order to detect its type."""
+    return max([SNES_COPIER_HEADER_SIZE + max(_SNES_CHECKSUM_OFFSETS) + 4] +
+               [SNES_COPIER_HEADER_SIZE + d['offset'] + len(d['data']) for d in get_rom_type_map().itervalues()])
+
+
+_ROM_FILE_READ_CHUNK_SIZE = 0x100000
+
+
+def _detect_rom_type(data):
+    """Detects the type of a ROM from the beginning of its data.
+    :param data: an array of at least the first _get_rom_type_detection_size() bytes of the ROM file, or of the whole file
+    if it is smaller than that
+    :return: a tuple of the name of the ROM's type and the size of its copier header"""
+    size = len(data)
+    valid_checksums = dict()
+
+    def has_valid_checksum_at(offset):
+        if offset not in valid_checksums:
+            valid_checksums[offset] = (offset + 4 <= size) \
+                and (~data[offset] & 0xff == data[offset + 2]) \
+                and (~data[offset + 1] & 0xff == data[offset + 3])
+        return valid_checksums[offset]
+
+    def has_data_at(offset, expected_data):
+        return (offset + len(expected_data) <= size) and (data[offset:offset + len(expected_data)].tolist() ==
+                                                          expected_data)
+
+    for type_name, d in get_rom_type_map().iteritems():
+        offset, expected_data, platform = d['offset'], d['data'], d['platform']
+
+        if platform == "SNES":
+            # Validate the ROM and check if it's headered, checking for HiROM before LoROM
+            for header_size in [0, SNES_COPIER_HEADER_SIZE]:
+                for checksum_offset in _SNES_CHECKSUM_OFFSETS:
+                    if has_valid_checksum_at(checksum_offset + header_size) \
+                            and has_data_at(offset + header_size, expected_data):
+                        return type_name, header_size
+        elif has_data_at(offset, expected_data):
+            return type_name, 0
+    return ROM_TYPE_NAME_UNKNOWN, 0
+
+
+RomFileInfo = namedtuple("RomFileInfo", ["type", "header_size", "md5_digests"])
+
+# Increment this whenever the format of RomFileInfo changes, so that old caches are not reused
+ROM_FILE_INFO_CACHE_VERSION = 1
+
+
+class RomFileInfoCache(object):
+    """A persistent cache of the type, copier header size, and MD5 digests of each ROM file which has been loaded,
+    keyed on the file's absolute path, size, and modification time."""
+
+    def __init__(self, filename=None):
+        """
+        :param filename: the file in which the cache is stored, or None to store it in the shared cache directory
+        """
+        self.filename = filename
+        self._entries = None
+
+    def _get_filename(self):
+        return self.filename or get_cache_filename("romfiles.pickle")
+
+    def _load(self):
+        cache = load_pickle(self._get_filename())
+        if isinstance(cache, dict) and cache.get("version") == ROM_FILE_INFO_CACHE_VERSION:
+            return cache["entries"]
+        return dict()
+
+    @staticmethod
+    def _get_key(rom_filename):
+        stat = os.stat(rom_filename)
+        return os.path.abspath(rom_filename), stat.st_size, stat.st_mtime
+
+    def get(self, rom_filename):
+        """Returns the RomFileInfo of a ROM file if it has not changed since it was cached, or None."""
+        if self._entries is None:
+            self._entries = self._load()
+        try:
+            return self._entries.get(self._get_key(rom_filename))
+        except OSError:
+            return None
+
+    def set(self, rom_filename, info):
+        try:
+            key = self._get_key(rom_filename)
+        except OSError:
+            return
+        # Reload the cache first, so that entries saved by other processes in the meantime are kept
+        entries = self._load()
+        for other_key in [x for x in entries if x[0] == key[0]]:
+            del entries[other_key]
+        entries[key] = info
+        self._entries = entries
+        save_pickle(self._get_filename(), {"version": ROM_FILE_INFO_CACHE_VERSION, "entries": entries})
+
+
+rom_file_info_cache = RomFileInfoCache()
+
 
 class Rom(AllocatableBlock):
     def reset(self, size=0):
         super(Rom, self).reset(size)
         self.type = ROM_TYPE_NAME_UNKNOWN
+        # The MD5 digests of the data as it was loaded from a file, keyed on the value which replaced the last byte
+        self._loaded_md5_digests = dict()
 
     def from_file(self, filename):
-        super(Rom, self).from_file(filename)
+        info = rom_file_info_cache.get(filename)
+        if info is None:
+            type_name, header_size = self._detect_file_type(filename)
+            self._load_file(filename, header_size, calculate_md5=True)
+            rom_file_info_cache.set(filename, RomFileInfo(type=type_name,
+                                                          header_size=header_size,
+                                                          md5_digests=dict(self._loaded_md5_digests)))
+        else:
+            type_name, header_size = info.type, info.header_size
+            self._load_file(filename, header_size, calculate_md5=False)
+            self._loaded_md5_digests = dict(info.md5_digests)
+
+        self.type = type_name
         self._setup_rom_post_load()
+        # The digests are only valid until the data is modified
+        self._loaded_md5_digests = dict()
 
-    def _setup_rom_post_load(self):
-        self.type = self._detect_type()
-        if self.type != ROM_TYPE_NAME_UNKNOWN and 'free ranges' in ROM_TYPE_MAP[self.type]:
-            self.unallocated_ranges = map(lambda y: tuple(map(lambda z: int(z, 0), y[1:-1].split(','))),
-                                          ROM_TYPE_MAP[self.type]['free ranges'])
-            self.unallocated_ranges = filter(lambda (begin, end): end < self.size, self.unallocated_ranges)
-            self.unallocated_ranges.sort()
+    @staticmethod
+    def _detect_file_type(filename):
+        try:
+            with open(filename, 'rb') as f:
+                data = array.array('B', f.read(_get_rom_type_detection_size()))
+        except (IOError, OSError):
+            raise FileAccessError("Could not access file[%s]" % filename)
+        return _detect_rom_type(data)
 
-    def _detect_type(self):
-        for type_name, d in ROM_TYPE_MAP.iteritems():
-            offset, data, platform = d['offset'], d['data'], d['platform']
+    def _load_file(self, filename, header_size, calculate_md5):
+        """Loads the data of a ROM file, skipping over its copier header. The MD5 digests of the data are calculated
+        while it is read, both as it is and with its last byte replaced by zero."""
+        self.reset()
 
-            if platform == "SNES":
-                # Validate the ROM and check if it's headered
+        try:
+            with open(filename, 'rb') as f:
+                file_size = int(os.fstat(f.fileno()).st_size)
+                header_size = min(header_size, file_size)
+                f.seek(header_size)
+                self.size = file_size - header_size
+                del self.data
+                self.data = array.array('B')
+                if not calculate_md5:
+                    self.data.fromfile(f, self.size)
+                    return
+
+                md5 = hashlib.md5()
+                while len(self.data) < self.size:
+                    chunk_offset = len(self.data)
+                    chunk_size = min(_ROM_FILE_READ_CHUNK_SIZE, self.size - chunk_offset)
+                    self.data.fromfile(f, chunk_size)
+                    # Leave the last byte out, so that the digests for both of its values can be calculated
+                    md5.update(buffer(self.data, chunk_offset, min(chunk_size, self.size - 1 - chunk_offset)))
+        except (IOError, OSError, EOFError):
+            raise FileAccessError("Could not access file[%s]" % filename)
 
-                # Check for unheadered HiROM
-                try:
-                    if (~self[0xffdc] & 0xff == self[0xffde]) \
-                            and (~self[0xffdd] & 0xff == self[0xffdf]) \
-                            and (self[offset:offset + len(data)].to_list() == data):
-                        return type_name
-                except OutOfBoundsError:
-                    pass
-
-                # Check for unheadered LoROM
-                try:
-                    if (~self[0x7fdc] & 0xff == self[0x7fde]) \
-                            and (~self[0x7fdd] & 0xff == self[0x7fdf]) \
-                            and (self[offset:offset + len(data)].to_list() == data):
-                        return type_name
-                except OutOfBoundsError:
-                    pass
-
-                # Check for headered HiROM
-                try:
-                    if (~self[0x101dc] & 0xff == self[0x101de]) \
-                            and (~self[0x101dd] & 0xff == self[0x101df]) \
-                            and (self[offset + 0x200:offset + 0x200 + len(data)].to_list() == data):
-                        # Remove header
-                        self.data = self.data[0x200:]
-                        self.size -= 0x200
-                        return type_name
-                except OutOfBoundsError:
-                    pass
-
-                # Check for headered LoROM
-                try:
-                    if (~self[0x81dc] & 0xff == self[0x81de]) \
-                            and (~self[0x81dd] & 0xff == self[0x81df]) \
-                            and (self[offset + 0x200:offset + 0x200 + len(data)].to_list() == data):
-                        # Remove header
-                        self.data = self.data[0x200:]
-                        self.size -= 0x200
-                        return type_name
-                except OutOfBoundsError:
-                    pass
-            else:
-                try:
-                    if self[offset:offset + len(data)].to_list() == data:
-                        return type_name
-                except OutOfBoundsError:
-                    pass
+        if self.size > 0:
+            md5_with_zero = md5.copy()
+            md5.update(chr(self.data[-1]))
+            md5_with_zero.update("\0")
+            self._loaded_md5_digests = {None: md5.hexdigest(), 0: md5_with_zero.hexdigest()}
         else:
-            return ROM_TYPE_NAME_UNKNOWN
+            self._loaded_md5_digests = {None: md5.hexdigest()}
+
+    def get_md5(self, last_byte=None):
+        """Returns the MD5 hex digest of this ROM's data.
+        :param last_byte: if not None, the digest is calculated as if the last byte of the data had this value"""
+        try:
+            return self._loaded_md5_digests[last_byte]
+        except KeyError:
+            pass
+
+        if (last_byte is None) or (self.size == 0):
+            return hashlib.md5(buffer(self.data, 0, self.size)).hexdigest()
+        md5 = hashlib.md5(buffer(self.data, 0, self.size - 1))
+        md5.update(chr(last_byte))
+        return md5.hexdigest()
+
+    def _setup_rom_post_load(self):
+        rom_type = get_rom_type_map()[self.type] if self.type != ROM_TYPE_NAME_UNKNOWN else None
+        if rom_type is not None and 'free ranges' in rom_type:
+            unallocated_ranges = map(lambda y: tuple(map(lambda z: int(z, 0), y[1:-1].split(','))),
+                                     rom_type['free ranges'])
+            self.unallocated_ranges = filter(lambda (begin, end): end < self.size, unallocated_ranges)
 
     def add_header(self):
         if self.type == 'Earthbound':
+            if self._views:
+                self._detach_views()
             for i in xrange(0x200):
                 self.data.insert(0, 0)
             self.size += 0x200
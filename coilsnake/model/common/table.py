@@ -1,11 +1,14 @@
 from abc import abstractmethod
+import array
+from itertools import izip
 import logging
+from struct import Struct
 
 from coilsnake.exceptions.common.exceptions import InvalidArgumentError, IndexOutOfRangeError, \
     TableEntryInvalidYmlRepresentationError, TableError, TableEntryMissingDataError, TableEntryError, TableSchemaError
 from coilsnake.util.common.helper import getitem_with_default, not_in_inclusive_range
 from coilsnake.util.common.type import GenericEnum
-from coilsnake.util.common.yml import convert_values_to_hex_repr, yml_load, yml_dump
+from coilsnake.util.common.yml import yml_load, yml_dump
 
 log = logging.getLogger(__name__)
 
@@ -43,14 +46,22 @@ class TableEntry(object):
 class BooleanTableEntry(TableEntry):
     @classmethod
     def from_block(cls, block, offset):
-        return block.read_multi(offset, cls.size) != 0
+        return cls._from_int(block.read_multi(offset, cls.size))
+
+    @classmethod
+    def _from_int(cls, int_value):
+        return int_value != 0
 
     @classmethod
     def to_block(cls, block, offset, value):
+        block.write_multi(offset, cls._to_int(value), cls.size)
+
+    @classmethod
+    def _to_int(cls, value):
         if value:
-            block.write_multi(offset, 1, cls.size)
+            return 1
         else:
-            block.write_multi(offset, 0, cls.size)
+            return 0
 
     @classmethod
     def from_yml_rep(cls, yml_rep):
@@ -75,11 +86,19 @@ class LittleEndianIntegerTableEntry(TableEntry):
 
     @classmethod
     def from_block(cls, block, offset):
-        return block.read_multi(offset, cls.size)
+        return cls._from_int(block.read_multi(offset, cls.size))
+
+    @classmethod
+    def _from_int(cls, int_value):
+        return int_value
 
     @classmethod
     def to_block(cls, block, offset, value):
-        block.write_multi(offset, value, cls.size)
+        block.write_multi(offset, cls._to_int(value), cls.size)
+
+    @classmethod
+    def _to_int(cls, value):
+        return value
 
     @classmethod
     def from_yml_rep(cls, yml_rep):
@@ -105,12 +124,12 @@ class LittleEndianHexIntegerTableEntry(LittleEndianIntegerTableEntry):
 
 class LittleEndianOneBasedIntegerTableEntry(LittleEndianIntegerTableEntry):
     @classmethod
-    def from_block(cls, block, offset):
-        return super(LittleEndianOneBasedIntegerTableEntry, cls).from_block(block, offset) - 1
+    def _from_int(cls, int_value):
+        return int_value - 1
 
     @classmethod
-    def to_block(cls, block, offset, value):
-        super(LittleEndianOneBasedIntegerTableEntry, cls).to_block(block, offset, value + 1)
+    def _to_int(cls, value):
+        return value + 1
 
     @classmethod
     def from_yml_rep(cls, yml_rep):
@@ -212,10 +231,14 @@ class BitfieldTableEntry(TableEntry):
 
     @classmethod
     def to_block(cls, block, offset, value):
-        block_value = 0
+        block.write_multi(offset, cls._to_int(value), cls.size)
+
+    @classmethod
+    def _to_int(cls, value):
+        int_value = 0
         for i in value:
-            block_value |= (1 << i)
-        block.write_multi(offset, block_value, cls.size)
+            int_value |= (1 << i)
+        return int_value
 
     @classmethod
     def from_yml_rep(cls, yml_rep):
@@ -259,6 +282,9 @@ class BitfieldTableEntry(TableEntry):
 
 
 class RowTableEntry(TableEntry):
+    # The _RowCodec generated for this schema, created when it is first needed
+    _codec = None
+
     @classmethod
     def from_schema(cls, schema, name="CustomRowTableEntry", hidden_columns=set()):
         if type(hidden_columns) == list:
@@ -277,8 +303,25 @@ class RowTableEntry(TableEntry):
         schema = map(cls.to_table_entry_class, schema_specification)
         return cls.from_schema(schema, name, hidden_columns)
 
+    @classmethod
+    def _get_codec(cls):
+        codec = cls._codec
+        # A subclass of a schema's class may have a different schema, so it can't use its parent's codec
+        if codec is None or codec.entry_class is not cls:
+            codec = cls._codec = _RowCodec(cls)
+        return codec
+
     @classmethod
     def from_yml_rep(cls, yml_rep):
+        codec = cls._get_codec()
+        try:
+            return codec.from_yml_rep(yml_rep)
+        except Exception:
+            # Convert each column separately so that the error refers to the column which caused it
+            return cls._from_yml_rep_by_column(yml_rep)
+
+    @classmethod
+    def _from_yml_rep_by_column(cls, yml_rep):
         row = [None] * len(cls.schema)
         for i, column in enumerate(cls.schema):
             if column.name in cls.hidden_columns:
@@ -305,6 +348,15 @@ class RowTableEntry(TableEntry):
 
     @classmethod
     def to_yml_rep(cls, value):
+        codec = cls._get_codec()
+        try:
+            return codec.to_yml_rep(value)
+        except Exception:
+            # Convert each column separately so that the error refers to the column which caused it
+            return cls._to_yml_rep_by_column(value)
+
+    @classmethod
+    def _to_yml_rep_by_column(cls, value):
         yml_rep_row = dict()
         for value, column in zip(value, cls.schema):
             if column.name in cls.hidden_columns:
@@ -319,6 +371,15 @@ class RowTableEntry(TableEntry):
 
     @classmethod
     def from_block(cls, block, offset):
+        codec = cls._get_codec()
+        try:
+            return codec.from_block(block, offset)
+        except Exception:
+            # Read each column separately so that the error refers to the column which caused it
+            return cls._from_block_by_column(block, offset)
+
+    @classmethod
+    def _from_block_by_column(cls, block, offset):
         row = [None] * len(cls.schema)
         for i, column in enumerate(cls.schema):
             try:
@@ -331,6 +392,18 @@ class RowTableEntry(TableEntry):
 
     @classmethod
     def to_block(cls, block, offset, value):
+        codec = cls._get_codec()
+        if codec.to_block is not None:
+            try:
+                codec.to_block(block, offset, value)
+                return
+            except Exception:
+                # Write each column separately so that the error refers to the column which caused it
+                pass
+        cls._to_block_by_column(block, offset, value)
+
+    @classmethod
+    def _to_block_by_column(cls, block, offset, value):
         for value, column in zip(value, cls.schema):
             try:
                 column.to_block(block, offset, value)
@@ -346,6 +419,180 @@ class RowTableEntry(TableEntry):
                 for inner in outer]
 
 
+# The from_block and to_block methods of the table entries which store their values as little-endian integers, and only
+# convert between those integers and their values using _from_int and _to_int
+_INTEGER_TABLE_ENTRY_FROM_BLOCK_FUNCTIONS = frozenset(
+    [x.from_block.im_func for x in [BooleanTableEntry, LittleEndianIntegerTableEntry, BitfieldTableEntry]])
+_INTEGER_TABLE_ENTRY_TO_BLOCK_FUNCTIONS = frozenset(
+    [x.to_block.im_func for x in [BooleanTableEntry, LittleEndianIntegerTableEntry, BitfieldTableEntry]])
+_STRUCT_INTEGER_FORMATS = {1: "B", 2: "H", 3: "HB", 4: "I"}
+
+
+_BYTE_LIST_ITEM_TYPES = frozenset([int, bool])
+
+
+def _get_im_func(method):
+    return getattr(method, "im_func", None)
+
+
+def _is_byte_list(value):
+    """Returns whether a value would be accepted by ByteListTableEntry.from_yml_rep. This is faster than checking each
+    item separately, but rejects lists containing subclasses of int other than bool."""
+    return isinstance(value, list) and \
+        ((not value) or (set(map(type, value)) <= _BYTE_LIST_ITEM_TYPES and 0 <= min(value) and max(value) <= 0xff))
+
+
+def _byte_list_to_string(value, size):
+    """Converts a value to the string which ByteListTableEntry.to_block would write, or raises an exception if it is
+    not a list which ByteListTableEntry.to_block would accept."""
+    if not (isinstance(value, list) and len(value) == size and size > 0):
+        raise ValueError("Invalid byte list")
+    return array.array('B', value).tostring()
+
+
+class _RowCodec(object):
+    """Converts whole rows of a schema between blocks, values, and yml representations, using functions which are
+    generated from the schema and compiled once.
+
+    Integer and byte list columns are unpacked from a block by a single precompiled struct, while other columns are
+    skipped over by the struct and read using their own from_block method. Rows can only be written using the struct if
+    all of their columns are integer columns. Plain integer and boolean columns are validated and converted inline,
+    and other columns are converted by calling their own methods.
+
+    The generated functions raise an exception on any invalid value without saying which column it belongs to, so
+    their callers convert the row again column by column to report the error."""
+
+    def __init__(self, entry_class):
+        self.entry_class = entry_class
+        schema = entry_class.schema
+        hidden_columns = entry_class.hidden_columns
+        self._namespace = {"_is_byte_list": _is_byte_list, "_byte_list_to_string": _byte_list_to_string}
+
+        struct_format = "<"
+        readers = []
+        writer_lines = []
+        writer_fields = []
+        num_fields = 0
+        offset = 0
+        for i, column in enumerate(schema):
+            from_block = _get_im_func(column.from_block)
+            if from_block in _INTEGER_TABLE_ENTRY_FROM_BLOCK_FUNCTIONS and column.size in _STRUCT_INTEGER_FORMATS:
+                struct_format += _STRUCT_INTEGER_FORMATS[column.size]
+                if column.size == 3:
+                    int_value = "(values[{}] | (values[{}] << 16))".format(num_fields, num_fields + 1)
+                else:
+                    int_value = "values[{}]".format(num_fields)
+                readers.append(self._get_from_int_expression(i, column, int_value))
+                num_fields += len(_STRUCT_INTEGER_FORMATS[column.size])
+            elif from_block is _get_im_func(ByteListTableEntry.from_block):
+                struct_format += "{}s".format(column.size)
+                readers.append("list(bytearray(values[{}]))".format(num_fields))
+                num_fields += 1
+            else:
+                struct_format += "{}x".format(column.size)
+                readers.append("{}(block, offset + {})".format(self._add(i, "from_block", column.from_block), offset))
+
+            if writer_fields is not None:
+                to_block = _get_im_func(column.to_block)
+                if (to_block in _INTEGER_TABLE_ENTRY_TO_BLOCK_FUNCTIONS) and \
+                        (column.size in _STRUCT_INTEGER_FORMATS) and \
+                        (from_block in _INTEGER_TABLE_ENTRY_FROM_BLOCK_FUNCTIONS):
+                    writer_lines.append("v{} = {}".format(i, self._get_to_int_expression(i, column)))
+                    if column.size == 3:
+                        writer_fields += ["v{} & 0xffff".format(i), "(v{} >> 16) & 0xff".format(i)]
+                    else:
+                        writer_fields.append("v{} & {:#x}".format(i, (1 << (8 * column.size)) - 1))
+                elif (to_block is _get_im_func(ByteListTableEntry.to_block)) and \
+                        (from_block is _get_im_func(ByteListTableEntry.from_block)):
+                    writer_fields.append("_byte_list_to_string(row[{}], {})".format(i, column.size))
+                else:
+                    writer_fields = None
+            offset += column.size
+
+        self._namespace["struct"] = Struct(struct_format)
+
+        self.from_block = self._compile(
+            "from_block", "block, offset",
+            ["values = block.read_struct(struct, offset)",
+             "return [{}]".format(", ".join(readers))])
+
+        if writer_fields is None:
+            self.to_block = None
+        else:
+            writer_lines.append("block.write_struct(struct, offset, ({},))".format(", ".join(writer_fields)))
+            self.to_block = self._compile("to_block", "block, offset, row", writer_lines)
+
+        lines = []
+        values = []
+        for i, column in enumerate(schema):
+            if column.name in hidden_columns:
+                values.append("None")
+                continue
+            from_yml_rep = _get_im_func(column.from_yml_rep)
+            lines.append("v{} = yml_rep[{!r}]".format(i, column.name))
+            if from_yml_rep is _get_im_func(LittleEndianIntegerTableEntry.from_yml_rep):
+                lines += ["if not (isinstance(v{0}, int) and 0 <= v{0} <= {1:#x}):".format(
+                    i, (1 << (8 * column.size)) - 1),
+                          "    raise ValueError"]
+                values.append("v{}".format(i))
+            elif from_yml_rep is _get_im_func(BooleanTableEntry.from_yml_rep):
+                lines += ["if not isinstance(v{}, bool):".format(i),
+                          "    raise ValueError"]
+                values.append("v{}".format(i))
+            elif from_yml_rep is _get_im_func(ByteListTableEntry.from_yml_rep):
+                lines += ["if not _is_byte_list(v{}):".format(i),
+                          "    raise ValueError"]
+                values.append("v{}".format(i))
+            else:
+                values.append("{}(v{})".format(self._add(i, "from_yml_rep", column.from_yml_rep), i))
+        lines.append("return [{}]".format(", ".join(values)))
+        self.from_yml_rep = self._compile("from_yml_rep", "yml_rep", lines)
+
+        lines = []
+        items = []
+        for i, column in enumerate(schema):
+            if column.name in hidden_columns:
+                continue
+            to_yml_rep = _get_im_func(column.to_yml_rep)
+            if to_yml_rep in (_get_im_func(LittleEndianIntegerTableEntry.to_yml_rep),
+                              _get_im_func(BooleanTableEntry.to_yml_rep)):
+                items.append("{!r}: row[{}]".format(column.name, i))
+            elif to_yml_rep is _get_im_func(ByteListTableEntry.to_yml_rep):
+                lines += ["if not _is_byte_list(row[{}]):".format(i),
+                          "    raise ValueError"]
+                items.append("{!r}: row[{}]".format(column.name, i))
+            else:
+                items.append("{!r}: {}(row[{}])".format(column.name, self._add(i, "to_yml_rep", column.to_yml_rep),
+                                                        i))
+        lines.append("return {{{}}}".format(", ".join(items)))
+        self.to_yml_rep = self._compile("to_yml_rep", "row", lines)
+
+    def _add(self, column_index, method_name, method):
+        """Makes a column's method available to the generated functions, and returns the name by which they can call
+        it."""
+        name = "{}_{}".format(method_name, column_index)
+        self._namespace[name] = method
+        return name
+
+    def _get_from_int_expression(self, column_index, column, int_value):
+        from_int = _get_im_func(column._from_int)
+        if from_int is _get_im_func(LittleEndianIntegerTableEntry._from_int):
+            return int_value
+        elif from_int is _get_im_func(BooleanTableEntry._from_int):
+            return "({} != 0)".format(int_value)
+        return "{}({})".format(self._add(column_index, "_from_int", column._from_int), int_value)
+
+    def _get_to_int_expression(self, column_index, column):
+        if _get_im_func(column._to_int) is _get_im_func(LittleEndianIntegerTableEntry._to_int):
+            return "row[{}]".format(column_index)
+        return "{}(row[{}])".format(self._add(column_index, "_to_int", column._to_int), column_index)
+
+    def _compile(self, function_name, arguments, lines):
+        source = "def {}({}):\n{}\n".format(function_name, arguments, "\n".join("    " + x for x in lines))
+        exec source in self._namespace
+        return self._namespace[function_name]
+
+
 class GenericLittleEndianRowTableEntry(RowTableEntry):
     DEFAULT_TABLE_ENTRY_TYPE = "int"
     TABLE_ENTRY_CLASS_MAP = {"int": (LittleEndianIntegerTableEntry, ["name", "size"]),
@@ -408,7 +655,23 @@ class Table(object):
         self.size = self.schema.size * self.num_rows
         self.values = [None for i in range(self.num_rows)]
 
+    def _get_row_codec(self):
+        """Returns the _RowCodec which converts this table's rows, or None if its schema is not a RowTableEntry."""
+        if isinstance(self.schema, type) and issubclass(self.schema, RowTableEntry):
+            return self.schema._get_codec()
+        return None
+
     def from_block(self, block, offset):
+        codec = self._get_row_codec()
+        if codec is not None:
+            try:
+                self.values = [codec.from_block(block, row_offset)
+                               for row_offset in xrange(offset, offset + self.size, self.schema.size)]
+                return
+            except Exception:
+                # Read each row separately so that the error refers to the row which caused it
+                pass
+
         for i in range(self.num_rows):
             try:
                 self.values[i] = self.schema.from_block(block, offset)
@@ -419,6 +682,16 @@ class Table(object):
 
     def to_block(self, block, offset):
         original_offset = offset
+        codec = self._get_row_codec()
+        if (codec is not None) and (codec.to_block is not None):
+            try:
+                for row_offset, row in izip(xrange(offset, offset + self.size, self.schema.size), self.values):
+                    codec.to_block(block, row_offset, row)
+                return original_offset
+            except Exception:
+                # Write each row separately so that the error refers to the row which caused it
+                pass
+
         for i, row in enumerate(self.values):
             try:
                 self.schema.to_block(block, offset, row)
@@ -432,6 +705,16 @@ class Table(object):
         if yml_rep is None:
             raise TableError(table_name=self.name, entry=None, field=None,
                              cause=TableEntryMissingDataError("No data found, please check the file"))
+
+        codec = self._get_row_codec()
+        if codec is not None:
+            try:
+                self.values = [codec.from_yml_rep(yml_rep[i]) for i in xrange(self.num_rows)]
+                return
+            except Exception:
+                # Convert each row separately so that the error refers to the row which caused it
+                pass
+
         for i in range(self.num_rows):
             try:
                 yml_rep_row = yml_rep[i]
@@ -446,6 +729,14 @@ class Table(object):
                 raise TableError(table_name=self.name, entry=i, field=e.field, cause=e)
 
     def to_yml_rep(self):
+        codec = self._get_row_codec()
+        if codec is not None:
+            try:
+                return dict(enumerate(map(codec.to_yml_rep, self.values)))
+            except Exception:
+                # Convert each row separately so that the error refers to the row which caused it
+                pass
+
         yml_rep = {}
         for i, row in enumerate(self.values):
             try:
@@ -459,14 +750,15 @@ class Table(object):
         self.from_yml_rep(yml_rep)
 
     def to_yml_file(self, f, default_flow_style=False):
-        yml_str_rep = yml_dump(self.to_yml_rep(), default_flow_style=default_flow_style)
-
-        # Rewrite hexints in hexidecimal
-        # The YAML parser does not offer this option, so this has to be done with a regex
-        for hex_label in self.schema.yml_rep_hex_labels():
-            yml_str_rep = convert_values_to_hex_repr(yml_str_rep, hex_label)
-
-        f.write(yml_str_rep)
+        yml_rep = self.to_yml_rep()
+        hex_labels = self.schema.yml_rep_hex_labels()
+        if default_flow_style is False and yml_rep:
+            # In block style, the table's rows are written one at a time, so that the yml for the whole table is never
+            # held in memory
+            for key in sorted(yml_rep):
+                yml_dump({key: yml_rep[key]}, f, default_flow_style=False, hex_keys=hex_labels)
+        else:
+            yml_dump(yml_rep, f, default_flow_style=default_flow_style, hex_keys=hex_labels)
 
     def __getitem__(self, index):
         row = index
@@ -1,24 +1,103 @@
+import array
+from collections import OrderedDict
+from contextlib import contextmanager
 import hashlib
 import os
 
 from coilsnake.exceptions.common.exceptions import CoilSnakeError
 from coilsnake.model.common.blocks import Block, Rom
 from coilsnake.model.common.ips import IpsPatch
-from coilsnake.modules.eb.EbModule import comp, decomp
-from coilsnake.exceptions.eb.exceptions import InvalidEbCompressedDataError
+from coilsnake.modules.eb.EbModule import compress, decompress, decompress_many, COMPRESSOR_VERSION
 from coilsnake.root import ASSET_PATH
 
 
+class CompressionReport(object):
+    """Records the size of every block which is compressed while this report is set as
+    EbCompressibleBlock.compression_report, both at the compression level used and at the normal compression level,
+    so that the bytes saved by a higher compression level can be reported for each resource."""
+
+    def __init__(self):
+        self.resource_name = None
+        # Maps resource names to [number of blocks, uncompressed size, normal compressed size, compressed size]
+        self.entries = OrderedDict()
+
+    @contextmanager
+    def recording(self, resource_name):
+        """Attributes the blocks compressed inside this context to a resource."""
+        previous_resource_name = self.resource_name
+        self.resource_name = resource_name
+        try:
+            yield self
+        finally:
+            self.resource_name = previous_resource_name
+
+    def add(self, uncompressed_size, normal_size, compressed_size):
+        entry = self.entries.setdefault(self.resource_name or "Other", [0, 0, 0, 0])
+        entry[0] += 1
+        entry[1] += uncompressed_size
+        entry[2] += normal_size
+        entry[3] += compressed_size
+
+    def get_bytes_saved(self):
+        return sum([normal_size - compressed_size for _, _, normal_size, compressed_size in self.entries.itervalues()])
+
+
 class EbCompressibleBlock(Block):
+    # The compression level used when compress is not given one
+    compression_level = "normal"
+    # The CompressionReport in which compressed blocks are recorded, or None
+    compression_report = None
+    # The DiskCache in which compressed data is cached, keyed on the uncompressed data and compression level, or None
+    compression_cache = None
+
     def from_compressed_block(self, block, offset=0):
-        self.data = decomp(block, offset)
-        if self.data[0] < 0:
-            raise InvalidEbCompressedDataError("Couldn't decompress invalid data")
+        self.data = decompress(block.to_array(), offset)
         self.size = len(self.data)
 
-    def compress(self):
-        compressed_data = comp(self.to_list())
-        self.from_list(compressed_data)
+    @classmethod
+    def many_from_compressed_block(cls, block, offsets):
+        """Decompresses the compressed data at each of several offsets in a block, in a single call to the
+        decompressor.
+        :return: a list of blocks, one for each offset"""
+        blocks = []
+        for data in decompress_many(block.to_array(), offsets):
+            compressible_block = cls()
+            compressible_block.data = data
+            compressible_block.size = len(data)
+            blocks.append(compressible_block)
+        return blocks
+
+    def compress(self, level=None):
+        """Compresses this block's data.
+        :param level: the compression level to use, one of the names in EbModule.COMPRESSION_LEVELS, or None to use
+        the default compression level"""
+        level = level or self.compression_level
+        uncompressed_size = self.size
+        compressed_data = self._compress(level)
+        if self.compression_report is not None:
+            if level == "normal":
+                normal_size = len(compressed_data)
+            else:
+                normal_size = len(self._compress("normal"))
+            self.compression_report.add(uncompressed_size, normal_size, len(compressed_data))
+        self.data = compressed_data
+        self.size = len(compressed_data)
+
+    def _compress(self, level):
+        uncompressed_data = buffer(self.data, 0, self.size)
+        if self.compression_cache is None:
+            return compress(uncompressed_data, level)
+
+        md5 = hashlib.md5("{}\0{}\0".format(COMPRESSOR_VERSION, level))
+        md5.update(uncompressed_data)
+        key = md5.hexdigest()
+        compressed_data = self.compression_cache.get(key)
+        if compressed_data is not None:
+            return array.array('B', compressed_data)
+
+        compressed_data = compress(uncompressed_data, level)
+        self.compression_cache.set(key, compressed_data.tostring())
+        return compressed_data
 
 
 class EbRom(Rom):
@@ -56,6 +135,7 @@ class EbRom(Rom):
             # Truncate the data
             self.size = 0x300000
             self.data = self.data[:0x300000]
+            self._loaded_md5_digests = dict()
 
         # Ensure the ROM isn't too small
         elif len(self) < 0x300000:
@@ -75,19 +155,21 @@ class EbRom(Rom):
             patch = IpsPatch()
             patch.load(os.path.join(ASSET_PATH, "rom-fixes", "Earthbound", patch_filename))
             patch.apply(self)
+            self._loaded_md5_digests = dict()
             self._setup_rom_post_load()
             return
 
         # As a last attempt, try to set the last byte to 0x0, since LunarIPS
         # likes to add 0xff at the end
-        self[-1] = 0x0
-        if self._calc_hash() == self.REFERENCE_MD5:
+        if self._calc_hash(last_byte=0x0) == self.REFERENCE_MD5:
+            self[-1] = 0x0
             return
 
         raise CoilSnakeError("Not a valid clean EarthBound ROM.")
 
-    def _calc_hash(self):
-        """Calculates the MD5 hash of this ROM's data.
+    def _calc_hash(self, last_byte=None):
+        """Calculates the MD5 hash of this ROM's data, optionally as if its
+        last byte were replaced.
         """
 
-        return hashlib.md5(self.data.tostring()).hexdigest()
\ No newline at end of file
+        return self.get_md5(last_byte)
\ No newline at end of file
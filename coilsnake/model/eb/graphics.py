@@ -1,25 +1,161 @@
 from array import array
-from copy import deepcopy
+import sys
+from zlib import crc32
 
 from PIL import Image
 
-from coilsnake.exceptions.common.exceptions import InvalidArgumentError, OutOfBoundsError, InvalidUserDataError
+from coilsnake.exceptions.common.exceptions import InvalidArgumentError, InvalidUserDataError, OutOfBoundsError
 from coilsnake.model.eb.blocks import EbCompressibleBlock
 from coilsnake.model.eb.palettes import EbPalette, EbColor
 from coilsnake.util.common.type import EqualityMixin, StringRepresentationMixin
-from coilsnake.util.eb.graphics import read_2bpp_graphic_from_block, read_4bpp_graphic_from_block, \
-    read_8bpp_graphic_from_block, read_1bpp_graphic_from_block, write_2bpp_graphic_to_block, \
-    write_4bpp_graphic_to_block, write_8bpp_graphic_to_block, write_1bpp_graphic_to_block, hash_tile
+from coilsnake.util.eb.graphics import read_bitplane_rows, write_bitplane_rows
 
 
 _EB_GRAPHIC_TILESET_SUPPORTED_BPP_FORMATS = frozenset([1, 2, 4, 8])
+_MODULUS_TABLES = dict()
+_OFFSET_TABLES = dict()
+
+# The bits of an arrangement item's 16-bit word
+_ARRANGEMENT_VERTICAL_FLIP = 0x8000
+_ARRANGEMENT_HORIZONTAL_FLIP = 0x4000
+_ARRANGEMENT_PRIORITY = 0x2000
+_ARRANGEMENT_SUBPALETTE_MASK = 0x1c00
+_ARRANGEMENT_SUBPALETTE_SHIFT = 10
+_ARRANGEMENT_TILE_MASK = 0x3ff
+
+
+def _get_modulus_table(modulus):
+    """Returns a table for str.translate which replaces each byte with its value modulo the given number."""
+    try:
+        return _MODULUS_TABLES[modulus]
+    except KeyError:
+        table = _MODULUS_TABLES[modulus] = str(bytearray([i % modulus for i in xrange(256)]))
+        return table
+
+
+def _get_offset_table(offset):
+    """Returns a table for str.translate which adds the given number to each byte."""
+    try:
+        return _OFFSET_TABLES[offset]
+    except KeyError:
+        table = _OFFSET_TABLES[offset] = str(bytearray([(i + offset) & 0xff for i in xrange(256)]))
+        return table
+
+
+def _get_tile_rows(image_data, image_width, x, y, tile_width, tile_height):
+    """Returns the rows of a tile in an image, as a list of strings with one byte per pixel.
+    :param image_data: the image's pixels, one byte per pixel, row by row"""
+    offset = y * image_width + x
+    return [image_data[row_offset:row_offset + tile_width]
+            for row_offset in xrange(offset, offset + tile_height * image_width, image_width)]
+
+
+def _get_image_color_indices(image):
+    """Reads the pixels of a paletted image along with the colors of its palette. Each color is an (r, g, b) tuple with
+    the three least significant bits of each value removed, as they would be stored in an EbColor.
+    :return: a tuple of a string of palette indices, one byte per pixel, row by row, and the list of 256 colors"""
+    palette = image.getpalette()
+    palette += [0] * (768 - len(palette))
+    return image.tobytes(), [(palette[i] & 0xf8, palette[i + 1] & 0xf8, palette[i + 2] & 0xf8)
+                             for i in xrange(0, 768, 3)]
+
+
+class _WriteThroughList(list):
+    """A list which calls _write after every change made to it."""
+
+    def _write(self):
+        raise NotImplementedError()
+
+
+def _create_write_through_method(name):
+    list_method = getattr(list, name)
+
+    def method(self, *args):
+        result = list_method(self, *args)
+        self._write()
+        return self if name.startswith("__i") else result
+    method.__name__ = name
+    return method
+
+for _name in ["__setitem__", "__setslice__", "__delitem__", "__delslice__", "__iadd__", "__imul__", "append",
+              "extend", "insert", "pop", "remove", "reverse", "sort"]:
+    setattr(_WriteThroughList, _name, _create_write_through_method(_name))
+del _name
+
+
+class EbGraphicTileRow(_WriteThroughList):
+    """A list of the pixels in one row of a tile in an EbGraphicTileset. Changing a pixel in the list also changes it in
+    the tileset."""
+
+    def __init__(self, tileset, offset):
+        super(EbGraphicTileRow, self).__init__(tileset.data[offset:offset + tileset.tile_width])
+        self._tileset = tileset
+        self._offset = offset
+
+    def _write(self):
+        if len(self) != self._tileset.tile_width:
+            raise InvalidArgumentError("Couldn't change the width of a tile's row to [{}]".format(len(self)))
+        self._tileset.data[self._offset:self._offset + len(self)] = self
+
+
+class EbGraphicTile(_WriteThroughList):
+    """A two-dimensional list of the pixels in a tile in an EbGraphicTileset. Changing a pixel or a row in the list
+    also changes it in the tileset."""
+
+    def __init__(self, tileset, tile_id):
+        self._tileset = tileset
+        self._tile_id = tile_id
+        super(EbGraphicTile, self).__init__(self._get_rows())
+
+    def _get_rows(self):
+        offset = self._tile_id * self._tileset.tile_area
+        return [EbGraphicTileRow(self._tileset, row_offset)
+                for row_offset in xrange(offset, offset + self._tileset.tile_area, self._tileset.tile_width)]
+
+    def _write(self):
+        self._tileset.set_tile(self._tile_id, self)
+        # Rows which were replaced are read again, so that changes to their pixels are also written to the tileset
+        list.__setslice__(self, 0, len(self), self._get_rows())
+
+
+class EbGraphicTileList(object):
+    """A list-like view of the tiles in an EbGraphicTileset. Tiles can be assigned to it, and each tile read from it
+    is an EbGraphicTile, whose pixels are written through to the tileset when they are changed."""
+
+    def __init__(self, tileset):
+        self.tileset = tileset
+
+    def __len__(self):
+        return self.tileset.num_tiles
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.tileset.get_tile(i) for i in xrange(*key.indices(len(self)))]
+        return self.tileset.get_tile(self._get_index(key))
+
+    def __setitem__(self, key, tile):
+        self.tileset.set_tile(self._get_index(key), tile)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self.tileset.get_tile(i)
+
+    def _get_index(self, key):
+        if key < 0:
+            key += len(self)
+        if key < 0 or key >= len(self):
+            raise IndexError("tile index out of range")
+        return key
 
 
 class EbGraphicTileset(EqualityMixin):
     """A class representing a set of graphical tiles which adhere to the common EarthBound format.
     A graphic tileset is an ordered collection of graphical tiles. A graphical tile can be thought of as a
     two-dimensional array of numerical values. These numerical values each represent a color as an index in a palette.
-    Palettes themselves are stored separately from graphical tilesets."""
+    Palettes themselves are stored separately from graphical tilesets.
+
+    The pixels of all of the tiles are stored together in a single bytearray, one byte per pixel, with each tile's
+    rows following one another, so that the whole tileset can be converted to and from other formats at once."""
 
     def __init__(self, num_tiles, tile_width=8, tile_height=8):
         """Creates a new EbGraphicTileset.
@@ -43,10 +179,88 @@ class EbGraphicTileset(EqualityMixin):
                 tile_height))
         self.tile_height = tile_height
 
-        self.tiles = []
+        # The number of pixels in each tile
+        self.tile_area = tile_width * tile_height
+        self.data = bytearray(self.num_tiles_maximum * self.tile_area)
+        # The number of tiles which have been set, which are written by to_block
+        self.num_tiles = 0
         self._num_tiles_used = 0
         self._used_tiles = dict()
 
+    @property
+    def tiles(self):
+        return EbGraphicTileList(self)
+
+    @tiles.setter
+    def tiles(self, tiles):
+        """Replaces all of the tiles in this tileset. Tiles which are None are left blank."""
+        self.num_tiles = len(tiles)
+        self.data = bytearray(max(self.num_tiles, self.num_tiles_maximum) * self.tile_area)
+        for tile_id, tile in enumerate(tiles):
+            if tile is not None:
+                self.set_tile(tile_id, tile)
+
+    def get_tile(self, tile_id):
+        """Returns a tile as an EbGraphicTile, a two-dimensional list of pixels which writes changes to its pixels
+        through to this tileset."""
+        return EbGraphicTile(self, tile_id)
+
+    def get_tile_data(self, tile_id):
+        """Returns a tile's pixels as a string, one byte per pixel, row by row."""
+        if tile_id < 0 or tile_id >= self.num_tiles:
+            raise IndexError("tile index out of range")
+        offset = tile_id * self.tile_area
+        return str(self.data[offset:offset + self.tile_area])
+
+    def set_tile(self, tile_id, tile):
+        """Sets the pixels of a tile.
+        :param tile: a two-dimensional list of pixels, or a list of arrays of pixels"""
+        if len(tile) != self.tile_height or any(len(row) != self.tile_width for row in tile):
+            raise InvalidArgumentError("Couldn't set tile[{}] which is not of size[{}x{}]".format(
+                tile_id, self.tile_width, self.tile_height))
+        offset = tile_id * self.tile_area
+        for row in tile:
+            self.data[offset:offset + self.tile_width] = row
+            offset += self.tile_width
+
+    def _get_num_strip_columns(self, bpp):
+        """Returns the number of 8-pixel wide columns of each tile which are stored in the block representation."""
+        # Tiles stored in formats other than 1bpp are always 8 pixels wide
+        return self.tile_width / 8 if bpp == 1 else 1
+
+    def _strips_to_pixels(self, strips, num_tiles, num_columns):
+        """Rearranges a string of the 8-pixel rows of each column of each tile, as stored in the block representation,
+        into pixel data."""
+        if num_columns == 1 and self.tile_width == 8:
+            return bytearray(strips)
+
+        pixels = bytearray(num_tiles * self.tile_area)
+        strip_column_size = 8 * self.tile_height
+        for column in xrange(num_columns):
+            column_data = bytearray().join([strips[offset:offset + strip_column_size]
+                                            for offset in xrange(column * strip_column_size, len(strips),
+                                                                 num_columns * strip_column_size)])
+            for x in xrange(8):
+                pixels[8 * column + x::self.tile_width] = column_data[x::8]
+        return pixels
+
+    def _pixels_to_strips(self, pixels, num_tiles, num_columns):
+        """Rearranges pixel data into a string of the 8-pixel rows of each column of each tile, as stored in the block
+        representation. Pixels to the right of the stored columns are ignored."""
+        if num_columns == 1 and self.tile_width == 8:
+            return str(pixels)
+
+        strip_column_size = 8 * self.tile_height
+        columns = []
+        for column in xrange(num_columns):
+            column_data = bytearray(num_tiles * strip_column_size)
+            for x in xrange(8):
+                column_data[x::8] = pixels[8 * column + x::self.tile_width]
+            columns.append(column_data)
+        return str(bytearray().join([column_data[offset:offset + strip_column_size]
+                                     for offset in xrange(0, num_tiles * strip_column_size, strip_column_size)
+                                     for column_data in columns]))
+
     def from_block(self, block, offset=0, bpp=2):
         """Reads in a tileset from the specified offset in the block.
         :param bpp: The number of bits used to represent each pixel by the block representation."""
@@ -56,25 +270,18 @@ class EbGraphicTileset(EqualityMixin):
             raise NotImplementedError(("Don't know how to read graphical tile data of width[{}], height[{}], "
                                       "and bpp[{}]").format(self.tile_width, self.tile_height, bpp))
 
-        self._num_tiles_used = 0
+        num_columns = self._get_num_strip_columns(bpp)
+        tile_size = bpp * self.tile_height * num_columns
+        size = tile_size * self.num_tiles_maximum
+        # Stop reading tiles at the end of the block, leaving the rest of the tiles blank
+        available_size = max(0, min(size, block.size - offset))
+        data = bytearray(buffer(block.to_array(), offset, available_size)) if available_size else bytearray()
+        data.extend(bytearray(size - available_size))
+
+        self.data = self._strips_to_pixels(read_bitplane_rows(data, bpp), self.num_tiles_maximum, num_columns)
+        self.num_tiles = self.num_tiles_maximum
+        self._num_tiles_used = available_size / tile_size
         self._used_tiles = dict()
-        self.tiles = [[[0 for x in range(self.tile_width)] for y in range(self.tile_height)]
-                      for n in range(self.num_tiles_maximum)]
-        for tile in self.tiles:
-            try:
-                if bpp == 2:
-                    offset += read_2bpp_graphic_from_block(source=block, target=tile, offset=offset)
-                elif bpp == 4:
-                    offset += read_4bpp_graphic_from_block(source=block, target=tile, offset=offset)
-                elif bpp == 8:
-                    offset += read_8bpp_graphic_from_block(source=block, target=tile, offset=offset)
-                else:  # bpp == 1
-                    for x in range(0, self.tile_width, 8):
-                        offset += read_1bpp_graphic_from_block(source=block, target=tile, offset=offset,
-                                                               x=x, height=self.tile_height)
-                self._num_tiles_used += 1
-            except OutOfBoundsError:
-                break  # Stop if we begin to read past the end of the block
 
     def to_block(self, block, offset=0, bpp=2):
         """Writes this tileset to the specified offset in the block.
@@ -85,17 +292,12 @@ class EbGraphicTileset(EqualityMixin):
             raise NotImplementedError("Don't know how to write image data of width[{}], height[{}], and bpp[{}]"
                                       .format(self.tile_width, self.tile_height, bpp))
 
-        for tile in self.tiles:
-            if bpp == 2:
-                offset += write_2bpp_graphic_to_block(source=tile, target=block, offset=offset)
-            elif bpp == 4:
-                offset += write_4bpp_graphic_to_block(source=tile, target=block, offset=offset)
-            elif bpp == 8:
-                offset += write_8bpp_graphic_to_block(source=tile, target=block, offset=offset)
-            else:  # bpp == 1
-                for x in range(0, self.tile_width, 8):
-                    offset += write_1bpp_graphic_to_block(source=tile, target=block, offset=offset,
-                                                          x=x, height=self.tile_height)
+        if self.num_tiles == 0:
+            return
+        strips = self._pixels_to_strips(self.data[:self.num_tiles * self.tile_area], self.num_tiles,
+                                        self._get_num_strip_columns(bpp))
+        data = write_bitplane_rows(strips, bpp)
+        block[offset:offset + len(data)] = array('B', str(data))
 
     def block_size(self, bpp=2):
         """Returns the size required to represent this tileset in a block.
@@ -110,80 +312,96 @@ class EbGraphicTileset(EqualityMixin):
         :param image: the image representation of the tileset to be read rendered using the arrangement and palette
         :param arrangement: the known arrangement which describes how the image is rendered
         :param palette: the known arrangement which describes how the image is rendered"""
-        image_data = image.load()
+        image_width, image_height = image.size
+        if (image_width < arrangement.width * self.tile_width) or (image_height < arrangement.height * self.tile_height):
+            raise InvalidArgumentError("Couldn't read tileset from image of size[{}x{}] which is smaller than the "
+                                       "arrangement".format(image_width, image_height))
+        if image.mode in ("P", "L"):
+            image_data = image.tobytes()
+        else:
+            image_data = str(bytearray(image.getdata()))
+        image_data = image_data.translate(_get_modulus_table(palette.subpalette_length))
+
+        self.data = bytearray(self.num_tiles_maximum * self.tile_area)
+        self.num_tiles = self.num_tiles_maximum
         already_read_tiles = set()
-        self.tiles = [[[0 for x in range(self.tile_width)] for y in range(self.tile_height)]
-                      for n in range(self.num_tiles_maximum)]
         for y in range(arrangement.height):
             for x in range(arrangement.width):
-                arrangement_item = arrangement[x, y]
-                if arrangement_item.tile not in already_read_tiles:
-                    tile = self.tiles[arrangement_item.tile]
-                    image_x = x * self.tile_width
-                    image_y = y * self.tile_height
-                    for tile_y, tile_row in enumerate(tile):
-                        for tile_x in range(self.tile_width):
-                            tile_row[tile_x] = image_data[image_x + tile_x, image_y] % palette.subpalette_length
-                        image_y += 1
-                    already_read_tiles.add(arrangement_item.tile)
+                tile_id = arrangement[x, y].tile
+                if tile_id not in already_read_tiles:
+                    image_offset = y * self.tile_height * image_width + x * self.tile_width
+                    tile_offset = tile_id * self.tile_area
+                    for tile_y in xrange(self.tile_height):
+                        self.data[tile_offset:tile_offset + self.tile_width] = \
+                            image_data[image_offset:image_offset + self.tile_width]
+                        image_offset += image_width
+                        tile_offset += self.tile_width
+                    already_read_tiles.add(tile_id)
 
     def add_tile(self, tile, no_flip=False):
         """Adds a tile into this tileset if the tileset does not already contain it.
+        Tiles are looked up by the exact string of their pixels, so different tiles are never mistaken for each other.
 
-        :param tile: the tile to add, as a two-dimensional list
+        :param tile: the tile to add, as a two-dimensional list, or a list of strings or arrays of pixels
         :param no_flip: don't store any flips of this tile
         :return: a tuple containing the tile's id in this tileset, whether the tile is stored as vertically flipped,
         and whether the tile is stored as horizontally flipped"""
 
-        tile_hash = hash_tile(tile)
+        tile_data = "".join([row if isinstance(row, str) else str(bytearray(row)) for row in tile])
         try:
-            tile_id, vflip, hflip = self._used_tiles[tile_hash]
-            return tile_id, vflip, hflip
+            return self._used_tiles[tile_data]
         except KeyError:
             pass
 
+        if len(tile_data) != self.tile_area:
+            raise InvalidArgumentError("Couldn't add tile which is not of size[{}x{}]".format(self.tile_width,
+                                                                                               self.tile_height))
         # The tile does not already exist in this tileset, so add it
         if self._num_tiles_used >= self.num_tiles_maximum:
             # Error, not enough room for a new tile
             return 0, False, False
 
-        tile_copy = deepcopy(tile)
         tile_id = self._num_tiles_used
-        self.tiles.append(tile_copy)
         self._num_tiles_used += 1
+        self.num_tiles = max(self.num_tiles, self._num_tiles_used)
+        offset = tile_id * self.tile_area
 
         if no_flip:
-            self._used_tiles[tile_hash] = tile_id, False, False
+            self.data[offset:offset + self.tile_area] = tile_data
+            self._used_tiles[tile_data] = tile_id, False, False
             return tile_id, False, False
 
-        # The tile will be stored as horizontally flipped
-        self._used_tiles[tile_hash] = tile_id, False, True
+        rows = [tile_data[row_offset:row_offset + self.tile_width]
+                for row_offset in xrange(0, self.tile_area, self.tile_width)]
+        horizontally_flipped_rows = [row[::-1] for row in rows]
+        horizontally_flipped_tile_data = "".join(horizontally_flipped_rows)
 
-        tile_copy.reverse()
+        # The tile will be stored as horizontally flipped
+        self.data[offset:offset + self.tile_area] = horizontally_flipped_tile_data
+        self._used_tiles[tile_data] = tile_id, False, True
         # Verically flipped tile
-        self._used_tiles[hash_tile(tile_copy)] = tile_id, True, True
-
-        for row in tile_copy:
-            row.reverse()
+        self._used_tiles["".join(rows[::-1])] = tile_id, True, True
         # Vertically and horizontally flipped tile
-        self._used_tiles[hash_tile(tile_copy)] = tile_id, True, False
-
-        tile_copy.reverse()
+        self._used_tiles["".join(horizontally_flipped_rows[::-1])] = tile_id, True, False
         # Horizontally flipped tile
-        self._used_tiles[hash_tile(tile_copy)] = tile_id, False, False
+        self._used_tiles[horizontally_flipped_tile_data] = tile_id, False, False
 
         return tile_id, False, True
 
     def clear_tile(self, tile_id, color=0):
-        tile = [[color for x in range(self.tile_width)] for y in range(self.tile_height)]
-        self.tiles[tile_id] = tile
+        offset = tile_id * self.tile_area
+        self.data[offset:offset + self.tile_area] = chr(color) * self.tile_area
 
     def __eq__(self, other):
         return (isinstance(other, self.__class__)
                 and (self.num_tiles_maximum == other.num_tiles_maximum)
                 and (self.tile_width == other.tile_width)
                 and (self.tile_height == other.tile_height)
-                and (self.tiles == other.tiles))
+                and (self.num_tiles == other.num_tiles)
+                and (self.data[:self.num_tiles * self.tile_area] == other.data[:other.num_tiles * other.tile_area]))
+
+    def hash(self):
+        return crc32(buffer(self.data, 0, self.num_tiles * self.tile_area))
 
     def __getitem__(self, key):
         return self.tiles[key]
@@ -224,8 +442,89 @@ class EbTileArrangementItem(EqualityMixin, StringRepresentationMixin):
                           2)
 
 
+class _EbTileArrangementItemView(EbTileArrangementItem):
+    """An EbTileArrangementItem which reads and writes one of the packed words of an EbTileArrangement."""
+
+    def __init__(self, data, index):
+        self._data = data
+        self._index = index
+
+    def _get_bits(self, mask, shift):
+        return (self._data[self._index] & mask) >> shift
+
+    def _set_bits(self, mask, shift, value):
+        self._data[self._index] = (self._data[self._index] & ~mask) | ((value << shift) & mask)
+
+    @property
+    def tile(self):
+        return self._data[self._index] & _ARRANGEMENT_TILE_MASK
+
+    @tile.setter
+    def tile(self, tile):
+        if tile < 0 or tile > _ARRANGEMENT_TILE_MASK:
+            raise InvalidArgumentError("Invalid tile[{}]".format(tile))
+        self._set_bits(_ARRANGEMENT_TILE_MASK, 0, tile)
+
+    @property
+    def subpalette(self):
+        return self._get_bits(_ARRANGEMENT_SUBPALETTE_MASK, _ARRANGEMENT_SUBPALETTE_SHIFT)
+
+    @subpalette.setter
+    def subpalette(self, subpalette):
+        if subpalette < 0 or subpalette > 7:
+            raise InvalidArgumentError("Invalid subpalette[{}]".format(subpalette))
+        self._set_bits(_ARRANGEMENT_SUBPALETTE_MASK, _ARRANGEMENT_SUBPALETTE_SHIFT, subpalette)
+
+    @property
+    def is_vertically_flipped(self):
+        return (self._data[self._index] & _ARRANGEMENT_VERTICAL_FLIP) != 0
+
+    @is_vertically_flipped.setter
+    def is_vertically_flipped(self, is_vertically_flipped):
+        self._set_bits(_ARRANGEMENT_VERTICAL_FLIP, 15, bool(is_vertically_flipped))
+
+    @property
+    def is_horizontally_flipped(self):
+        return (self._data[self._index] & _ARRANGEMENT_HORIZONTAL_FLIP) != 0
+
+    @is_horizontally_flipped.setter
+    def is_horizontally_flipped(self, is_horizontally_flipped):
+        self._set_bits(_ARRANGEMENT_HORIZONTAL_FLIP, 14, bool(is_horizontally_flipped))
+
+    @property
+    def is_priority(self):
+        return (self._data[self._index] & _ARRANGEMENT_PRIORITY) != 0
+
+    @is_priority.setter
+    def is_priority(self, is_priority):
+        self._set_bits(_ARRANGEMENT_PRIORITY, 13, bool(is_priority))
+
+    def from_block(self, block, offset=0):
+        self._data[self._index] = block.read_multi(offset, 2)
+
+    def to_block(self, block, offset=0):
+        block.write_multi(offset, self._data[self._index], 2)
+
+    def _values(self):
+        return (self.tile, self.subpalette, self.is_vertically_flipped, self.is_horizontally_flipped,
+                self.is_priority)
+
+    def __eq__(self, other):
+        return (isinstance(other, EbTileArrangementItem)
+                and self._values() == (other.tile, other.subpalette, other.is_vertically_flipped,
+                                       other.is_horizontally_flipped, other.is_priority))
+
+    def __repr__(self):
+        return "<{}(tile={}, subpalette={}, is_vertically_flipped={}, is_horizontally_flipped={}, " \
+               "is_priority={})>".format(EbTileArrangementItem.__name__, *self._values())
+
+    __str__ = __repr__
+
+
 class EbTileArrangement(EqualityMixin):
-    """A class representing an image formed by an arrangement of tile-based graphics with a certain palette."""
+    """A class representing an image formed by an arrangement of tile-based graphics with a certain palette.
+    The arrangement is stored as an array of the 16-bit words which the SNES uses to represent each of its items, row by
+    row."""
 
     def __init__(self, width, height):
         """Creates a new EbTileArrangement.
@@ -237,75 +536,108 @@ class EbTileArrangement(EqualityMixin):
         if height <= 0:
             raise InvalidArgumentError("Couldn't create EbTileArrangement with invalid height[{}]".format(height))
         self.height = height
-        self.arrangement = [[EbTileArrangementItem() for x in range(self.width)] for y in range(self.height)]
+        self.data = array('H', [0]) * (self.width * self.height)
 
     def from_block(self, block, offset=0):
-        for row in self.arrangement:
-            for item in row:
-                item.from_block(block, offset)
-                offset += 2
+        size = self.block_size()
+        if (offset < 0) or (offset + size > block.size):
+            raise OutOfBoundsError("Attempted to read size[{}] bytes from offset[{:#x}], which is out of bounds in this "
+                                   "block of size[{:#x}]".format(size, offset, block.size))
+        self.data = array('H', block.to_array()[offset:offset + size].tostring())
+        if sys.byteorder == "big":
+            self.data.byteswap()
 
     def to_block(self, block, offset=0):
-        for row in self.arrangement:
-            for item in row:
-                item.to_block(block, offset)
-                offset += 2
+        data = self.data
+        if sys.byteorder == "big":
+            data = array('H', data)
+            data.byteswap()
+        block[offset:offset + self.block_size()] = array('B', data.tostring())
 
     def block_size(self):
-        return 2 * sum([len(x) for x in self.arrangement])
+        return 2 * len(self.data)
+
+    def hash(self):
+        return crc32(self.data)
+
+    def _set_item(self, x, y, tile, subpalette, is_vertically_flipped, is_horizontally_flipped):
+        if tile < 0 or tile > _ARRANGEMENT_TILE_MASK:
+            raise InvalidArgumentError("Invalid tile[{}]".format(tile))
+        self.data[y * self.width + x] = ((is_vertically_flipped and _ARRANGEMENT_VERTICAL_FLIP)
+                                         | (is_horizontally_flipped and _ARRANGEMENT_HORIZONTAL_FLIP)
+                                         | (subpalette << _ARRANGEMENT_SUBPALETTE_SHIFT)
+                                         | tile)
+
+    def to_bytes(self, tileset, palette):
+        """Renders this arrangement as a string of palette indices, one byte per pixel, row by row.
+        Each distinct combination of tile, subpalette, and flips is only rendered once."""
+        tile_width = tileset.tile_width
+        rendered_tiles = dict()
+        bands = []
+        for row_offset in xrange(0, len(self.data), self.width):
+            row_tiles = []
+            for word in self.data[row_offset:row_offset + self.width]:
+                # The priority flag does not affect how the tile is rendered
+                word &= ~_ARRANGEMENT_PRIORITY
+                try:
+                    rendered_tile = rendered_tiles[word]
+                except KeyError:
+                    subpalette = (word & _ARRANGEMENT_SUBPALETTE_MASK) >> _ARRANGEMENT_SUBPALETTE_SHIFT
+                    tile_data = tileset.get_tile_data(word & _ARRANGEMENT_TILE_MASK).translate(
+                        _get_offset_table(subpalette * palette.subpalette_length))
+                    rendered_tile = [tile_data[offset:offset + tile_width]
+                                     for offset in xrange(0, tileset.tile_area, tile_width)]
+                    if word & _ARRANGEMENT_VERTICAL_FLIP:
+                        rendered_tile.reverse()
+                    if word & _ARRANGEMENT_HORIZONTAL_FLIP:
+                        rendered_tile = [tile_row[::-1] for tile_row in rendered_tile]
+                    rendered_tiles[word] = rendered_tile
+                row_tiles.append(rendered_tile)
+            bands.append("".join([rendered_tile[tile_y]
+                                  for tile_y in xrange(tileset.tile_height) for rendered_tile in row_tiles]))
+        return "".join(bands)
 
     def to_image(self, image, tileset, palette):
         palette.to_image(image)
-        image_data = image.load()
-        offset_y = 0
-        for row in self.arrangement:
-            offset_x = 0
-            for item in row:
-                tile = tileset[item.tile]
-                palette_offset = item.subpalette * palette.subpalette_length
-                for tile_y in xrange(tileset.tile_height):
-                    for tile_x in xrange(tileset.tile_width):
-                        pixel_x, pixel_y = tile_x, tile_y
-                        if item.is_vertically_flipped:
-                            pixel_y = tileset.tile_height - pixel_y - 1
-                        if item.is_horizontally_flipped:
-                            pixel_x = tileset.tile_width - pixel_x - 1
-                        image_data[offset_x + tile_x, offset_y + tile_y] = tile[pixel_y][pixel_x] + palette_offset
-                offset_x += tileset.tile_width
-            offset_y += tileset.tile_height
+        image.paste(self.image(tileset, palette), (0, 0))
 
     def image(self, tileset, palette):
-        image = Image.new("P", (self.width * tileset.tile_width,
-                                self.height * tileset.tile_height),
-                          None)
-        self.to_image(image, tileset, palette)
+        image = Image.frombuffer("P", (self.width * tileset.tile_width, self.height * tileset.tile_height),
+                                 self.to_bytes(tileset, palette), "raw", "P", 0, 1)
+        palette.to_image(image)
         return image
 
     def from_image(self, image, tileset, palette, no_flip=False):
+        image_width, image_height = image.size
+        if (image_width < self.width * tileset.tile_width) or (image_height < self.height * tileset.tile_height):
+            raise InvalidUserDataError("Image of size[{}x{}] is too small to hold an arrangement of size[{}x{}]".format(
+                image_width, image_height, self.width * tileset.tile_width, self.height * tileset.tile_height))
+
+        palette.from_image(image)
         if palette.num_subpalettes == 1:
-            self._from_image_with_single_subpalette(image, tileset, palette, no_flip)
-        else:
-            # Multiple subpalettes, so we have to figure out which tile should use which subpalette
-            palette.from_image(image)
-            rgb_image = image.convert("RGB")
-            del(image)
-            rgb_image_data = rgb_image.load()
-            del rgb_image
-
-            tile = [array('B', [0] * tileset.tile_width) for i in xrange(tileset.tile_height)]
-
-            for arrangement_y in xrange(self.height):
-                image_y = arrangement_y * tileset.tile_height
-                for arrangement_x in xrange(self.width):
-                    image_x = arrangement_x * tileset.tile_width
-
-                    tile_colors = set()
-                    for tile_y in xrange(tileset.tile_height):
-                        image_tile_y = image_y + tile_y
-                        for tile_x in xrange(tileset.tile_width):
-                            r, g, b = rgb_image_data[image_x + tile_x, image_tile_y]
-                            tile_colors.add(EbColor(r=r & 0xf8, g=g & 0xf8, b=b & 0xf8))
+            # Don't need to do any subpalette fitting because there's only one subpalette
+            self._from_image_with_single_subpalette(image, tileset, no_flip)
+            return
 
+        # Multiple subpalettes, so we have to figure out which tile should use which subpalette. The colors in each
+        # tile are found from the set of palette indices in it, and the indices are translated into color ids in the
+        # chosen subpalette all at once.
+        image_data, colors = _get_image_color_indices(image)
+        subpalette_ids = dict()
+        color_id_tables = dict()
+
+        for arrangement_y in xrange(self.height):
+            image_y = arrangement_y * tileset.tile_height
+            for arrangement_x in xrange(self.width):
+                image_x = arrangement_x * tileset.tile_width
+                tile = _get_tile_rows(image_data, image_width, image_x, image_y, tileset.tile_width,
+                                      tileset.tile_height)
+
+                tile_color_indices = frozenset("".join(tile))
+                try:
+                    subpalette_id = subpalette_ids[tile_color_indices]
+                except KeyError:
+                    tile_colors = set([EbColor(*colors[ord(i)]) for i in tile_color_indices])
                     try:
                         subpalette_id = palette.get_subpalette_for_colors(tile_colors)
                     except InvalidArgumentError as e:
@@ -314,54 +646,41 @@ class EbTileArrangement(EqualityMixin):
                                 tileset.tile_width, tileset.tile_height, image_x, image_y, palette.subpalette_length,
                                 list(tile_colors), palette.subpalettes
                             ))
+                    subpalette_ids[tile_color_indices] = subpalette_id
 
-                    for tile_y in xrange(tileset.tile_height):
-                        image_tile_y = image_y + tile_y
-                        for tile_x in xrange(tileset.tile_width):
-                            image_tile_x = image_x + tile_x
-                            tile[tile_y][tile_x] = palette.get_color_id(rgb_image_data[image_tile_x, image_tile_y],
-                                                                        subpalette_id)
-
-                    tile_id, vflip, hflip = tileset.add_tile(tile, no_flip)
-                    arrangement_item = self.arrangement[arrangement_y][arrangement_x]
-                    arrangement_item.tile = tile_id
-                    arrangement_item.subpalette = subpalette_id
-                    arrangement_item.is_vertically_flipped = vflip
-                    arrangement_item.is_horizontally_flipped = hflip
-                    arrangement_item.is_priority = False
-
-    def _from_image_with_single_subpalette(self, image, tileset, palette, no_flip=False):
-        # Don't need to do any subpalette fitting because there's only one subpalette
-        palette.from_image(image)
-        image_data = image.load()
+                try:
+                    color_id_table = color_id_tables[subpalette_id]
+                except KeyError:
+                    color_id_table = color_id_tables[subpalette_id] = str(bytearray(
+                        [palette.get_color_id(color, subpalette_id) for color in colors]))
+                tile = [tile_row.translate(color_id_table) for tile_row in tile]
 
-        tile = [array('B', [0] * tileset.tile_width) for i in xrange(tileset.tile_height)]
+                tile_id, vflip, hflip = tileset.add_tile(tile, no_flip)
+                self._set_item(arrangement_x, arrangement_y, tile_id, subpalette_id, vflip, hflip)
+
+    def _from_image_with_single_subpalette(self, image, tileset, no_flip=False):
+        image_width = image.size[0]
+        if image.mode in ("P", "L"):
+            image_data = image.tobytes()
+        else:
+            image_data = str(bytearray(image.getdata()))
 
         for arrangement_y in xrange(self.height):
             image_y = arrangement_y * tileset.tile_height
             for arrangement_x in xrange(self.width):
                 image_x = arrangement_x * tileset.tile_width
-
-                for tile_y in xrange(tileset.tile_height):
-                    image_tile_y = image_y + tile_y
-                    tile_row = tile[tile_y]
-                    for tile_x in xrange(tileset.tile_width):
-                        tile_row[tile_x] = image_data[image_x + tile_x, image_tile_y]
+                tile = _get_tile_rows(image_data, image_width, image_x, image_y, tileset.tile_width,
+                                      tileset.tile_height)
 
                 tile_id, vflip, hflip = tileset.add_tile(tile, no_flip)
-                arrangement_item = self.arrangement[arrangement_y][arrangement_x]
-                arrangement_item.tile = tile_id
-                arrangement_item.subpalette = 0
-                arrangement_item.is_vertically_flipped = vflip
-                arrangement_item.is_horizontally_flipped = hflip
-                arrangement_item.is_priority = False
+                self._set_item(arrangement_x, arrangement_y, tile_id, 0, vflip, hflip)
 
     def __getitem__(self, key):
         x, y = key
         if x < 0 or y < 0 or x >= self.width or y >= self.height:
             raise InvalidArgumentError("Couldn't get arrangement item[{},{}] from arrangement of size[{}x{}]".format(
                 x, y, self.width, self.height))
-        return self.arrangement[y][x]
+        return _EbTileArrangementItemView(self.data, y * self.width + x)
 
 
 class EbCompressedGraphic(object):
@@ -1,14 +1,12 @@
 from functools import partial
 
-import yaml
-
 from coilsnake.exceptions.common.exceptions import InvalidArgumentError, TableEntryInvalidYmlRepresentationError, \
     InvalidYmlRepresentationError
 from coilsnake.model.common.table import LittleEndianIntegerTableEntry, Table, MatrixTable, \
     GenericLittleEndianRowTableEntry, TableEntry, LittleEndianHexIntegerTableEntry
 from coilsnake.model.eb.palettes import EbPalette
 from coilsnake.model.eb.pointers import EbPointer
-from coilsnake.util.common.assets import open_asset
+from coilsnake.util.common.assets import load_asset_index
 from coilsnake.util.eb.helper import is_in_bank
 from coilsnake.util.eb.pointer import from_snes_address, to_snes_address
 from coilsnake.util.eb.text import standard_text_from_block, standard_text_to_block, standard_text_to_byte_list
@@ -207,16 +205,9 @@ class EbRowTableEntry(GenericLittleEndianRowTableEntry):
            "standardtext null-terminated": (EbStandardNullTerminatedTextTableEntry, ["name", "size"])})
 
 
-_EB_SCHEMA_MAP = None
-
-with open_asset("structures", "eb.yml") as f:
-    i = 1
-    for doc in yaml.load_all(f, Loader=yaml.CSafeLoader):
-        if i == 1:
-            i += 1
-        elif i == 2:
-            _EB_SCHEMA_MAP = doc
-            break
+def _get_eb_schema_map():
+    # The table schemas are in the second document of eb.yml
+    return load_asset_index(["structures", "eb.yml"], document=1)
 
 
 def eb_table_from_offset(offset, single_column=None, matrix_dimensions=None, hidden_columns=None, num_rows=None,
@@ -225,7 +216,7 @@ def eb_table_from_offset(offset, single_column=None, matrix_dimensions=None, hid
         hidden_columns = []
 
     try:
-        schema_specification = _EB_SCHEMA_MAP[offset]
+        schema_specification = _get_eb_schema_map()[offset]
     except KeyError:
         raise InvalidArgumentError("Could not setup EbTable from unknown offset[{:#x}]".format(offset))
 
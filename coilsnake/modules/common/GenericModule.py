@@ -1,6 +1,8 @@
 class GenericModule(object):
     NAME = "Abstract Generic Module"
     FREE_RANGES = []
+    # Names of the modules, as listed in modulelist.txt, which must read from the project before this module does
+    DEPENDENCIES = []
 
     @staticmethod
     def is_compatible_with_romtype(romtype):
@@ -1,3 +1,4 @@
+from functools import partial
 import logging
 
 from coilsnake.model.common.blocks import Block
@@ -6,7 +7,7 @@ from coilsnake.model.eb.graphics import EbGraphicTileset, EbTileArrangement
 from coilsnake.model.eb.palettes import EbPalette
 from coilsnake.model.eb.table import eb_table_from_offset
 from coilsnake.modules.eb.EbModule import EbModule
-from coilsnake.util.common.image import open_indexed_image
+from coilsnake.util.common.image import read_images, write_images
 from coilsnake.util.eb.pointer import from_snes_address, read_asm_pointer, to_snes_address, write_asm_pointer
 
 
@@ -105,13 +106,13 @@ class BattleBgModule(EbModule):
             self.distortion_table.to_yml_file(f)
 
         # Export BGs by table entry
-        for i in range(self.bg_table.num_rows):
+        def create_image(i):
             tileset, color_depth, arrangement = self.backgrounds[self.bg_table[i][0]]
             palette = self.palettes[self.bg_table[i][1]]
+            return arrangement.image(tileset, palette)
 
-            with resource_open("BattleBGs/" + str(i).zfill(3), "png") as f:
-                image = arrangement.image(tileset, palette)
-                image.save(f, "png")
+        write_images(resource_open, [("BattleBGs/" + str(i).zfill(3), partial(create_image, i))
+                                     for i in range(self.bg_table.num_rows)])
 
     def read_from_project(self, resource_open):
         with resource_open("bg_data_table", "yml") as f:
@@ -123,34 +124,39 @@ class BattleBgModule(EbModule):
 
         self.backgrounds = []
         self.palettes = []
-        for i in range(self.bg_table.num_rows):
+        # Lists of the indices of backgrounds and palettes by their hashes, so that each new background and palette
+        # only needs to be compared to the ones which might be the same
+        background_indices = dict()
+        palette_indices = dict()
+        images = read_images(resource_open, ["BattleBGs/" + str(i).zfill(3) for i in range(self.bg_table.num_rows)])
+        for i, image in enumerate(images):
             new_color_depth = self.bg_table[i][2]
-            with resource_open("BattleBGs/" + str(i).zfill(3), "png") as f:
-                image = open_indexed_image(f)
-
-                new_palette = EbPalette(num_subpalettes=1, subpalette_length=16)
-                new_tileset = EbGraphicTileset(num_tiles=512, tile_width=8, tile_height=8)
-                new_arrangement = EbTileArrangement(width=32, height=32)
-
-                new_arrangement.from_image(image, new_tileset, new_palette)
-
-                for j, (tileset, color_depth, arrangement) in enumerate(self.backgrounds):
-                    if (color_depth == new_color_depth) \
-                            and (tileset == new_tileset) \
-                            and (arrangement == new_arrangement):
-                        self.bg_table[i][0] = j
-                        break
-                else:
-                    self.bg_table[i][0] = len(self.backgrounds)
-                    self.backgrounds.append((new_tileset, new_color_depth, new_arrangement))
-
-                for j, palette in enumerate(self.palettes):
-                    if palette == new_palette:
-                        self.bg_table[i][1] = j
-                        break
-                else:
-                    self.bg_table[i][1] = len(self.palettes)
-                    self.palettes.append(new_palette)
+            new_palette = EbPalette(num_subpalettes=1, subpalette_length=16)
+            new_tileset = EbGraphicTileset(num_tiles=512, tile_width=8, tile_height=8)
+            new_arrangement = EbTileArrangement(width=32, height=32)
+
+            new_arrangement.from_image(image, new_tileset, new_palette)
+
+            background_hash = (new_color_depth, new_tileset.hash(), new_arrangement.hash())
+            for j in background_indices.get(background_hash, []):
+                tileset, color_depth, arrangement = self.backgrounds[j]
+                if (tileset == new_tileset) and (arrangement == new_arrangement):
+                    self.bg_table[i][0] = j
+                    break
+            else:
+                self.bg_table[i][0] = len(self.backgrounds)
+                background_indices.setdefault(background_hash, []).append(len(self.backgrounds))
+                self.backgrounds.append((new_tileset, new_color_depth, new_arrangement))
+
+            palette_hash = new_palette.hash()
+            for j in palette_indices.get(palette_hash, []):
+                if self.palettes[j] == new_palette:
+                    self.bg_table[i][1] = j
+                    break
+            else:
+                self.bg_table[i][1] = len(self.palettes)
+                palette_indices.setdefault(palette_hash, []).append(len(self.palettes))
+                self.palettes.append(new_palette)
 
     def write_to_rom(self, rom):
         # Write the data table
@@ -161,18 +167,23 @@ class BattleBgModule(EbModule):
         # Write graphics and arrangements
         self.graphics_pointer_table.recreate(num_rows=len(self.backgrounds))
         self.arrangement_pointer_table.recreate(num_rows=len(self.backgrounds))
-        for i, (tileset, color_depth, arrangement) in enumerate(self.backgrounds):
-            with EbCompressibleBlock(size=tileset.block_size(bpp=color_depth)) as compressed_block:
-                tileset.to_block(block=compressed_block, offset=0, bpp=color_depth)
-                compressed_block.compress()
-                tileset_offset = rom.allocate(data=compressed_block)
-                self.graphics_pointer_table[i] = [to_snes_address(tileset_offset)]
-
-            with EbCompressibleBlock(size=arrangement.block_size()) as compressed_block:
-                arrangement.to_block(block=compressed_block, offset=0)
-                compressed_block.compress()
-                arrangement_offset = rom.allocate(data=compressed_block)
-                self.arrangement_pointer_table[i] = [to_snes_address(arrangement_offset)]
+        compressed_blocks = []
+        for tileset, color_depth, arrangement in self.backgrounds:
+            compressed_block = EbCompressibleBlock(size=tileset.block_size(bpp=color_depth))
+            tileset.to_block(block=compressed_block, offset=0, bpp=color_depth)
+            compressed_block.compress()
+            compressed_blocks.append(compressed_block)
+
+            compressed_block = EbCompressibleBlock(size=arrangement.block_size())
+            arrangement.to_block(block=compressed_block, offset=0)
+            compressed_block.compress()
+            compressed_blocks.append(compressed_block)
+
+        offsets = rom.allocate_all(compressed_blocks)
+        del compressed_blocks
+        for i in range(len(self.backgrounds)):
+            self.graphics_pointer_table[i] = [to_snes_address(offsets[2 * i])]
+            self.arrangement_pointer_table[i] = [to_snes_address(offsets[2 * i + 1])]
 
         graphics_pointer_table_offset = rom.allocate(size=self.graphics_pointer_table.size)
         self.graphics_pointer_table.to_block(block=rom, offset=graphics_pointer_table_offset)
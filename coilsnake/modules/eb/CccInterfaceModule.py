@@ -10,6 +10,7 @@ log = logging.getLogger(__name__)
 
 class CccInterfaceModule(EbModule):
     NAME = "CCScript Labels"
+    DEPENDENCIES = []
 
     SUMMARY_RESOURCE_NAME = 'ccscript/summary'
     SUMMARY_RESOURCE_EXTENSION = 'txt'
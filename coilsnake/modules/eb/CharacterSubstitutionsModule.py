@@ -14,6 +14,7 @@ MODULE_COMMENT = """# List all text characters that you would like to substitute
 
 class CharacterSubstitutionsModule(EbModule):
     NAME = "Character Substitutions"
+    DEPENDENCIES = []
     FILE = 'Fonts/character_substitutions'
 
     def read_from_project(self, resource_open):
@@ -1,7 +1,7 @@
 from coilsnake.model.eb.doors import door_from_block, door_from_yml_rep, not_in_destination_bank
 from coilsnake.model.eb.table import eb_table_from_offset
 from coilsnake.modules.eb.EbModule import EbModule
-from coilsnake.util.common.yml import convert_values_to_hex_repr, yml_load, yml_dump
+from coilsnake.util.common.yml import yml_load, yml_dump
 from coilsnake.util.eb.pointer import from_snes_address, to_snes_address
 
 
@@ -50,11 +50,7 @@ class DoorModule(EbModule):
                 x += 1
 
         with resourceOpener("map_doors", "yml") as f:
-            s = yml_dump(
-                out,
-                default_flow_style=False)
-            s = convert_values_to_hex_repr(yml_str_rep=s, key="Event Flag")
-            f.write(s)
+            yml_dump(out, f, default_flow_style=False, hex_keys=["Event Flag"])
 
     def read_from_project(self, resourceOpener):
         self.door_areas = []
@@ -1,22 +1,50 @@
-import sys
+import array
+import logging
+import os
 
+from coilsnake.exceptions.common.exceptions import InvalidArgumentError
+from coilsnake.exceptions.eb.exceptions import InvalidEbCompressedDataError
 from coilsnake.modules.common.GenericModule import GenericModule
+from coilsnake.util.eb import python_comp
 
 try:
     from coilsnake.util.eb import native_comp
 
     hasNativeComp = True
 except ImportError:
+    native_comp = None
     hasNativeComp = False
 
-if not hasNativeComp:
-    print "WARNING: Could not load native EarthBound compression library"
-    raise NotImplementedError("WARNING: Could not load native EarthBound compression library")
+log = logging.getLogger(__name__)
 
 address_labels = dict()
 
+# The compression levels supported by comp, mapped to the levels used by the compression codecs.
+# "fast" only looks for copies of earlier data, "normal" produces the same output as CoilSnake always has, and
+# "optimal" finds the smallest possible output, which takes several times longer.
+COMPRESSION_LEVELS = {"fast": 0, "normal": 1, "optimal": 2}
+
+# Increment this whenever the output of the compressor changes, so that previously cached compressed data is not reused
+COMPRESSOR_VERSION = 1
+
+# The implementations of the compression format, by name. They produce identical output, but the native library is
+# much faster.
+COMPRESSION_CODECS = {"python": python_comp}
+if hasNativeComp:
+    COMPRESSION_CODECS["native"] = native_comp
+
+# The environment variable which, when set, selects the compression codec used by default
+COMPRESSION_CODEC_ENVIRONMENT_VARIABLE = "COILSNAKE_COMPRESSION_CODEC"
+
+_codec_name = None
+_codec = None
+
 
 class EbModule(GenericModule):
+    # Pointers in the project may refer to CCScript labels, which are loaded by the CccInterfaceModule, and text in the
+    # project is converted using the character substitutions loaded by the CharacterSubstitutionsModule
+    DEPENDENCIES = ["eb.CccInterfaceModule", "eb.CharacterSubstitutionsModule"]
+
     @staticmethod
     def is_compatible_with_romtype(romtype):
         return romtype == "Earthbound"
@@ -24,29 +52,87 @@ class EbModule(GenericModule):
 
 # Comp/Decomp
 
+def get_compression_codec():
+    """Returns the name of the compression codec in use."""
+    return _codec_name
+
+
+def set_compression_codec(name):
+    """Selects the compression codec used by the functions below.
+    :param name: one of the names in COMPRESSION_CODECS"""
+    global _codec_name, _codec
+    if name not in COMPRESSION_CODECS:
+        raise InvalidArgumentError("Unknown or unavailable compression codec[{}]".format(name))
+    _codec_name = name
+    _codec = COMPRESSION_CODECS[name]
+
+
+def _select_default_compression_codec():
+    name = os.environ.get(COMPRESSION_CODEC_ENVIRONMENT_VARIABLE)
+    if name and name not in COMPRESSION_CODECS:
+        log.warn("Unknown or unavailable compression codec[{}] in {}, ignoring it".format(
+            name, COMPRESSION_CODEC_ENVIRONMENT_VARIABLE))
+        name = None
+    if not name:
+        if not hasNativeComp:
+            log.warn("Could not load the native EarthBound compression library, using the slower Python version")
+        name = "native" if hasNativeComp else "python"
+    set_compression_codec(name)
+
+_select_default_compression_codec()
+
+
 def _decomp(rom, cdata):
-    raise NotImplementedError("Python decomp not implemented")
+    return python_comp.decomp(rom, cdata)
 
 
-def _comp(udata):
-    raise NotImplementedError("Python comp not implemented")
+def _comp(udata, level="normal"):
+    return python_comp.comp(udata, COMPRESSION_LEVELS[level])
 
 
 # Frontends
 
-def decomp(rom, cdata):
+def decompress(data, offset):
+    """Decompresses the compressed data at an offset in a buffer, such as a block's data array.
+    :return: the decompressed data as an array of bytes"""
+    try:
+        return array.array('B', _codec.decompress(data, offset))
+    except (ValueError, IndexError):
+        raise InvalidEbCompressedDataError("Couldn't decompress invalid data at offset[{:#x}]".format(offset))
+
+
+def decompress_many(data, offsets):
+    """Decompresses the compressed data at each of several offsets in a buffer in a single call, which is much faster
+    than decompressing them one at a time.
+    :return: a list of arrays of bytes, one for each offset"""
     try:
-        if hasNativeComp:
-            return native_comp.decomp(rom, cdata)
-        else:
-            return _decomp(rom, cdata)
-    except SystemError:
-        print >> sys.stderr, "Could not decompress data @ " + hex(cdata)
+        return [array.array('B', x) for x in _codec.decompress_many(data, offsets)]
+    except (ValueError, IndexError):
+        # Find the offset which failed in order to report it
+        for offset in offsets:
+            decompress(data, offset)
         raise
 
 
-def comp(udata):
-    if hasNativeComp:
-        return native_comp.comp(udata)
-    else:
-        return _comp(udata)
+def compress(data, level="normal"):
+    """Compresses a buffer, such as a block's data array.
+    :param level: one of the names in COMPRESSION_LEVELS
+    :return: the compressed data as an array of bytes"""
+    if level not in COMPRESSION_LEVELS:
+        raise InvalidArgumentError("Unknown compression level[{}]".format(level))
+
+    try:
+        return array.array('B', _codec.compress(data, COMPRESSION_LEVELS[level]))
+    except ValueError as e:
+        raise InvalidArgumentError(str(e))
+
+
+def decomp(rom, cdata):
+    return decompress(rom.data, cdata).tolist()
+
+
+def comp(udata, level="normal"):
+    if level not in COMPRESSION_LEVELS:
+        raise InvalidArgumentError("Unknown compression level[{}]".format(level))
+
+    return _codec.comp(udata, COMPRESSION_LEVELS[level])
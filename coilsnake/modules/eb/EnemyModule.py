@@ -1,3 +1,4 @@
+from functools import partial
 import logging
 
 from coilsnake.model.eb.blocks import EbCompressibleBlock
@@ -6,7 +7,7 @@ from coilsnake.model.eb.palettes import EbPalette
 from coilsnake.model.eb.sprites import EbBattleSprite
 from coilsnake.model.eb.table import eb_table_from_offset
 from coilsnake.modules.eb.EbModule import EbModule
-from coilsnake.util.common.image import open_indexed_image
+from coilsnake.util.common.image import read_images, write_images
 from coilsnake.util.common.yml import replace_field_in_yml, yml_load, yml_dump
 from coilsnake.util.eb.pointer import from_snes_address, read_asm_pointer, to_snes_address, write_asm_pointer
 
@@ -54,11 +55,12 @@ class EnemyModule(EbModule):
         self.graphics_pointer_table.from_block(
             rom, from_snes_address(read_asm_pointer(block=rom, offset=GRAPHICS_POINTER_TABLE_ASM_POINTER_OFFSET)))
         self.battle_sprites = []
-        for i in range(self.graphics_pointer_table.num_rows):
-            with EbCompressibleBlock() as compressed_block:
-                compressed_block.from_compressed_block(
-                    block=rom,
-                    offset=from_snes_address(self.graphics_pointer_table[i][0]))
+        compressed_blocks = EbCompressibleBlock.many_from_compressed_block(
+            block=rom,
+            offsets=[from_snes_address(self.graphics_pointer_table[i][0])
+                     for i in range(self.graphics_pointer_table.num_rows)])
+        for i, compressed_block in enumerate(compressed_blocks):
+            with compressed_block:
                 sprite = EbBattleSprite()
                 sprite.from_block(block=compressed_block, offset=0, size=self.graphics_pointer_table[i][1])
                 self.battle_sprites.append(sprite)
@@ -99,13 +101,17 @@ class EnemyModule(EbModule):
 
         # Write the sprites
         self.graphics_pointer_table.recreate(num_rows=len(self.battle_sprites))
-        for i, battle_sprite in enumerate(self.battle_sprites):
-            self.graphics_pointer_table[i] = [None, battle_sprite.size()]
-            with EbCompressibleBlock(size=battle_sprite.block_size()) as compressed_block:
-                battle_sprite.to_block(block=compressed_block, offset=0)
-                compressed_block.compress()
-                graphics_offset = rom.allocate(data=compressed_block)
-                self.graphics_pointer_table[i][0] = to_snes_address(graphics_offset)
+        compressed_blocks = []
+        for battle_sprite in self.battle_sprites:
+            compressed_block = EbCompressibleBlock(size=battle_sprite.block_size())
+            battle_sprite.to_block(block=compressed_block, offset=0)
+            compressed_block.compress()
+            compressed_blocks.append(compressed_block)
+
+        offsets = rom.allocate_all(compressed_blocks)
+        del compressed_blocks
+        for i, (battle_sprite, graphics_offset) in enumerate(zip(self.battle_sprites, offsets)):
+            self.graphics_pointer_table[i] = [to_snes_address(graphics_offset), battle_sprite.size()]
 
         graphics_pointer_table_offset = rom.allocate(size=self.graphics_pointer_table.size)
         self.graphics_pointer_table.to_block(block=rom, offset=graphics_pointer_table_offset)
@@ -138,16 +144,15 @@ class EnemyModule(EbModule):
 
         # Write the battle sprite images
         log.debug("Writing battle sprites")
+        images = []
         for i in range(self.enemy_config_table.num_rows):
             battle_sprite_id = self.enemy_config_table[i][4]
             if battle_sprite_id > 0:
                 palette_id = self.enemy_config_table[i][14]
                 palette = self.palettes[palette_id]
-
-                image = self.battle_sprites[battle_sprite_id - 1].image(palette=palette)
-                with resource_open("BattleSprites/" + str(i).zfill(3), "png") as f:
-                    image.save(f, "png", transparency=0)
-                del image
+                images.append(("BattleSprites/" + str(i).zfill(3),
+                               partial(self.battle_sprites[battle_sprite_id - 1].image, palette=palette)))
+        write_images(resource_open, images, transparency=0)
 
         # Write the groups
         log.debug("Writing groups")
@@ -180,22 +185,22 @@ class EnemyModule(EbModule):
         num_sprites = 0
         palette_hashes = dict()
         num_palettes = 0
-        for i in range(self.enemy_config_table.num_rows):
-            battle_sprite = EbBattleSprite()
-            palette = EbPalette(num_subpalettes=1, subpalette_length=16)
-
-            try:
-                with resource_open("BattleSprites/" + str(i).zfill(3), "png") as f:
-                    image = open_indexed_image(f)
-                    battle_sprite.from_image(image)
-                    palette.from_image(image)
-                    del image
-            except IOError:
+        images = read_images(resource_open,
+                             ["BattleSprites/" + str(i).zfill(3) for i in range(self.enemy_config_table.num_rows)],
+                             ignore_missing=True)
+        for i, image in enumerate(images):
+            if image is None:
                 # No battle sprite
                 self.enemy_config_table[i][4] = 0
                 self.enemy_config_table[i][14] = 0
                 continue
 
+            battle_sprite = EbBattleSprite()
+            palette = EbPalette(num_subpalettes=1, subpalette_length=16)
+            battle_sprite.from_image(image)
+            palette.from_image(image)
+            del image
+
             sprite_hash = battle_sprite.hash()
             try:
                 self.enemy_config_table[i][4] = sprite_hashes[sprite_hash] + 1
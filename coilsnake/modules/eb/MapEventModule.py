@@ -3,7 +3,7 @@ import logging
 from coilsnake.model.eb.map_events import MapEventPointerTableEntry, MapEventSubTableEntry
 from coilsnake.model.eb.table import eb_table_from_offset
 from coilsnake.modules.eb.EbModule import EbModule
-from coilsnake.util.common.yml import convert_values_to_hex_repr_in_yml_file, yml_load, yml_dump
+from coilsnake.util.common.yml import yml_load, yml_dump
 from coilsnake.util.eb.pointer import from_snes_address, to_snes_address
 
 
@@ -73,10 +73,7 @@ class MapEventModule(EbModule):
                             entry["Tile Changes"][j] = MapEventSubTableEntry.to_yml_rep(change)
 
             with resource_open_w("map_changes", "yml") as f:
-                yml_dump(data, f)
-
-            convert_values_to_hex_repr_in_yml_file("map_changes", resource_open_r, resource_open_w, ["Event Flag"],
-                                                   default_flow_style=None)
+                yml_dump(data, f, hex_keys=["Event Flag"])
 
             self.upgrade_project(5, new_version, rom, resource_open_r, resource_open_w, resource_delete)
         else:
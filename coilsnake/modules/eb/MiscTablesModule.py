@@ -2,7 +2,7 @@ import logging
 
 from coilsnake.model.eb.table import eb_table_from_offset
 from coilsnake.modules.eb.EbModule import EbModule
-from coilsnake.util.common.yml import convert_values_to_hex_repr, replace_field_in_yml, yml_load, yml_dump
+from coilsnake.util.common.yml import replace_field_in_yml, yml_load, yml_dump
 from coilsnake.util.eb.pointer import from_snes_address
 
 log = logging.getLogger(__name__)
@@ -118,12 +118,9 @@ class MiscTablesModule(EbModule):
 
             with resource_open_r("timed_delivery_table", "yml") as f:
                 out = yml_load(f)
-                yml_str_rep = yml_dump(out, default_flow_style=False)
-
-            yml_str_rep = convert_values_to_hex_repr(yml_str_rep, "Event Flag")
 
             with resource_open_w("timed_delivery_table", "yml") as f:
-                f.write(yml_str_rep)
+                yml_dump(out, f, default_flow_style=False, hex_keys=["Event Flag"])
 
             self.upgrade_project(old_version=old_version + 1,
                                  new_version=new_version,
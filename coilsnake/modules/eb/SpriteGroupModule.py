@@ -1,10 +1,12 @@
+from functools import partial
+
 from coilsnake.exceptions.common.exceptions import CoilSnakeError
 from coilsnake.model.common.blocks import Block
 from coilsnake.model.eb.palettes import EbPalette
 from coilsnake.model.eb.sprites import SpriteGroup, SPRITE_SIZES
 from coilsnake.model.eb.table import eb_table_from_offset
 from coilsnake.modules.eb.EbModule import EbModule
-from coilsnake.util.common.image import open_indexed_image
+from coilsnake.util.common.image import read_images, write_images
 from coilsnake.util.common.yml import replace_field_in_yml, yml_load, yml_dump
 from coilsnake.util.eb.pointer import from_snes_address, to_snes_address
 
@@ -53,10 +55,10 @@ class SpriteGroupModule(EbModule):
         out = {}
         for i, group in enumerate(self.groups):
             out[i] = group.yml_rep()
-            image = group.image(self.palette_table[group.palette][0])
-            with resource_open("SpriteGroups/" + str(i).zfill(3), 'png') as image_file:
-                image.save(image_file, 'png', transparency=0)
-            del image
+        write_images(resource_open, [("SpriteGroups/" + str(i).zfill(3),
+                                      partial(group.image, self.palette_table[group.palette][0]))
+                                     for i, group in enumerate(self.groups)],
+                     transparency=0)
         with resource_open("sprite_groups", "yml") as f:
             yml_dump(out, f)
 
@@ -68,17 +70,15 @@ class SpriteGroupModule(EbModule):
             input = yml_load(f)
             num_groups = len(input)
             self.groups = []
-            for i in range(num_groups):
+            images = read_images(resource_open, ["SpriteGroups/" + str(i).zfill(3) for i in range(num_groups)])
+            for i, image in enumerate(images):
                 group = SpriteGroup(16)
                 group.from_yml_rep(input[i])
 
                 palette = EbPalette(1, 16)
-
-                with resource_open("SpriteGroups/" + str(i).zfill(3), "png") as f2:
-                    image = open_indexed_image(f2)
-                    group.from_image(image)
-                    palette.from_image(image)
-                    del image
+                group.from_image(image)
+                palette.from_image(image)
+                del image
 
                 self.groups.append(group)
 
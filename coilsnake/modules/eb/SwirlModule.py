@@ -1,3 +1,4 @@
+from itertools import izip
 import logging
 
 from coilsnake.exceptions.common.exceptions import CoilSnakeTraceableError
@@ -6,7 +7,7 @@ from coilsnake.model.eb.swirls import Swirl, write_swirl_frames
 from coilsnake.model.eb.table import eb_table_from_offset
 from coilsnake.modules.common.PatchModule import get_ips_filename
 from coilsnake.modules.eb.EbModule import EbModule
-from coilsnake.util.common.image import open_indexed_image
+from coilsnake.util.common.image import read_images, write_images
 from coilsnake.util.common.yml import yml_dump, yml_load
 from coilsnake.util.eb.pointer import from_snes_address, to_snes_address
 
@@ -97,29 +98,29 @@ class SwirlModule(EbModule):
             swirl_data = yml_load(f)
 
         self.swirls = [Swirl() for i in xrange(self.swirl_table.num_rows)]
+        frame_ids = []
         for swirl_id, swirl in enumerate(self.swirls):
-            log.debug("Reading Swirl #{}".format(swirl_id))
-            speed = swirl_data[swirl_id]["speed"]
-            num_frames = swirl_data[swirl_id]["frames"]
-
-            swirl.speed = speed
-            for frame_id in range(num_frames):
-                with resource_open("Swirls/{}/{}".format(swirl_id, str(frame_id).zfill(3)), "png") as f:
-                    image = open_indexed_image(f)
-                    try:
-                        swirl.add_frame_from_image(image)
-                    except Exception as e:
-                        message = "Encountered error while reading frame #{} of swirl #{}".format(frame_id, swirl_id)
-                        raise CoilSnakeTraceableError(message, e)
+            swirl.speed = swirl_data[swirl_id]["speed"]
+            frame_ids += [(swirl_id, frame_id) for frame_id in range(swirl_data[swirl_id]["frames"])]
+
+        images = read_images(resource_open, ["Swirls/{}/{}".format(swirl_id, str(frame_id).zfill(3))
+                                             for swirl_id, frame_id in frame_ids])
+        for (swirl_id, frame_id), image in izip(frame_ids, images):
+            if frame_id == 0:
+                log.debug("Reading Swirl #{}".format(swirl_id))
+            try:
+                self.swirls[swirl_id].add_frame_from_image(image)
+            except Exception as e:
+                message = "Encountered error while reading frame #{} of swirl #{}".format(frame_id, swirl_id)
+                raise CoilSnakeTraceableError(message, e)
 
     def write_to_project(self, resource_open):
         swirl_data = {}
+        images = []
         for i, swirl in enumerate(self.swirls):
             swirl_data[i] = {"speed": swirl.speed, "frames": len(swirl.frames)}
-            for j, frame in enumerate(swirl.frames):
-                with resource_open("Swirls/{}/{}".format(i, str(j).zfill(3)), "png") as f:
-                    image = frame.image()
-                    image.save(f, "png")
+            images += [("Swirls/{}/{}".format(i, str(j).zfill(3)), frame.image) for j, frame in enumerate(swirl.frames)]
+        write_images(resource_open, images)
         with resource_open("Swirls/swirls", "yml") as f:
             yml_dump(swirl_data, f, default_flow_style=False)
 
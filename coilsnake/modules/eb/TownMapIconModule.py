@@ -1,7 +1,7 @@
 from coilsnake.model.eb.table import eb_table_from_offset
 from coilsnake.model.eb.town_maps import TownMapIconPlacementPointerTableEntry, TownMapEnum
 from coilsnake.modules.eb.EbModule import EbModule
-from coilsnake.util.common.yml import convert_values_to_hex_repr_in_yml_file, yml_load, yml_dump
+from coilsnake.util.common.yml import yml_load, yml_dump
 from coilsnake.util.eb.pointer import read_asm_pointer, write_asm_pointer, from_snes_address, to_snes_address
 
 
@@ -47,10 +47,7 @@ class TownMapIconModule(EbModule):
                     data[i] = data[old_key]
                     del data[old_key]
             with resource_open_w("TownMaps/icon_positions", "yml") as f:
-                yml_dump(data, f, default_flow_style=False)
-
-            convert_values_to_hex_repr_in_yml_file("TownMaps/icon_positions", resource_open_r, resource_open_w,
-                                                   ["Event Flag"])
+                yml_dump(data, f, default_flow_style=False, hex_keys=["Event Flag"])
 
             self.upgrade_project(5, new_version, rom, resource_open_r, resource_open_w, resource_delete)
         elif old_version <= 2:
@@ -0,0 +1,183 @@
+import array
+import cPickle as pickle
+import hashlib
+import logging
+import os
+
+from coilsnake.ui.information import VERSION
+
+
+log = logging.getLogger(__name__)
+
+# Increment this whenever the format of the cached data changes, so that old caches are not reused
+BUILD_CACHE_VERSION = 3
+
+# The name of the directory inside the project in which the build cache is stored
+BUILD_CACHE_DIRECTORY_NAME = ".cache"
+
+_INDEX_FILENAME = "index.pickle"
+
+
+def get_file_digest(filename, chunk_size=0x10000):
+    md5 = hashlib.md5()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class BuildCacheEntry(object):
+    """The changes which a module made to the ROM and its allocated ranges when it was last compiled."""
+
+    def __init__(self, key, rom_size, allocation_policy_name, unallocated_ranges_before, unallocated_ranges_after,
+                 changes):
+        self.key = key
+        self.rom_size = rom_size
+        self.allocation_policy_name = allocation_policy_name
+        self.unallocated_ranges_before = unallocated_ranges_before
+        self.unallocated_ranges_after = unallocated_ranges_after
+        self.changes = changes
+
+    def is_applicable_to(self, rom):
+        return ((rom.size == self.rom_size)
+                and (rom.allocation_policy.NAME == self.allocation_policy_name)
+                and (rom.unallocated_ranges == self.unallocated_ranges_before))
+
+    def apply_to(self, rom):
+        for offset, data in self.changes:
+            rom[offset:offset + len(data)] = array.array('B', data)
+        rom.unallocated_ranges = list(self.unallocated_ranges_after)
+
+
+class BuildCacheRecorder(object):
+    """A context manager which records the changes made to a ROM while it is open, and stores them in the build
+    cache when it is closed without an error.
+    Every range which is written to is recorded, even if it was written with the data it already held, since an
+    earlier module which is compiled again may have written different data there by the time the changes are
+    replayed."""
+
+    def __init__(self, build_cache, module_name, module_class, project, rom):
+        self.build_cache = build_cache
+        self.module_name = module_name
+        self.module_class = module_class
+        self.project = project
+        self.rom = rom
+
+    def __enter__(self):
+        self.rom_size_before = self.rom.size
+        self.unallocated_ranges_before = list(self.rom.unallocated_ranges)
+        self.rom.start_recording_writes()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        written_ranges = self.rom.stop_recording_writes()
+        if type is None:
+            if self.rom.size != self.rom_size_before:
+                log.debug("Not caching {} because it changed the size of the ROM".format(self.module_class.NAME))
+            else:
+                entry = BuildCacheEntry(key=self.build_cache.get_key(self.module_name, self.module_class,
+                                                                     self.project),
+                                        rom_size=self.rom.size,
+                                        allocation_policy_name=self.rom.allocation_policy.NAME,
+                                        unallocated_ranges_before=self.unallocated_ranges_before,
+                                        unallocated_ranges_after=list(self.rom.unallocated_ranges),
+                                        changes=[(begin, self.rom.to_array()[begin:end].tostring())
+                                                 for begin, end in written_ranges])
+                self.build_cache.set_entry(self.module_name, entry)
+
+
+class BuildCache(object):
+    """A persistent cache, stored in the project directory, of the changes which each module made to the ROM during
+    the last compilation.
+
+    A module's entry is keyed on the contents of the base ROM, the compilation settings, the contents of every
+    project resource belonging to the module or to the modules which it depends upon, and the allocated ranges of the
+    ROM before the module is written. When all of these are unchanged, writing the module to the ROM is replaced by
+    replaying its cached changes."""
+
+    def __init__(self, project_path, base_rom_digest, settings=""):
+        """
+        :param settings: a string describing any other settings which affect the output of the modules
+        """
+        self.project_path = project_path
+        self.directory = os.path.join(project_path, BUILD_CACHE_DIRECTORY_NAME)
+        self.base_rom_digest = base_rom_digest
+        self.settings = settings
+        self._keys = dict()
+        self._file_digests = dict()
+        self._dirty = False
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.directory, _INDEX_FILENAME), "rb") as f:
+                index = pickle.load(f)
+            if index["version"] == BUILD_CACHE_VERSION:
+                self._keys = index["keys"]
+                self._file_digests = index["file_digests"]
+        except (IOError, OSError, EOFError, KeyError, TypeError, pickle.UnpicklingError):
+            log.debug("Could not load the build cache index, starting with an empty build cache")
+
+    def save(self):
+        if not self._dirty:
+            return
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        with open(os.path.join(self.directory, _INDEX_FILENAME), "wb") as f:
+            pickle.dump({"version": BUILD_CACHE_VERSION,
+                         "keys": self._keys,
+                         "file_digests": self._file_digests}, f, pickle.HIGHEST_PROTOCOL)
+        self._dirty = False
+
+    def _get_resource_digest(self, filename):
+        path = os.path.join(self.project_path, filename)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        # Only re-read files whose size or modification time has changed since they were last hashed
+        signature = (stat.st_size, stat.st_mtime)
+        cached_signature, digest = self._file_digests.get(filename, (None, None))
+        if cached_signature != signature:
+            digest = get_file_digest(path)
+            self._file_digests[filename] = (signature, digest)
+            self._dirty = True
+        return digest
+
+    def get_key(self, module_name, module_class, project):
+        md5 = hashlib.md5()
+        md5.update("{}\0{}\0{}\0{}\0{}\0".format(BUILD_CACHE_VERSION, VERSION, self.base_rom_digest, self.settings,
+                                                 module_name))
+        for name in [module_name] + module_class.DEPENDENCIES:
+            for resource_name, filename in sorted(project.get_resources(name).iteritems()):
+                md5.update("{}\0{}\0{}\0{}\0".format(name, resource_name, filename,
+                                                     self._get_resource_digest(filename)))
+        return md5.hexdigest()
+
+    def _get_entry_filename(self, module_name):
+        return os.path.join(self.directory, module_name + ".pickle")
+
+    def get_entry(self, module_name, module_class, project):
+        """Returns the cached entry for a module if its inputs have not changed since it was cached, or None."""
+        key = self.get_key(module_name, module_class, project)
+        if self._keys.get(module_name) != key:
+            return None
+        try:
+            with open(self._get_entry_filename(module_name), "rb") as f:
+                entry = pickle.load(f)
+        except (IOError, OSError, EOFError, AttributeError, pickle.UnpicklingError):
+            return None
+        # The entry file may have been rewritten by a compilation which failed before the index was saved
+        return entry if entry.key == key else None
+
+    def set_entry(self, module_name, entry):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        with open(self._get_entry_filename(module_name), "wb") as f:
+            pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+        self._keys[module_name] = entry.key
+        self._dirty = True
+
+    def record(self, module_name, module_class, project, rom):
+        return BuildCacheRecorder(self, module_name, module_class, project, rom)
@@ -2,6 +2,8 @@
 import argparse
 import logging
 
+from coilsnake.model.common.blocks import ALLOCATION_POLICIES
+from coilsnake.modules.eb.EbModule import COMPRESSION_LEVELS
 from coilsnake.ui.common import compile_project, decompile_rom, upgrade_project, setup_logging
 from coilsnake.ui.information import coilsnake_about
 
@@ -19,11 +21,33 @@ def main():
     compile_parser.add_argument("project_directory")
     compile_parser.add_argument("base_rom")
     compile_parser.add_argument("output_rom")
+    compile_parser.add_argument("-j", "--jobs", type=int, default=1,
+                                help="number of modules to read from the project in parallel (0 for one per CPU)")
+    compile_parser.add_argument("--no-cache", dest="use_build_cache", action="store_false",
+                                help="recompile every module, reparse every yml file, and recompress all data instead "
+                                     "of reusing the output of previous compilations")
+    compile_parser.add_argument("--allocation-policy", choices=sorted(ALLOCATION_POLICIES.keys()), default=None,
+                                help="how to choose where in the ROM's free space data is written")
+    compile_parser.add_argument("--batch-allocation", action="store_true",
+                                help="place modules' compressed graphics largest-first, so that more of them fit in "
+                                     "fragmented free space")
+    compile_parser.add_argument("--compression-level", choices=sorted(COMPRESSION_LEVELS.keys()), default=None,
+                                help="how hard to try to make compressed data smaller")
+    compile_parser.add_argument("--compression-report", action="store_true",
+                                help="report how many bytes the compression level saved for each module")
+    compile_parser.add_argument("--free-space-report", action="store_true",
+                                help="report how many bytes were left unallocated in each bank")
+    compile_parser.add_argument("-m", "--module", dest="module_names", action="append", default=None,
+                                help="only compile this module and the modules it depends upon (may be repeated)")
     compile_parser.set_defaults(func=_compile)
 
     decompile_parser = subparsers.add_parser("decompile", help="decompile from rom to project")
     decompile_parser.add_argument("rom")
     decompile_parser.add_argument("project_directory")
+    decompile_parser.add_argument("-j", "--jobs", type=int, default=1,
+                                  help="number of modules to decompile in parallel (0 for one per CPU)")
+    decompile_parser.add_argument("-m", "--module", dest="module_names", action="append", default=None,
+                                  help="only decompile this module and the modules it depends upon (may be repeated)")
     decompile_parser.set_defaults(func=_decompile)
 
     upgrade_parser = subparsers.add_parser("upgrade",
@@ -45,12 +69,24 @@ def main():
 def _compile(args):
     compile_project(project_path=args.project_directory,
                     base_rom_filename=args.base_rom,
-                    output_rom_filename=args.output_rom)
+                    output_rom_filename=args.output_rom,
+                    jobs=args.jobs,
+                    use_build_cache=args.use_build_cache,
+                    allocation_policy=args.allocation_policy,
+                    compression_level=args.compression_level,
+                    compression_report=args.compression_report,
+                    use_compression_cache=args.use_build_cache,
+                    use_yml_cache=args.use_build_cache,
+                    module_names=args.module_names,
+                    batch_allocation=args.batch_allocation,
+                    free_space_report=args.free_space_report)
 
 
 def _decompile(args):
     decompile_rom(rom_filename=args.rom,
-                  project_path=args.project_directory)
+                  project_path=args.project_directory,
+                  jobs=args.jobs,
+                  module_names=args.module_names)
 
 
 def _upgrade(args):
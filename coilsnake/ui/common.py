@@ -9,18 +9,28 @@ from ccscript import ccc
 from CCScriptWriter.CCScriptWriter import CCScriptWriter
 
 from coilsnake.model.common.ips import IpsPatch
-from coilsnake.model.eb.blocks import EbRom
+from coilsnake.model.eb.blocks import EbRom, EbCompressibleBlock, CompressionReport
 from coilsnake.model.eb.ebp import EbpPatch
 from coilsnake.util.common.project import FORMAT_VERSION, PROJECT_FILENAME, get_version_name
 from coilsnake.exceptions.common.exceptions import CoilSnakeError, CCScriptCompilationError
-from coilsnake.model.common.blocks import Rom, ROM_TYPE_NAME_UNKNOWN
+from coilsnake.model.common.blocks import Rom, ROM_TYPE_NAME_UNKNOWN, ALLOCATION_POLICIES
+from coilsnake.ui.build_cache import BUILD_CACHE_DIRECTORY_NAME, BuildCache, get_file_digest
 from coilsnake.ui.formatter import CoilSnakeFormatter
+from coilsnake.ui.module_registry import get_module_classes
+from coilsnake.ui.scheduler import compile_modules, decompile_modules, get_number_of_jobs
 from coilsnake.util.common.project import Project
-from coilsnake.util.common.assets import open_asset, ccscript_library_path
+from coilsnake.util.common.assets import ccscript_library_path
+from coilsnake.util.common.cache import DiskCache, get_cache_filename
+from coilsnake.util.common import yml
 
 
 log = logging.getLogger(__name__)
 
+# The maximum number of bytes of compressed data cached between compilations
+COMPRESSION_CACHE_MAX_SIZE = 64 * 1024 * 1024
+# The maximum number of bytes of parsed yml files cached in a project between compilations
+YML_CACHE_MAX_SIZE = 64 * 1024 * 1024
+
 
 def setup_logging(quiet=False, verbose=False, stream=None):
     # Disable the weird "STREAM" logging messages in Pillow 3.0.0
@@ -83,8 +93,11 @@ def upgrade_project(project_path, base_rom_filename, progress_bar=None):
     log.info("Upgraded {} in {:.2f}s".format(project_path, time.time() - upgrade_start_time))
 
 
-def compile_project(project_path, base_rom_filename, output_rom_filename, ccscript_offset=None, progress_bar=None):
-    modules = load_modules()
+def compile_project(project_path, base_rom_filename, output_rom_filename, ccscript_offset=None, progress_bar=None,
+                    jobs=1, use_build_cache=True, allocation_policy=None, compression_level=None,
+                    compression_report=False, use_compression_cache=True, use_yml_cache=True,
+                    module_names=None, batch_allocation=False, free_space_report=False):
+    modules = load_modules(module_names)
 
     project_filename = os.path.join(project_path, PROJECT_FILENAME)
     project = Project()
@@ -92,8 +105,18 @@ def compile_project(project_path, base_rom_filename, output_rom_filename, ccscri
     check_if_project_too_old(project)
     check_if_project_too_new(project)
 
-    if base_rom_filename != output_rom_filename:
-        copyfile(base_rom_filename, output_rom_filename)
+    compression_level = compression_level or EbCompressibleBlock.compression_level
+    if compression_report:
+        # Every block needs to be compressed for the report to be complete
+        log.debug("Not using the build cache, since a compression report was requested")
+        use_build_cache = False
+
+    if use_build_cache:
+        build_cache = BuildCache(project_path=project_path, base_rom_digest=get_file_digest(base_rom_filename),
+                                 settings="compression-level={} batch-allocation={}".format(compression_level,
+                                                                                            batch_allocation))
+    else:
+        build_cache = None
 
     # Compile scripts using CCScript
     script_filenames = [os.path.join(project_path, "ccscript", x)
@@ -101,6 +124,11 @@ def compile_project(project_path, base_rom_filename, output_rom_filename, ccscri
                         if x.lower().endswith('.ccs')]
 
     if script_filenames:
+        # CCScript writes directly to the output ROM, so it has to start out as a copy of the base ROM
+        if base_rom_filename != output_rom_filename:
+            copyfile(base_rom_filename, output_rom_filename)
+        rom_filename = output_rom_filename
+
         log.info("Compiling CCScript")
         if not ccscript_offset:
             ccscript_offset = "F10000"
@@ -118,46 +146,85 @@ def compile_project(project_path, base_rom_filename, output_rom_filename, ccscri
             log.info("Finished compiling CCScript")
         else:
             raise CCScriptCompilationError("CCScript compilation failed with output:\n" + ccc_log)
+    else:
+        rom_filename = base_rom_filename
 
     rom = Rom()
-    rom.from_file(output_rom_filename)
+    rom.from_file(rom_filename)
     check_if_types_match(project=project, rom=rom)
+    if allocation_policy is not None:
+        rom.allocation_policy = ALLOCATION_POLICIES[allocation_policy]
+    rom.batch_allocation = batch_allocation
 
     compatible_modules = [(name, clazz) for name, clazz in modules if clazz.is_compatible_with_romtype(rom.type)]
-    tick_amount = 1.0/(2*len(compatible_modules))
 
     log.info("Compiling Project {}".format(project_path))
     compile_start_time = time.time()
 
-    for module_name, module_class in modules:
-        if module_class.is_compatible_with_romtype(rom.type):
-            for free_range in module_class.FREE_RANGES:
-                rom.deallocate(free_range)
-
-    for module_name, module_class in modules:
-        if not module_class.is_compatible_with_romtype(rom.type):
-            continue
-
-        log.info("Compiling {}...".format(module_class.NAME))
-        start_time = time.time()
-        with module_class() as module:
-            module.read_from_project(lambda x, y: project.get_resource(module_name, x, y, 'rb'))
-            if progress_bar:
-                progress_bar.tick(tick_amount)
-            module.write_to_rom(rom)
-            if progress_bar:
-                progress_bar.tick(tick_amount)
-        log.info("Finished compiling {} in {:.2f}s".format(module_class.NAME, time.time() - start_time))
+    for module_name, module_class in compatible_modules:
+        for free_range in module_class.FREE_RANGES:
+            rom.deallocate(free_range)
+
+    report = CompressionReport() if compression_report else None
+    default_compression_level = EbCompressibleBlock.compression_level
+    EbCompressibleBlock.compression_level = compression_level
+    EbCompressibleBlock.compression_report = report
+    if use_compression_cache:
+        EbCompressibleBlock.compression_cache = DiskCache(directory=get_cache_filename("compression"),
+                                                          max_size=COMPRESSION_CACHE_MAX_SIZE)
+    if use_yml_cache:
+        yml.yml_cache = DiskCache(directory=os.path.join(project_path, BUILD_CACHE_DIRECTORY_NAME, "yml"),
+                                  max_size=YML_CACHE_MAX_SIZE)
+    try:
+        compile_modules(compatible_modules, rom, project, jobs=get_number_of_jobs(jobs), progress_bar=progress_bar,
+                        build_cache=build_cache,
+                        write_context=(lambda x: report.recording(x.NAME)) if report else None)
+    finally:
+        EbCompressibleBlock.compression_level = default_compression_level
+        EbCompressibleBlock.compression_report = None
+        EbCompressibleBlock.compression_cache = None
+        yml.yml_cache = None
+    log_unallocated_space(rom, report_by_bank=free_space_report)
+    if report:
+        log_compression_report(report, compression_level)
 
     log.debug("Saving ROM")
-    rom.to_file(output_rom_filename)
+    num_bytes_written = rom.write_back_to_file(output_rom_filename)
+    log.debug("Wrote {} bytes to {}".format(num_bytes_written, output_rom_filename))
+
+    if build_cache is not None:
+        log.debug("Saving build cache")
+        build_cache.save()
 
     log.info("Compiled to {} in {:.2f}s, finished at {}".format(
         output_rom_filename, time.time() - compile_start_time, datetime.now().strftime('%I:%M:%S %p')))
 
 
-def decompile_rom(rom_filename, project_path, progress_bar=None):
-    modules = load_modules()
+def log_unallocated_space(rom, report_by_bank=False):
+    """Logs how much space was left unallocated in the ROM. The figures for each bank are logged at the info level if
+    report_by_bank is set, otherwise at the debug level."""
+    bank_level = logging.INFO if report_by_bank else logging.DEBUG
+    statistics_by_bank = rom.get_allocation_statistics_by_bank()
+    for bank, statistics in sorted(statistics_by_bank.iteritems()):
+        log.log(bank_level, "Bank {:#04x}: {} unallocated bytes in {} ranges, the largest being {} bytes".format(
+            bank, statistics.unallocated_size, statistics.num_unallocated_ranges,
+            statistics.largest_unallocated_size))
+    statistics = rom.get_allocation_statistics()
+    log.info("{} bytes were left unallocated in {} ranges across {} banks".format(
+        statistics.unallocated_size, statistics.num_unallocated_ranges, len(statistics_by_bank)))
+
+
+def log_compression_report(report, compression_level):
+    for resource_name, (num_blocks, uncompressed_size, normal_size, compressed_size) in report.entries.iteritems():
+        log.info("{}: {} blocks, {} bytes uncompressed, {} bytes at the normal compression level, {} bytes at the {} "
+                 "compression level ({} bytes saved)".format(resource_name, num_blocks, uncompressed_size,
+                                                              normal_size, compressed_size, compression_level,
+                                                              normal_size - compressed_size))
+    log.info("The {} compression level saved {} bytes in total".format(compression_level, report.get_bytes_saved()))
+
+
+def decompile_rom(rom_filename, project_path, progress_bar=None, jobs=1, module_names=None):
+    modules = load_modules(module_names)
 
     rom = Rom()
     rom.from_file(rom_filename)
@@ -166,25 +233,11 @@ def decompile_rom(rom_filename, project_path, progress_bar=None):
     project.load(os.path.join(project_path, PROJECT_FILENAME), rom.type)
 
     compatible_modules = [(name, clazz) for name, clazz in modules if clazz.is_compatible_with_romtype(rom.type)]
-    tick_amount = 1.0/(2*len(compatible_modules))
 
     log.info("Decompiling ROM {}".format(rom_filename))
     decompile_start_time = time.time()
 
-    for module_name, module_class in compatible_modules:
-        if not module_class.is_compatible_with_romtype(rom.type):
-            continue
-
-        log.info("Decompiling {}...".format(module_class.NAME))
-        start_time = time.time()
-        with module_class() as module:
-            module.read_from_rom(rom)
-            if progress_bar:
-                progress_bar.tick(tick_amount)
-            module.write_to_project(lambda x, y: project.get_resource(module_name, x, y, 'wb'))
-            if progress_bar:
-                progress_bar.tick(tick_amount)
-        log.info("Finished decompiling {} in {:.2f}s".format(module_class.NAME, time.time() - start_time))
+    decompile_modules(compatible_modules, rom, project, jobs=get_number_of_jobs(jobs), progress_bar=progress_bar)
 
     log.debug("Saving Project")
     project.write(os.path.join(project_path, PROJECT_FILENAME))
@@ -267,17 +320,12 @@ def patch_rom(clean_rom_filename, patched_rom_filename, patch_filename, headered
     log.info("Patched to {} in {:.2f}s".format(patched_rom_filename, time.time() - patching_start_time))
 
 
-def load_modules():
-    all_modules = []
-    with open_asset("modulelist.txt") as f:
-        for line in f:
-            line = line.rstrip('\n')
-            if line[0] == '#':
-                continue
-            components = line.split('.')
-            mod = __import__("coilsnake.modules." + line, globals(), locals(), [components[-1]])
-            all_modules.append((line, mod.__dict__[components[-1]]))
-    return all_modules
+def load_modules(module_names=None):
+    """Returns the modules to run, in the order in which they are run. The code of each module is only imported when
+    the module is instantiated.
+    :param module_names: the names of the modules to run, as listed in modulelist.txt, or None to run every module
+    :return: a list of (module name, module class) tuples"""
+    return get_module_classes(module_names)
 
 
 def check_if_project_too_new(project):
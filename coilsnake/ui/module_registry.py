@@ -0,0 +1,142 @@
+from collections import namedtuple
+import hashlib
+import logging
+import os
+
+from coilsnake.exceptions.common.exceptions import CoilSnakeError
+from coilsnake.model.common.blocks import ROM_TYPE_NAME_UNKNOWN, get_rom_type_map
+import coilsnake.modules
+from coilsnake.ui.information import VERSION
+from coilsnake.util.common.assets import asset_path, open_asset
+from coilsnake.util.common.cache import get_cache_filename, load_pickle, save_pickle
+
+
+log = logging.getLogger(__name__)
+
+# Increment this whenever the format of ModuleInfo changes, so that old manifests are not reused
+MODULE_MANIFEST_VERSION = 1
+
+# The metadata of a module which is needed to schedule it, recorded so that the module doesn't need to be imported
+ModuleInfo = namedtuple("ModuleInfo", ["name", "display_name", "compatible_romtypes", "free_ranges",
+                                       "dependencies"])
+
+
+def get_module_names():
+    """Returns the names of all the modules listed in modulelist.txt, in the order in which they are run."""
+    module_names = []
+    with open_asset("modulelist.txt") as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if (not line) or line[0] == '#':
+                continue
+            module_names.append(line)
+    return module_names
+
+
+def import_module_class(module_name):
+    components = module_name.split('.')
+    mod = __import__("coilsnake.modules." + module_name, globals(), locals(), [components[-1]])
+    return mod.__dict__[components[-1]]
+
+
+class LazyModuleClass(object):
+    """Stands in for a module's class. The attributes which are used to schedule the module are read from the module
+    manifest, and the module's code is only imported when the module is instantiated."""
+
+    def __init__(self, info):
+        self.info = info
+        self.NAME = info.display_name
+        self.FREE_RANGES = info.free_ranges
+        self.DEPENDENCIES = info.dependencies
+        self.__name__ = info.name.split('.')[-1]
+        self._module_class = None
+
+    def is_compatible_with_romtype(self, romtype):
+        return romtype in self.info.compatible_romtypes
+
+    def get_module_class(self):
+        if self._module_class is None:
+            self._module_class = import_module_class(self.info.name)
+        return self._module_class
+
+    def __call__(self, *args, **kwargs):
+        return self.get_module_class()(*args, **kwargs)
+
+
+def _get_sources_key():
+    """Returns a digest which changes whenever the list of modules, the ROM types, or the code of any module may have
+    changed."""
+    md5 = hashlib.md5("{}\0{}\0".format(MODULE_MANIFEST_VERSION, VERSION))
+    for path in [["modulelist.txt"], ["romtypes.yml"]]:
+        with open(asset_path(path), 'rb') as f:
+            md5.update(f.read())
+
+    # Only the sources are hashed, since the compiled files are written when the modules are first imported
+    modules_directory = os.path.dirname(coilsnake.modules.__file__)
+    for directory, _, filenames in sorted(os.walk(modules_directory)):
+        for filename in sorted(filenames):
+            if not filename.endswith(".py"):
+                continue
+            try:
+                stat = os.stat(os.path.join(directory, filename))
+            except OSError:
+                continue
+            md5.update("{}\0{}\0{}\0".format(os.path.relpath(os.path.join(directory, filename), modules_directory),
+                                             stat.st_size, stat.st_mtime))
+    return md5.hexdigest()
+
+
+def _create_module_manifest():
+    romtypes = get_rom_type_map().keys() + [ROM_TYPE_NAME_UNKNOWN]
+    manifest = []
+    for module_name in get_module_names():
+        module_class = import_module_class(module_name)
+        manifest.append(ModuleInfo(
+            name=module_name,
+            display_name=module_class.NAME,
+            compatible_romtypes=frozenset(x for x in romtypes if module_class.is_compatible_with_romtype(x)),
+            free_ranges=list(module_class.FREE_RANGES),
+            dependencies=list(module_class.DEPENDENCIES)))
+    return manifest
+
+
+def get_module_manifest():
+    """Returns a list of the ModuleInfo of every module, in the order in which they are run. The manifest is stored in
+    the shared cache directory, and is only created again, by importing every module, when the modules have changed."""
+    key = _get_sources_key()
+    filename = get_cache_filename("modules.pickle")
+    cache = load_pickle(filename)
+    if isinstance(cache, dict) and cache.get("key") == key:
+        return cache["manifest"]
+
+    log.debug("Creating the module manifest")
+    manifest = _create_module_manifest()
+    save_pickle(filename, {"key": key, "manifest": manifest})
+    return manifest
+
+
+def get_module_classes(module_names=None):
+    """Returns the modules to run, without importing them.
+    :param module_names: the names of the modules to run, as listed in modulelist.txt, or None to run every module. The
+    modules which these depend upon are included as well.
+    :return: a list of (module name, LazyModuleClass) tuples, in the order in which the modules are run"""
+    manifest = get_module_manifest()
+    if module_names is None:
+        return [(info.name, LazyModuleClass(info)) for info in manifest]
+
+    infos = dict((info.name, info) for info in manifest)
+    selected_names = set()
+
+    def select(module_name):
+        if module_name not in infos:
+            raise CoilSnakeError("Unknown module {}. Valid modules are: {}".format(
+                module_name, ", ".join(info.name for info in manifest)))
+        if module_name in selected_names:
+            return
+        selected_names.add(module_name)
+        for dependency_name in infos[module_name].dependencies:
+            select(dependency_name)
+
+    for module_name in module_names:
+        select(module_name)
+    return [(info.name, LazyModuleClass(info)) for info in manifest if info.name in selected_names]
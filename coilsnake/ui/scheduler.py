@@ -0,0 +1,314 @@
+from contextlib import contextmanager
+from itertools import izip
+import cPickle as pickle
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+
+from coilsnake.exceptions.common.exceptions import CoilSnakeError, CoilSnakeTraceableError
+from coilsnake.model.common.table import Table
+
+
+log = logging.getLogger(__name__)
+
+# The state which the worker processes need in order to run a module. It is set up by the main process right before
+# the worker pool is created, and the workers inherit it when they are forked.
+_worker_context = None
+
+
+class _WorkerContext(object):
+    def __init__(self, module_classes, rom, project):
+        self.module_classes = module_classes
+        self.rom = rom
+        self.project = project
+
+
+class _TableState(object):
+    """The picklable part of a Table. Table schemas are generated at runtime and can't be pickled, but the module
+    receiving this state creates an identical schema in its own constructor."""
+
+    def __init__(self, table):
+        self.num_rows = table.num_rows
+        self.values = table.values
+
+
+def get_number_of_jobs(jobs):
+    """Returns the number of worker processes to use for a requested number of jobs.
+    :param jobs: the requested number of jobs, or 0 to use one job per CPU core"""
+    if jobs is None or jobs < 0:
+        return 1
+    elif jobs == 0:
+        try:
+            return multiprocessing.cpu_count()
+        except NotImplementedError:
+            return 1
+    return jobs
+
+
+def _can_run_in_parallel(jobs, num_modules):
+    # The workers rely on inheriting the loaded ROM, project, and module state from the main process
+    return (jobs > 1) and (num_modules > 1) and hasattr(os, "fork")
+
+
+def _get_dependency_names(modules):
+    """Returns the names of the modules which other modules depend upon, in the order in which they must be run."""
+    module_names = [name for name, clazz in modules]
+    dependencies = dict((name, [x for x in clazz.DEPENDENCIES if x in module_names]) for name, clazz in modules)
+
+    ordered_names = []
+    visiting = set()
+
+    def visit(name):
+        if name in ordered_names:
+            return
+        elif name in visiting:
+            raise CoilSnakeError("Module {} has a circular dependency".format(name))
+        visiting.add(name)
+        for dependency_name in dependencies[name]:
+            visit(dependency_name)
+        visiting.remove(name)
+        ordered_names.append(name)
+
+    depended_upon = set(x for name in module_names for x in dependencies[name])
+    for name in module_names:
+        if name in depended_upon:
+            visit(name)
+    return ordered_names
+
+
+def _export_module_state(module):
+    state = dict()
+    for key, value in vars(module).iteritems():
+        if isinstance(value, Table):
+            state[key] = _TableState(value)
+        else:
+            state[key] = value
+    try:
+        return pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return None
+
+
+def _import_module_state(module, pickled_state):
+    state = pickle.loads(pickled_state)
+    for key, value in state.iteritems():
+        if isinstance(value, _TableState) and not isinstance(getattr(module, key, None), Table):
+            return False
+
+    for key, value in state.iteritems():
+        if isinstance(value, _TableState):
+            table = getattr(module, key)
+            table.recreate(num_rows=value.num_rows)
+            table.values = value.values
+        else:
+            setattr(module, key, value)
+    return True
+
+
+@contextmanager
+def _null_context():
+    yield
+
+
+def _picklable_error(module_class, e):
+    try:
+        pickle.loads(pickle.dumps(e, pickle.HIGHEST_PROTOCOL))
+        return e
+    except Exception:
+        return CoilSnakeTraceableError("Error in module {}".format(module_class.NAME), str(e))
+
+
+def _decompile_module_in_worker(module_name):
+    module_class = _worker_context.module_classes[module_name]
+    project = _worker_context.project
+    try:
+        log.info("Decompiling {}...".format(module_class.NAME))
+        start_time = time.time()
+        with module_class() as module:
+            module.read_from_rom(_worker_context.rom)
+            module.write_to_project(lambda x, y: project.get_resource(module_name, x, y, 'wb'))
+        return project.get_resources(module_name), time.time() - start_time, None
+    except Exception as e:
+        log.debug(traceback.format_exc())
+        return None, None, _picklable_error(module_class, e)
+
+
+def _read_module_from_project_in_worker(module_name):
+    module_class = _worker_context.module_classes[module_name]
+    project = _worker_context.project
+    try:
+        start_time = time.time()
+        with module_class() as module:
+            module.read_from_project(lambda x, y: project.get_resource(module_name, x, y, 'rb'))
+            state = _export_module_state(module)
+        return state, project.get_resources(module_name), time.time() - start_time, None
+    except Exception as e:
+        log.debug(traceback.format_exc())
+        return None, None, None, _picklable_error(module_class, e)
+
+
+def _create_pool(jobs, module_classes, rom, project):
+    global _worker_context
+    _worker_context = _WorkerContext(module_classes=module_classes, rom=rom, project=project)
+    try:
+        return multiprocessing.Pool(processes=jobs)
+    finally:
+        _worker_context = None
+
+
+def decompile_modules(modules, rom, project, jobs=1, progress_bar=None):
+    """Runs the decompilation phase of each module, writing the results to the project.
+    :param modules: a list of (module name, module class) tuples, in the order in which they should be run
+    :param jobs: the number of modules which may be run simultaneously in separate processes"""
+    tick_amount = 1.0/(2*len(modules))
+
+    def decompile_module(module_name, module_class):
+        log.info("Decompiling {}...".format(module_class.NAME))
+        start_time = time.time()
+        with module_class() as module:
+            module.read_from_rom(rom)
+            if progress_bar:
+                progress_bar.tick(tick_amount)
+            module.write_to_project(lambda x, y: project.get_resource(module_name, x, y, 'wb'))
+            if progress_bar:
+                progress_bar.tick(tick_amount)
+        log.info("Finished decompiling {} in {:.2f}s".format(module_class.NAME, time.time() - start_time))
+
+    if not _can_run_in_parallel(jobs, len(modules)):
+        for module_name, module_class in modules:
+            decompile_module(module_name, module_class)
+        return
+
+    # Modules which others depend upon run in this process first, so that any state they set up is inherited by
+    # the worker processes
+    dependency_names = _get_dependency_names(modules)
+    module_classes = dict(modules)
+    for module_name in dependency_names:
+        decompile_module(module_name, module_classes[module_name])
+
+    worker_module_names = [name for name, clazz in modules if name not in dependency_names]
+    pool = _create_pool(jobs, module_classes, rom, project)
+    try:
+        results = pool.imap(_decompile_module_in_worker, worker_module_names)
+        for module_name, (resources, elapsed_time, error) in izip(worker_module_names, results):
+            if error is not None:
+                raise error
+            project.set_resources(module_name, resources)
+            if progress_bar:
+                progress_bar.tick(2 * tick_amount)
+            log.info("Finished decompiling {} in {:.2f}s".format(module_classes[module_name].NAME, elapsed_time))
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def compile_modules(modules, rom, project, jobs=1, progress_bar=None, build_cache=None, write_context=None):
+    """Reads each module's data from the project and writes it to the ROM.
+    Reading from the project may be done simultaneously in separate processes, but the modules are always written to
+    the ROM one at a time in the order given, so that the output is the same regardless of the number of jobs.
+    :param modules: a list of (module name, module class) tuples, in the order in which they should be run
+    :param jobs: the number of modules which may be read from the project simultaneously
+    :param build_cache: a BuildCache from which the output of unchanged modules is reused, or None
+    :param write_context: a function which takes a module class and returns a context manager, which is entered while
+    that module is written to the ROM, or None"""
+    tick_amount = 1.0/(2*len(modules))
+
+    # Modules which others depend upon set up state used by the other modules, so they always need to be run
+    dependency_names = _get_dependency_names(modules)
+    cache_entries = dict()
+    if build_cache is not None:
+        for module_name, module_class in modules:
+            if module_name not in dependency_names:
+                entry = build_cache.get_entry(module_name, module_class, project)
+                if entry is not None:
+                    cache_entries[module_name] = entry
+
+    def read_module_from_project(module_name, module_class):
+        module = module_class()
+        module.read_from_project(lambda x, y: project.get_resource(module_name, x, y, 'rb'))
+        if progress_bar:
+            progress_bar.tick(tick_amount)
+        return module
+
+    def write_module_to_rom(module_name, module, module_class):
+        with module:
+            if (build_cache is None) or (module_name in dependency_names):
+                recorder = _null_context()
+            else:
+                recorder = build_cache.record(module_name, module_class, project, rom)
+            with recorder, (write_context(module_class) if write_context else _null_context()):
+                module.write_to_rom(rom)
+            if progress_bar:
+                progress_bar.tick(tick_amount)
+
+    def apply_cache_entry(module_name, module_class):
+        # A cached entry can only be reused if the modules before it allocated the same ranges as last time
+        entry = cache_entries.pop(module_name, None)
+        if (entry is None) or (not entry.is_applicable_to(rom)):
+            return False
+        log.debug("Reusing the cached output of {}".format(module_class.NAME))
+        entry.apply_to(rom)
+        if progress_bar:
+            progress_bar.tick(2 * tick_amount)
+        return True
+
+    if not _can_run_in_parallel(jobs, len(modules) - len(cache_entries)):
+        for module_name, module_class in modules:
+            log.info("Compiling {}...".format(module_class.NAME))
+            start_time = time.time()
+            if not apply_cache_entry(module_name, module_class):
+                module = read_module_from_project(module_name, module_class)
+                write_module_to_rom(module_name, module, module_class)
+            log.info("Finished compiling {} in {:.2f}s".format(module_class.NAME, time.time() - start_time))
+        return
+
+    # Modules which others depend upon read from the project in this process first, so that any state they set up
+    # is inherited by the worker processes
+    module_classes = dict(modules)
+    read_modules = dict()
+    for module_name in dependency_names:
+        read_modules[module_name] = read_module_from_project(module_name, module_classes[module_name])
+
+    worker_module_names = [name for name, clazz in modules
+                           if (name not in dependency_names) and (name not in cache_entries)]
+    pool = _create_pool(jobs, module_classes, rom, project)
+    try:
+        results = pool.imap(_read_module_from_project_in_worker, worker_module_names)
+        for module_name, module_class in modules:
+            log.info("Compiling {}...".format(module_class.NAME))
+            start_time = time.time()
+            elapsed_time = 0
+            if module_name in read_modules:
+                module = read_modules.pop(module_name)
+            elif module_name in cache_entries:
+                if apply_cache_entry(module_name, module_class):
+                    log.info("Finished compiling {} in {:.2f}s".format(module_class.NAME, time.time() - start_time))
+                    continue
+                module = read_module_from_project(module_name, module_class)
+            else:
+                state, resources, elapsed_time, error = results.next()
+                if error is not None:
+                    raise error
+                project.set_resources(module_name, resources)
+                module = module_class()
+                if (state is None) or (not _import_module_state(module, state)):
+                    log.debug("Could not transfer the state of {}, reading it again in the main process".format(
+                        module_class.NAME))
+                    module.__exit__(None, None, None)
+                    module = read_module_from_project(module_name, module_class)
+                elif progress_bar:
+                    progress_bar.tick(tick_amount)
+            write_module_to_rom(module_name, module, module_class)
+            log.info("Finished compiling {} in {:.2f}s".format(module_class.NAME,
+                                                              time.time() - start_time + elapsed_time))
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
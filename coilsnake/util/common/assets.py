@@ -1,7 +1,19 @@
+import cPickle as pickle
+import hashlib
 import os
 import sys
 
+import yaml
+
 from coilsnake.root import ASSET_PATH
+from coilsnake.util.common.cache import get_cache_filename, load_pickle, save_pickle
+
+
+# Increment this whenever the format of the asset indexes changes, so that old caches are not reused
+ASSET_INDEX_VERSION = 1
+
+# The asset indexes which have already been loaded by this process, keyed on their asset path and document number
+_asset_indexes = dict()
 
 
 def asset_path(path):
@@ -13,4 +25,70 @@ def open_asset(*path):
 
 
 def ccscript_library_path():
-    return asset_path(["mobile-sprout", "lib"])
\ No newline at end of file
+    return asset_path(["mobile-sprout", "lib"])
+
+
+class AssetIndex(object):
+    """A read-only mapping from a yml asset, in which each value is kept pickled until it is looked up. Every lookup
+    returns a new copy of the value, so callers may modify it."""
+
+    def __init__(self, entries):
+        """
+        :param entries: a list of (key, pickled value) tuples, in the order in which they were in the yml mapping
+        """
+        self._keys = [key for key, _ in entries]
+        self._entries = dict(entries)
+
+    def __getitem__(self, key):
+        return pickle.loads(self._entries[key])
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._keys)
+
+    def keys(self):
+        return list(self._keys)
+
+    def iteritems(self):
+        for key in self._keys:
+            yield key, self[key]
+
+    def itervalues(self):
+        for key in self._keys:
+            yield self[key]
+
+
+def _build_asset_index(data, document):
+    mapping = list(yaml.load_all(data, Loader=yaml.CSafeLoader))[document]
+    return [(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) for key, value in mapping.iteritems()]
+
+
+def load_asset_index(path, document=0):
+    """Loads a mapping from a yml asset. Parsing the yml is slow, so the parsed mapping is stored in the cache directory
+    and only parsed again when the asset's contents change.
+    :param path: a list of the components of the asset's path
+    :param document: the number of the document in the yml file which holds the mapping
+    :return: an AssetIndex of the mapping"""
+    index_key = (tuple(path), document)
+    if index_key in _asset_indexes:
+        return _asset_indexes[index_key]
+
+    with open(asset_path(path), 'rb') as f:
+        data = f.read()
+    digest = hashlib.md5(data).hexdigest()
+
+    cache_filename = get_cache_filename(os.path.join("assets", "{}.{}.pickle".format("_".join(path), document)))
+    cache = load_pickle(cache_filename)
+    if isinstance(cache, dict) and cache.get("version") == ASSET_INDEX_VERSION and cache.get("digest") == digest:
+        entries = cache["entries"]
+    else:
+        entries = _build_asset_index(data, document)
+        save_pickle(cache_filename, {"version": ASSET_INDEX_VERSION,
+                                     "digest": digest,
+                                     "entries": entries})
+
+    index = AssetIndex(entries)
+    _asset_indexes[index_key] = index
+    return index
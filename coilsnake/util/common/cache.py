@@ -0,0 +1,152 @@
+import cPickle as pickle
+import hashlib
+import logging
+import os
+import tempfile
+
+
+log = logging.getLogger(__name__)
+
+# The environment variable which, when set, overrides the directory in which CoilSnake's caches are stored
+CACHE_DIRECTORY_ENVIRONMENT_VARIABLE = "COILSNAKE_CACHE_DIR"
+
+
+def get_cache_directory():
+    """Returns the directory in which caches shared between all projects are stored."""
+    directory = os.environ.get(CACHE_DIRECTORY_ENVIRONMENT_VARIABLE)
+    if not directory:
+        directory = os.path.join(os.path.expanduser("~"), ".coilsnake", "cache")
+    return directory
+
+
+def get_cache_filename(name):
+    return os.path.join(get_cache_directory(), name)
+
+
+def write_file_atomically(filename, data):
+    """Writes a string to a file. The file is replaced atomically, so that other processes reading it never see a
+    partially written file. Errors are logged and otherwise ignored, since caches are never required.
+    :return: True if the file was written"""
+    temporary_filename = None
+    try:
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        handle, temporary_filename = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(handle, "wb") as f:
+            f.write(data)
+        if os.name == "nt" and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(temporary_filename, filename)
+        return True
+    except (IOError, OSError) as e:
+        log.debug("Could not write cache file[{}]: {}".format(filename, e))
+        if temporary_filename and os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+        return False
+
+
+def load_pickle(filename, default=None):
+    """Loads a pickled object from a file, or returns a default value if the file does not exist or can't be read."""
+    try:
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+    except (IOError, OSError, EOFError, AttributeError, ImportError, IndexError, pickle.UnpicklingError):
+        return default
+
+
+def save_pickle(filename, obj):
+    """Pickles an object to a file, replacing the file atomically.
+    :return: True if the object was saved"""
+    try:
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError) as e:
+        log.debug("Could not pickle cache file[{}]: {}".format(filename, e))
+        return False
+    return write_file_atomically(filename, data)
+
+
+class DiskCache(object):
+    """A cache of strings, each stored in its own file in a directory and looked up by a key such as a hash of the
+    input it was computed from. When the files take up more than max_size bytes, the least recently used files are
+    removed. Each file holds a digest of its value, so that damaged files are ignored."""
+
+    _DIGEST_SIZE = 16
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self._size = None
+
+    def _get_filename(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """Returns the value stored for a key, or None if there is none."""
+        filename = self._get_filename(key)
+        try:
+            with open(filename, "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+
+        value = data[self._DIGEST_SIZE:]
+        if hashlib.md5(value).digest() != data[:self._DIGEST_SIZE]:
+            log.debug("Ignoring damaged cache file[{}]".format(filename))
+            return None
+        try:
+            # Mark the file as recently used
+            os.utime(filename, None)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        if not write_file_atomically(self._get_filename(key), hashlib.md5(value).digest() + value):
+            return
+        if self._size is None:
+            self._size = sum([size for _, size, _ in self._list_files()])
+        else:
+            self._size += self._DIGEST_SIZE + len(value)
+        if self._size > self.max_size:
+            self.evict()
+
+    def _list_files(self):
+        """Returns a list of (modification time, size, filename) tuples of the files in the cache."""
+        files = []
+        try:
+            subdirectories = os.listdir(self.directory)
+        except OSError:
+            return files
+        for subdirectory in subdirectories:
+            subdirectory = os.path.join(self.directory, subdirectory)
+            try:
+                filenames = os.listdir(subdirectory)
+            except OSError:
+                continue
+            for filename in filenames:
+                filename = os.path.join(subdirectory, filename)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, filename))
+        return files
+
+    def evict(self):
+        """Removes the least recently used files until the cache takes up no more than three quarters of its maximum
+        size, so that it doesn't need to be evicted again right away."""
+        files = sorted(self._list_files())
+        self._size = sum([size for _, size, _ in files])
+        for _, size, filename in files:
+            if self._size <= self.max_size * 3 / 4:
+                break
+            try:
+                os.remove(filename)
+                self._size -= size
+            except OSError:
+                pass
@@ -1,3 +1,8 @@
+from io import BytesIO
+from itertools import izip
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
 from PIL import Image
 
 from coilsnake.exceptions.common.exceptions import CoilSnakeError, InvalidArgumentError
@@ -15,4 +20,93 @@ def open_indexed_image(f):
     image = open_image(f)
     if image.mode != 'P':
         raise CoilSnakeError("Image does not use an indexed palette: {}".format(f.name))
-    return image
\ No newline at end of file
+    return image
+
+
+def get_number_of_image_threads():
+    """Returns the number of threads used to encode and decode images. Most of the work of encoding and decoding PNGs
+    is done by zlib without holding the GIL, so images can be processed in parallel by threads."""
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def _map_in_threads(function, iterable, num_threads):
+    """Yields the result of calling a function on each item of an iterable, in order. The calls are made in a pool of
+    threads, which may run ahead of the results which have been consumed."""
+    if num_threads is None:
+        num_threads = get_number_of_image_threads()
+    if num_threads <= 1:
+        for item in iterable:
+            yield function(item)
+        return
+
+    pool = ThreadPool(processes=num_threads)
+    try:
+        for result in pool.imap(function, iterable):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _encode_image(args):
+    create_image, image_format, save_options = args
+    data = BytesIO()
+    create_image().save(data, image_format, **save_options)
+    return data.getvalue()
+
+
+def write_images(resource_open, images, image_format="png", num_threads=None, **save_options):
+    """Creates and saves a sequence of images to resources. The images are created and encoded in a pool of threads,
+    but each resource is opened and written in the calling thread in the order given, so the output is the same as if
+    the images were saved one at a time.
+    :param resource_open: a function which takes a resource name and extension and returns an open file
+    :param images: an iterable of (resource name, function which returns an image) tuples
+    :param num_threads: the number of threads to use, or None to use one per CPU core
+    :param save_options: keyword arguments for Image.save"""
+    images = list(images)
+    encoded_images = _map_in_threads(_encode_image,
+                                     [(create_image, image_format, save_options) for _, create_image in images],
+                                     num_threads)
+    for (resource_name, _), data in izip(images, encoded_images):
+        with resource_open(resource_name, image_format) as f:
+            f.write(data)
+
+
+def _decode_image(args):
+    name, data, indexed = args
+    if data is None:
+        return None
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+    except IOError:
+        raise InvalidArgumentError("Could not open file: {}".format(name))
+    if indexed and image.mode != 'P':
+        raise CoilSnakeError("Image does not use an indexed palette: {}".format(name))
+    return image
+
+
+def read_images(resource_open, resource_names, image_format="png", indexed=True, ignore_missing=False,
+                num_threads=None):
+    """Reads a sequence of images from resources. Each resource is read in the calling thread in the order given, and
+    the images are decoded in a pool of threads.
+    :param resource_open: a function which takes a resource name and extension and returns an open file
+    :param resource_names: an iterable of resource names
+    :param indexed: whether to require that each image uses an indexed palette
+    :param ignore_missing: whether to yield None for resources which can't be opened, rather than raising an IOError
+    :param num_threads: the number of threads to use, or None to use one per CPU core
+    :return: an iterator of the images, in the same order as the resource names"""
+    encoded_images = []
+    for resource_name in resource_names:
+        try:
+            with resource_open(resource_name, image_format) as f:
+                encoded_images.append((getattr(f, "name", resource_name), f.read(), indexed))
+        except IOError:
+            if not ignore_missing:
+                raise
+            encoded_images.append((resource_name, None, indexed))
+    return _map_in_threads(_decode_image, encoded_images, num_threads)
@@ -93,10 +93,22 @@ class Project(object):
             self._resources[module_name][resource_name] = resource_name + "." + extension
         fname = os.path.join(self._dir_name, self._resources[module_name][resource_name])
         if not os.path.exists(os.path.dirname(fname)):
-            os.makedirs(os.path.dirname(fname))
+            try:
+                os.makedirs(os.path.dirname(fname))
+            except OSError:
+                # Another process may have created the directory in the meantime
+                if not os.path.isdir(os.path.dirname(fname)):
+                    raise
         f = open(fname, mode)
         return f
 
+    def get_resources(self, module_name):
+        """Returns a dictionary mapping each of a module's resource names to its filename in the project."""
+        return dict(self._resources.get(module_name, {}))
+
+    def set_resources(self, module_name, resources):
+        self._resources[module_name] = dict(resources)
+
     def delete_resource(self, module_name, resource_name):
         if module_name not in self._resources:
             raise CoilSnakeError("No such module {}".format(module_name))
@@ -1,9 +1,12 @@
+import cPickle as pickle
+import hashlib
 import logging
 import os
-import re
+from StringIO import StringIO
 import traceback
 
 import yaml
+from yaml.nodes import ScalarNode
 from yaml.scanner import ScannerError
 
 from coilsnake.exceptions.common.exceptions import CoilSnakeUnexpectedError, InvalidYmlFileError
@@ -12,12 +15,46 @@ from coilsnake.util.common.helper import lower_if_str
 
 log = logging.getLogger(__name__)
 
+# Increment this whenever the format of the cached yml data changes, so that old caches are not reused
+YML_CACHE_VERSION = 1
 
-def convert_values_to_hex_repr(yml_str_rep, key):
-    return re.sub("{}: (\d+)".format(re.escape(key)),
-                  lambda i: "{}: {:#x}".format(key,
-                                               int(i.group(0)[i.group(0).find(": ") + 2:])),
-                  yml_str_rep)
+# The DiskCache in which parsed yml files are cached, keyed on their contents, or None
+yml_cache = None
+
+
+class HexInt(long):
+    """An integer which is written to yml files in hexadecimal."""
+    pass
+
+
+class _YmlDumper(yaml.CSafeDumper):
+    """A yml dumper which writes HexInts, and the non-negative integer values of any of the keys in hex_keys, in
+    hexadecimal."""
+
+    hex_keys = frozenset()
+
+    def ignore_aliases(self, data):
+        if data is None or isinstance(data, (str, unicode, int, long, float)):
+            return True
+        return isinstance(data, tuple) and data == ()
+
+    def represent_data(self, data):
+        # Integers make up most of the values in CoilSnake's yml files, so they skip the search for a representer
+        data_type = type(data)
+        if data_type is int or data_type is long:
+            return ScalarNode(u'tag:yaml.org,2002:int', unicode(data), style=self.default_style)
+        elif data_type is HexInt:
+            return ScalarNode(u'tag:yaml.org,2002:int', u"{:#x}".format(data), style=self.default_style)
+        return super(_YmlDumper, self).represent_data(data)
+
+    def represent_mapping(self, tag, mapping, flow_style=None):
+        if self.hex_keys and hasattr(mapping, "items"):
+            mapping = [(key, HexInt(value) if (type(value) in (int, long) and value >= 0 and key in self.hex_keys)
+                        else value)
+                       for key, value in mapping.items()]
+            if getattr(self, "sort_keys", True):
+                mapping.sort()
+        return super(_YmlDumper, self).represent_mapping(tag, mapping, flow_style)
 
 
 def replace_field_in_yml(resource_name, resource_open_r, resource_open_w, key, new_key=None, value_map=None):
@@ -48,26 +85,13 @@ def replace_field_in_yml(resource_name, resource_open_r, resource_open_w, key, n
         yml_dump(data, f, default_flow_style=False)
 
 
-def convert_values_to_hex_repr_in_yml_file(resource_name, resource_open_r, resource_open_w, keys,
-                                           default_flow_style=False):
-    with resource_open_r(resource_name, "yml") as f:
-        out = yaml.load(f, Loader=yaml.CSafeLoader)
-        yml_str_rep = yaml.dump(out, default_flow_style=default_flow_style, Dumper=yaml.CSafeDumper)
-
-    for key in keys:
-        yml_str_rep = convert_values_to_hex_repr(yml_str_rep, key)
-
-    with resource_open_w(resource_name, "yml") as f:
-        f.write(yml_str_rep)
-
-
-def yml_load(f):
+def _yml_parse(stream, name):
     try:
-        return yaml.load(f, Loader=yaml.CSafeLoader)
+        return yaml.load(stream, Loader=yaml.CSafeLoader)
     except ScannerError as se:
         raise InvalidYmlFileError(
             "File {} is not syntactically valid YML. Error on line {}, column {} of the YML file: {}".format(
-                os.path.basename(se.problem_mark.name),
+                os.path.basename(name or se.problem_mark.name),
                 se.problem_mark.line + 1,
                 se.problem_mark.column + 1,
                 se.problem))
@@ -75,19 +99,48 @@ def yml_load(f):
         raise CoilSnakeUnexpectedError(traceback.format_exc())
 
 
-def yml_dump(yml_rep, f=None, default_flow_style=None):
-    if f:
-        try:
-            yaml.dump(yml_rep,
-                      f,
-                      default_flow_style=default_flow_style,
-                      Dumper=yaml.CSafeDumper)
-        except:
-            raise CoilSnakeUnexpectedError(traceback.format_exc())
-    else:
+def yml_load(f):
+    """Parses a yml file. If yml_cache is set, the parsed file is looked up in the cache by a digest of the file's
+    contents, so that files which have not changed since they were last parsed are unpickled instead."""
+    name = getattr(f, "name", None)
+    if yml_cache is None:
+        return _yml_parse(f, name)
+
+    data = f.read()
+    md5 = hashlib.md5("{}\0{}\0".format(YML_CACHE_VERSION, yaml.__version__))
+    md5.update(data)
+    key = md5.hexdigest()
+    pickled_yml_rep = yml_cache.get(key)
+    if pickled_yml_rep is not None:
         try:
-            return yaml.dump(yml_rep,
-                             default_flow_style=default_flow_style,
-                             Dumper=yaml.CSafeDumper)
-        except:
-            raise CoilSnakeUnexpectedError(traceback.format_exc())
\ No newline at end of file
+            return pickle.loads(pickled_yml_rep)
+        except (EOFError, AttributeError, ImportError, IndexError, pickle.UnpicklingError):
+            log.debug("Ignoring unreadable cached yml for file[{}]".format(name))
+
+    yml_rep = _yml_parse(data, name)
+    try:
+        yml_cache.set(key, pickle.dumps(yml_rep, pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, TypeError) as e:
+        log.debug("Could not cache yml for file[{}]: {}".format(name, e))
+    return yml_rep
+
+
+def yml_dump(yml_rep, f=None, default_flow_style=None, hex_keys=None):
+    """Dumps an object to yml.
+    :param f: the file to write the yml to, or None to return the yml as a string
+    :param hex_keys: the keys whose non-negative integer values should be written in hexadecimal, wherever they appear
+    :return: the yml, if f is None"""
+    stream = f if f else StringIO()
+    dumper = _YmlDumper(stream, default_flow_style=default_flow_style, encoding="utf-8")
+    if hex_keys:
+        dumper.hex_keys = frozenset(hex_keys)
+    try:
+        dumper.open()
+        dumper.represent(yml_rep)
+        dumper.close()
+    except:
+        raise CoilSnakeUnexpectedError(traceback.format_exc())
+    finally:
+        dumper.dispose()
+    if not f:
+        return stream.getvalue()
@@ -1,3 +1,5 @@
+from operator import or_
+import struct
 from zlib import crc32
 
 
@@ -129,6 +131,68 @@ def write_8bpp_graphic_to_block(source, target, offset, x=0, y=0):
     return 64
 
 
+# For each bitplane index, maps each byte of that bitplane to the 64-bit integer whose big-endian bytes are its bits,
+# one per pixel from left to right, shifted by the index. ORing these together for each bitplane gives a row of pixels.
+_BITPLANE_TO_ROW_TABLES = [[sum([((b >> i) & 1) << (8 * i) for i in xrange(8)]) << plane for b in xrange(256)]
+                           for plane in xrange(8)]
+# Maps each pixel value to each of its bits
+_PIXEL_BIT_TABLES = ["".join([chr((x >> i) & 1) for x in xrange(256)]) for i in xrange(8)]
+# Multiplying a 64-bit integer whose bytes are each 0 or 1 by this moves the bytes' bits into its top byte, in order
+_GATHER_BITS = 0x0102040810204080
+
+
+def read_bitplane_rows(data, bpp):
+    """Decodes graphical data stored in the 1, 2, 4 or 8 bits-per-pixel formats.
+    All of the data is decoded at once, a bitplane at a time, rather than a pixel at a time.
+    :param data: a bytearray of the graphical data. For bpp other than 1, its length must be a multiple of the size of
+    an 8x8 tile, which is 8*bpp bytes.
+    :param bpp: the number of bits per pixel
+    :return: a string of the decoded 8-pixel rows, one byte per pixel. For bpp other than 1, the rows are in the order
+    which they are stored in each 8x8 tile, and for 1bpp, each byte of data is one row."""
+    if bpp == 1:
+        planes = [data]
+    else:
+        tile_size = 8 * bpp
+        num_tiles = len(data) / tile_size
+        planes = []
+        for group in xrange(bpp / 2):
+            group_data = bytearray().join([data[offset:offset + 16]
+                                           for offset in xrange(group * 16, num_tiles * tile_size, tile_size)])
+            planes.append(group_data[0::2])
+            planes.append(group_data[1::2])
+
+    rows = map(_BITPLANE_TO_ROW_TABLES[0].__getitem__, planes[0])
+    for i in xrange(1, bpp):
+        rows = map(or_, rows, map(_BITPLANE_TO_ROW_TABLES[i].__getitem__, planes[i]))
+    return struct.pack(">{}Q".format(len(rows)), *rows)
+
+
+def write_bitplane_rows(pixels, bpp):
+    """Encodes 8-pixel rows in the 1, 2, 4 or 8 bits-per-pixel formats. This is the inverse of read_bitplane_rows.
+    :param pixels: a string of 8-pixel rows, one byte per pixel. For bpp other than 1, it must hold a whole number of
+    8x8 tiles.
+    :param bpp: the number of bits per pixel
+    :return: a bytearray of the graphical data"""
+    num_rows = len(pixels) / 8
+    row_format = ">{}Q".format(num_rows)
+    planes = [bytearray([((row * _GATHER_BITS) >> 56) & 0xff
+                         for row in struct.unpack(row_format, pixels.translate(_PIXEL_BIT_TABLES[i]))])
+              for i in xrange(bpp)]
+    if bpp == 1:
+        return planes[0]
+
+    groups = []
+    for group in xrange(bpp / 2):
+        group_data = bytearray(2 * num_rows)
+        group_data[0::2] = planes[2 * group]
+        group_data[1::2] = planes[2 * group + 1]
+        groups.append(group_data)
+    if len(groups) == 1:
+        return groups[0]
+    return bytearray().join([group_data[offset:offset + 16]
+                             for offset in xrange(0, 2 * num_rows, 16) for group_data in groups])
+
+
 def hash_tile(tile):
     csum = 0
     for col in tile:
@@ -1,4 +1,6 @@
 #include <stdio.h>
+#include <limits.h>
+#include <stdlib.h>
 #include <string.h>
 #include <Python.h>
 
@@ -33,92 +35,509 @@ void rencode(uchar **bpos, uchar *pos, int length) {
 	*bpos += length;
 }
 
-int comp_(uchar *udata, uchar *buffer, int length) {
-        uchar *bpos = buffer, *limit = &udata[length];
-        uchar *pos = udata, *pos2, *pos3, *pos4;
-        int tmp;
+/* Compression levels.
+ * FAST only looks for forward copies of earlier data.
+ * NORMAL takes the earliest match of any type, like the original exhaustive search did.
+ * OPTIMAL finds the sequence of commands which produces the smallest output.
+ */
+#define COMP_LEVEL_FAST         0
+#define COMP_LEVEL_NORMAL       1
+#define COMP_LEVEL_OPTIMAL      2
+
+/* The minimum length of a copy, bit-reversed copy or backward copy */
+#define MIN_MATCH               5
+/* The maximum length of any command */
+#define MAX_LENGTH              1024
+/* The maximum number of earlier occurrences examined per position when looking for the longest match */
+#define MAX_CHAIN               512
+
+/* An entry in the match finder's hash table, recording where a sequence of MIN_MATCH bytes occurs */
+typedef struct {
+	unsigned long long key; /* The sequence plus one, or 0 if the entry is empty */
+	int first;              /* The first position at which the sequence occurs */
+	int last;               /* The last position at which the sequence occurs */
+} MatchEntry;
+
+/* Finds earlier occurrences of the MIN_MATCH-byte sequence at a position, in constant time per lookup.
+ * Positions are added in increasing order, and each position links to the previous occurrence of its sequence.
+ */
+typedef struct {
+	const uchar *data;
+	int length;
+	MatchEntry *table;
+	unsigned int mask;
+	int *prev;
+	int inserted;
+} MatchFinder;
+
+static unsigned long long sequence_key(const uchar *pos) {
+	return ((unsigned long long) pos[0] << 32) | ((unsigned long long) pos[1] << 24)
+		| ((unsigned long long) pos[2] << 16) | ((unsigned long long) pos[3] << 8) | pos[4];
+}
+
+static MatchEntry* mf_lookup(MatchFinder *mf, unsigned long long key) {
+	unsigned int i = (unsigned int) ((key * 0x9E3779B97F4A7C15ULL) >> 32) & mf->mask;
+	key++;
+	while(mf->table[i].key != 0 && mf->table[i].key != key)
+		i = (i + 1) & mf->mask;
+	return &mf->table[i];
+}
+
+static int mf_init(MatchFinder *mf, const uchar *data, int length) {
+	unsigned int size = 1024;
+	while(size < 2 * (unsigned int) length)
+		size <<= 1;
+	mf->data = data;
+	mf->length = length;
+	mf->mask = size - 1;
+	mf->inserted = 0;
+	mf->table = (MatchEntry*) calloc(size, sizeof(MatchEntry));
+	mf->prev = (int*) malloc(sizeof(int) * (length + 1));
+	if(mf->table == NULL || mf->prev == NULL) {
+		free(mf->table);
+		free(mf->prev);
+		return -1;
+	}
+	return 0;
+}
+
+static void mf_free(MatchFinder *mf) {
+	free(mf->table);
+	free(mf->prev);
+}
+
+/* Adds every position whose sequence ends at or before end */
+static void mf_insert_until(MatchFinder *mf, int end) {
+	MatchEntry *entry;
+	unsigned long long key;
+	for(; mf->inserted + MIN_MATCH <= end; mf->inserted++) {
+		key = sequence_key(&mf->data[mf->inserted]);
+		entry = mf_lookup(mf, key);
+		if(entry->key == 0) {
+			entry->key = key + 1;
+			entry->first = mf->inserted;
+			mf->prev[mf->inserted] = -1;
+		} else
+			mf->prev[mf->inserted] = entry->last;
+		entry->last = mf->inserted;
+	}
+}
+
+/* Returns the length of the copy of the data at src to dst, given that the first n bytes are known to match.
+ * The copied data must be entirely before dst.
+ */
+static int forward_length(const uchar *data, int limit, int src, int dst, int n) {
+	while(src + n < dst && dst + n < limit && n < MAX_LENGTH && data[src + n] == data[dst + n])
+		n++;
+	return n;
+}
+
+static int bitrev_length(const uchar *data, int limit, const uchar *bitrevs, int src, int dst, int n) {
+	while(src + n < dst && dst + n < limit && n < MAX_LENGTH && data[src + n] == bitrevs[data[dst + n]])
+		n++;
+	return n;
+}
+
+/* Returns the length of the copy of the data read backwards from src to dst */
+static int backward_length(const uchar *data, int limit, int src, int dst, int n) {
+	while(src - n >= 0 && dst + n < limit && n < MAX_LENGTH && data[src - n] == data[dst + n])
+		n++;
+	return n;
+}
+
+static int match_length(MatchFinder *mf, const uchar *bitrevs, int type, int src, int dst, int n) {
+	if(type == 4)
+		return forward_length(mf->data, mf->length, src, dst, n);
+	else if(type == 5)
+		return bitrev_length(mf->data, mf->length, bitrevs, src, dst, n);
+	return backward_length(mf->data, mf->length, src, dst, n);
+}
+
+/* Looks up the entry for the sequence which a match of the given type at dst needs to find earlier in the data */
+static MatchEntry* mf_lookup_match(MatchFinder *mf, const uchar *bitrevs, int dst, int type) {
+	uchar transformed[MIN_MATCH];
+	int i;
+	if(type == 4)
+		return mf_lookup(mf, sequence_key(&mf->data[dst]));
+	for(i = 0; i < MIN_MATCH; i++)
+		transformed[i] = type == 5 ? bitrevs[mf->data[dst + i]] : mf->data[dst + MIN_MATCH - 1 - i];
+	return mf_lookup(mf, sequence_key(transformed));
+}
+
+/* Looks for the earliest copy (type 4), bit-reversed copy (type 5) or backward copy (type 6) of earlier data at
+ * dst, preferring them in that order at the same position. The first occurrence of a sequence is always the
+ * earliest position it can be copied from.
+ * Returns the length of the match found, or 0 if there is none, and sets *type and *src.
+ */
+static int find_earliest_match(MatchFinder *mf, const uchar *bitrevs, int dst, int level, int *type, int *src) {
+	int found = 0, last_type = level == COMP_LEVEL_FAST ? 4 : 6, t, p;
+	MatchEntry *entry;
+
+	if(dst + MIN_MATCH > mf->length)
+		return 0;
+	mf_insert_until(mf, dst);
+
+	for(t = 4; t <= last_type; t++) {
+		entry = mf_lookup_match(mf, bitrevs, dst, t);
+		if(entry->key == 0)
+			continue;
+		p = entry->first + (t == 6 ? MIN_MATCH - 1 : 0);
+		/* Offsets are stored in two bytes */
+		if(p <= 0xFFFF && (!found || p < *src)) {
+			*type = t;
+			*src = p;
+			found = 1;
+		}
+	}
+	return found ? match_length(mf, bitrevs, *type, *src, dst, 0) : 0;
+}
+
+/* Looks for the longest match of one type at dst, looking at the most recent occurrences first.
+ * Returns its length, or 0 if there is none, and sets *src.
+ */
+static int find_longest_match(MatchFinder *mf, const uchar *bitrevs, int dst, int type, int *src) {
+	int best_length = 0, length, chain, p, offset = type == 6 ? MIN_MATCH - 1 : 0;
+	MatchEntry *entry;
+
+	if(dst + MIN_MATCH > mf->length)
+		return 0;
+	mf_insert_until(mf, dst);
+
+	entry = mf_lookup_match(mf, bitrevs, dst, type);
+	if(entry->key == 0)
+		return 0;
+	for(p = entry->last, chain = 0; p >= 0 && chain < MAX_CHAIN; p = mf->prev[p], chain++) {
+		if(p + offset > 0xFFFF)
+			continue;
+		length = match_length(mf, bitrevs, type, p + offset, dst, MIN_MATCH);
+		if(length > best_length) {
+			best_length = length;
+			*src = p + offset;
+			if(length == MAX_LENGTH || dst + length == mf->length)
+				break;
+		}
+	}
+	return best_length;
+}
+
+/* Returns the maximum size of the compressed form of length bytes of data */
+int comp_bound(int length) {
+	/* Every command other than a literal run saves at least one byte. A literal run has a header of at most two
+	 * bytes, which is only longer than the byte saved by the command after it when the run is over 32 bytes long. */
+	return length + length / 32 + 8;
+}
+
+/* Writes a command of the given type and length. Types 1 to 3 take their data from pos, and types 4 to 6 copy from
+ * src. For type 2, the length is the number of two-byte words.
+ */
+static void encode_command(uchar **bpos, const uchar *pos, int type, int length, int src) {
+	encode(bpos, length, type);
+	switch(type) {
+		case 1:
+		case 3:
+			*(*bpos)++ = pos[0];
+			break;
+		case 2:
+			*(*bpos)++ = pos[0];
+			*(*bpos)++ = pos[1];
+			break;
+		default:
+			*(*bpos)++ = src >> 8;
+			*(*bpos)++ = src & 0xFF;
+			break;
+	}
+}
+
+/* Compresses data greedily, taking the first command found at the earliest position possible */
+static int comp_greedy_(uchar *udata, uchar *buffer, int length, int level) {
+	uchar *bpos = buffer, *limit = &udata[length];
+	uchar *pos = udata, *pos2, *pos3;
+	int tmp, type = 0, src = 0;
 	uchar bitrevs[256];
+	MatchFinder mf;
+
+	if(mf_init(&mf, udata, length) != 0)
+		return -1;
 	initBitrevs(bitrevs);
-        while(pos < limit) {
-                /*printf("%d\t%d\n", pos - udata, bpos - buffer);*/
-                /* Look for patterns */
-                for(pos2 = pos; pos2 < limit && pos2 < pos + 1024; pos2++) {
-                        for(pos3 = pos2; pos3 < limit && pos3 < pos2 + 1024 && *pos2 == *pos3; pos3++);
-                        if(pos3 - pos2 >= 3) {
-                                rencode(&bpos, pos, pos2 - pos);
-                                encode(&bpos, pos3 - pos2, 1);
-                                *bpos++ = *pos2;
-                                pos = pos3;
-                                break;
-                        }
-                        for(pos3 = pos2; pos3 < limit && pos3 < pos2 + 2048 && *pos3 == *pos2 && pos3[1] == pos2[1]; pos3 += 2);
-                        if(pos3 - pos2 >= 6) {
-                                rencode(&bpos, pos, pos2 - pos);
-                                encode(&bpos, (pos3 - pos2) / 2, 2);
-                                *bpos++ = pos2[0];
-                                *bpos++ = pos2[1];
-                                pos = pos3;
-                                break;
-                        }
-                        for(tmp = 0, pos3 = pos2; pos3 < limit && pos3 < pos2 + 1024 && *pos3 == *pos2 + tmp; pos3++, tmp++);
-                        if(pos3 - pos2 >= 4) {
-                                rencode(&bpos, pos, pos2 - pos);
-                                encode(&bpos, pos3 - pos2, 3);
-                                *bpos++ = *pos2;
-                                pos = pos3;
-                                break;
-                        }
-                        for(pos3 = udata; pos3 < pos2; pos3++) {
-                                for(tmp = 0, pos4 = pos3; pos4 < pos2 && tmp < 1024 && *pos4 == pos2[tmp]; pos4++, tmp++);
-                            if(tmp >= 5) {
-                                        rencode(&bpos, pos, pos2 - pos);
-                                        encode(&bpos, tmp, 4);
-                                        *bpos++ = (pos3 - udata) >> 8;
-                                        *bpos++ = (pos3 - udata) & 0xFF;
-                                        pos = pos2 + tmp;
-                                        goto DONE;
-                                }
-                                for(tmp = 0, pos4 = pos3; pos4 < pos2 && tmp < 1024 && *pos4 == bitrevs[pos2[tmp]]; pos4++, tmp++);
-                                if(tmp >= 5) {
-                                        rencode(&bpos, pos, pos2 - pos);
-                                        encode(&bpos, tmp, 5);
-                                        *bpos++ = (pos3 - udata) >> 8;
-                                        *bpos++ = (pos3 - udata) & 0xFF;
-                                        pos = pos2 + tmp;
-                                        goto DONE;
-                                }
-                                for(tmp = 0, pos4 = pos3; pos4 >= udata && tmp < 1024 && *pos4 == pos2[tmp]; pos4--, tmp++);
-                                if(tmp >= 5) {
-                                        rencode(&bpos, pos, pos2 - pos);
-                                        encode(&bpos, tmp, 6);
-                                        *bpos++ = (pos3 - udata) >> 8;
-                                        *bpos++ = (pos3 - udata) & 0xFF;
-                                        pos = pos2 + tmp;
-                                        goto DONE;
-                                }
-                        }
-                }
-                DONE:
-                /* Can't compress, so just use 0 (raw) */
-                rencode(&bpos, pos, pos2 - pos);
-                if(pos < pos2) pos = pos2;
-        }
-        *bpos++ = 0xFF;
-        return bpos - buffer;
+	while(pos < limit) {
+		/* Look for patterns */
+		for(pos2 = pos; pos2 < limit && pos2 < pos + MAX_LENGTH; pos2++) {
+			for(pos3 = pos2; pos3 < limit && pos3 < pos2 + MAX_LENGTH && *pos2 == *pos3; pos3++);
+			if(pos3 - pos2 >= 3) {
+				rencode(&bpos, pos, pos2 - pos);
+				encode_command(&bpos, pos2, 1, pos3 - pos2, 0);
+				pos = pos3;
+				break;
+			}
+			for(pos3 = pos2; pos3 + 1 < limit && pos3 < pos2 + 2 * MAX_LENGTH && *pos3 == *pos2
+					&& pos3[1] == pos2[1]; pos3 += 2);
+			if(pos3 - pos2 >= 6) {
+				rencode(&bpos, pos, pos2 - pos);
+				encode_command(&bpos, pos2, 2, (pos3 - pos2) / 2, 0);
+				pos = pos3;
+				break;
+			}
+			for(tmp = 0, pos3 = pos2; pos3 < limit && pos3 < pos2 + MAX_LENGTH && *pos3 == *pos2 + tmp;
+					pos3++, tmp++);
+			if(pos3 - pos2 >= 4) {
+				rencode(&bpos, pos, pos2 - pos);
+				encode_command(&bpos, pos2, 3, pos3 - pos2, 0);
+				pos = pos3;
+				break;
+			}
+			tmp = find_earliest_match(&mf, bitrevs, pos2 - udata, level, &type, &src);
+			if(tmp >= MIN_MATCH) {
+				rencode(&bpos, pos, pos2 - pos);
+				encode_command(&bpos, pos2, type, tmp, src);
+				pos = pos2 + tmp;
+				break;
+			}
+		}
+		if(pos < pos2) {
+			/* Can't compress, so just use 0 (raw) */
+			rencode(&bpos, pos, pos2 - pos);
+			pos = pos2;
+		}
+	}
+	*bpos++ = 0xFF;
+	mf_free(&mf);
+	return bpos - buffer;
 }
 
+/* A segment tree for finding the minimum of a range of values, and where it is */
+typedef struct {
+	int size;
+	int *value;
+	int *index;
+} MinTree;
+
+static int mt_init(MinTree *t, int n) {
+	int i;
+	for(t->size = 1; t->size < n; t->size <<= 1);
+	t->value = (int*) malloc(sizeof(int) * 2 * t->size);
+	t->index = (int*) malloc(sizeof(int) * 2 * t->size);
+	if(t->value == NULL || t->index == NULL) {
+		free(t->value);
+		free(t->index);
+		t->value = t->index = NULL;
+		return -1;
+	}
+	for(i = 0; i < 2 * t->size; i++) {
+		t->value[i] = INT_MAX;
+		t->index[i] = -1;
+	}
+	return 0;
+}
+
+static void mt_free(MinTree *t) {
+	free(t->value);
+	free(t->index);
+}
+
+static void mt_set(MinTree *t, int i, int value) {
+	int child;
+	i += t->size;
+	t->value[i] = value;
+	t->index[i] = i - t->size;
+	for(i >>= 1; i > 0; i >>= 1) {
+		child = t->value[2 * i] <= t->value[2 * i + 1] ? 2 * i : 2 * i + 1;
+		t->value[i] = t->value[child];
+		t->index[i] = t->index[child];
+	}
+}
+
+/* Returns the minimum value in [lo, hi] and sets *index to its position, or returns INT_MAX if there is none */
+static int mt_query(MinTree *t, int lo, int hi, int *index) {
+	int best = INT_MAX;
+	if(lo < 0)
+		lo = 0;
+	if(hi >= t->size)
+		hi = t->size - 1;
+	for(lo += t->size, hi += t->size + 1; lo < hi; lo >>= 1, hi >>= 1) {
+		if(lo & 1) {
+			if(t->value[lo] < best) {
+				best = t->value[lo];
+				*index = t->index[lo];
+			}
+			lo++;
+		}
+		if(hi & 1) {
+			hi--;
+			if(t->value[hi] < best) {
+				best = t->value[hi];
+				*index = t->index[hi];
+			}
+		}
+	}
+	return best;
+}
+
+/* The choice made for one position while finding the optimal parse */
+typedef struct {
+	int cost;   /* The size of the smallest encoding of the data from this position onwards */
+	char type;  /* The type of the command starting at this position */
+	int length; /* The length of the command, in words for type 2 */
+} ParseStep;
+
+/* Considers commands of one type with lengths from lo to hi, whose cost is the header plus payload bytes plus the
+ * cost of the position which they end at, as given by the tree. Positions in the tree are (end - offset) / scale.
+ */
+static void consider(ParseStep *step, MinTree *tree, int base, int lo, int hi, int scale, int offset, int payload,
+		int type) {
+	int cost, header, range_lo, range_hi, index = -1;
+	for(header = 1; header <= 2; header++) {
+		/* Commands of up to 32 have one byte headers, and longer ones have two */
+		range_lo = header == 1 ? lo : (lo > 32 ? lo : 33);
+		range_hi = header == 1 ? (hi < 32 ? hi : 32) : hi;
+		if(range_lo > range_hi)
+			continue;
+		cost = mt_query(tree, (base + range_lo * scale - offset) / scale, (base + range_hi * scale - offset) / scale,
+				&index);
+		if(cost == INT_MAX)
+			continue;
+		cost += header + payload;
+		if(cost < step->cost) {
+			step->cost = cost;
+			step->type = type;
+			step->length = (index * scale + offset - base) / scale;
+		}
+	}
+}
+
+/* Compresses data into the smallest possible output, by finding the cheapest sequence of commands which covers it.
+ * Every length of every command available at each position is considered. Copies are limited to the longest one
+ * found among the most recent occurrences of their sequence.
+ */
+static int comp_optimal_(uchar *udata, uchar *buffer, int length) {
+	uchar *bpos = buffer;
+	uchar bitrevs[256];
+	int i, t, run = 0, word_run, next_word_runs[2] = {0, 0}, increment_run = 0, result = -1;
+	int *match_lengths[3] = {NULL, NULL, NULL}, *match_src[3] = {NULL, NULL, NULL};
+	ParseStep *steps = NULL;
+	MinTree cost_tree, raw_tree, word_trees[2];
+	MatchFinder mf;
+
+	cost_tree.value = raw_tree.value = word_trees[0].value = word_trees[1].value = NULL;
+	cost_tree.index = raw_tree.index = word_trees[0].index = word_trees[1].index = NULL;
+	if(mf_init(&mf, udata, length) != 0)
+		return -1;
+	initBitrevs(bitrevs);
+
+	steps = (ParseStep*) malloc(sizeof(ParseStep) * (length + 1));
+	for(t = 0; t < 3; t++) {
+		match_lengths[t] = (int*) malloc(sizeof(int) * (length + 1));
+		match_src[t] = (int*) malloc(sizeof(int) * (length + 1));
+		if(match_lengths[t] == NULL || match_src[t] == NULL)
+			goto CLEANUP;
+	}
+	if(steps == NULL || mt_init(&cost_tree, length + 1) || mt_init(&raw_tree, length + 1)
+			|| mt_init(&word_trees[0], length / 2 + 1) || mt_init(&word_trees[1], length / 2 + 1))
+		goto CLEANUP;
+
+	/* Find the longest copy of each type at each position. A long match continues at the next position, so it is
+	 * extended instead of searching for a new one. */
+	for(i = 0; i < length; i++) {
+		for(t = 0; t < 3; t++) {
+			if(i > 0 && match_lengths[t][i - 1] > 32 && match_src[t][i - 1] < 0xFFFF) {
+				match_src[t][i] = match_src[t][i - 1] + (t == 2 ? -1 : 1);
+				match_lengths[t][i] = match_length(&mf, bitrevs, t + 4, match_src[t][i], i,
+						match_lengths[t][i - 1] - 1);
+			} else
+				match_lengths[t][i] = find_longest_match(&mf, bitrevs, i, t + 4, &match_src[t][i]);
+		}
+	}
+
+	/* Find the cheapest encoding of each suffix of the data, from the end backwards */
+	steps[length].cost = 0;
+	mt_set(&cost_tree, length, 0);
+	mt_set(&raw_tree, length, length);
+	mt_set(&word_trees[length & 1], length / 2, 0);
+	for(i = length - 1; i >= 0; i--) {
+		/* The lengths of the runs of repeated bytes, repeated words and incrementing bytes starting here */
+		run = (i + 1 < length && udata[i] == udata[i + 1]) ? (run < MAX_LENGTH ? run + 1 : MAX_LENGTH) : 1;
+		t = (i + 3 < length && udata[i] == udata[i + 2] && udata[i + 1] == udata[i + 3])
+				? (next_word_runs[1] < MAX_LENGTH ? next_word_runs[1] + 1 : MAX_LENGTH) : 1;
+		next_word_runs[1] = next_word_runs[0];
+		next_word_runs[0] = word_run = t;
+		increment_run = (i + 1 < length && udata[i + 1] == udata[i] + 1)
+				? (increment_run < MAX_LENGTH ? increment_run + 1 : MAX_LENGTH) : 1;
+
+		steps[i].cost = INT_MAX;
+		consider(&steps[i], &raw_tree, i, 1, length - i < MAX_LENGTH ? length - i : MAX_LENGTH, 1, 0, -i, 0);
+		if(run >= 3)
+			consider(&steps[i], &cost_tree, i, 3, run, 1, 0, 1, 1);
+		if(word_run >= 3)
+			consider(&steps[i], &word_trees[i & 1], i, 3, word_run, 2, i & 1, 2, 2);
+		if(increment_run >= 4)
+			consider(&steps[i], &cost_tree, i, 4, increment_run, 1, 0, 1, 3);
+		for(t = 0; t < 3; t++)
+			if(match_lengths[t][i] >= MIN_MATCH)
+				consider(&steps[i], &cost_tree, i, MIN_MATCH, match_lengths[t][i], 1, 0, 2, t + 4);
+
+		mt_set(&cost_tree, i, steps[i].cost);
+		mt_set(&raw_tree, i, steps[i].cost + i);
+		mt_set(&word_trees[i & 1], i / 2, steps[i].cost);
+	}
+
+	/* Write out the cheapest encoding */
+	for(i = 0; i < length; ) {
+		t = steps[i].type;
+		if(t == 0) {
+			rencode(&bpos, &udata[i], steps[i].length);
+			i += steps[i].length;
+		} else {
+			encode_command(&bpos, &udata[i], t, steps[i].length, t >= 4 ? match_src[t - 4][i] : 0);
+			i += t == 2 ? 2 * steps[i].length : steps[i].length;
+		}
+	}
+	*bpos++ = 0xFF;
+	result = bpos - buffer;
+
+	CLEANUP:
+	free(steps);
+	for(t = 0; t < 3; t++) {
+		free(match_lengths[t]);
+		free(match_src[t]);
+	}
+	mt_free(&cost_tree);
+	mt_free(&raw_tree);
+	mt_free(&word_trees[0]);
+	mt_free(&word_trees[1]);
+	mf_free(&mf);
+	return result;
+}
+
+/* The compressor function.
+ * Compresses length bytes from udata into buffer, which must be at least comp_bound(length) bytes long.
+ * Returns the size of the compressed data, or -1 if memory could not be allocated.
+ */
+int comp_(uchar *udata, uchar *buffer, int length, int level) {
+	if(level == COMP_LEVEL_OPTIMAL)
+		return comp_optimal_(udata, buffer, length);
+	return comp_greedy_(udata, buffer, length, level);
+}
+
+/* The maximum size of decompressed data. Copies can only refer to the first 64KB of the output. */
+#define MAX_DECOMP_SIZE         65536
+
 /* The decompressor function.
- * Takes a pointer to the compressed block, a pointer to the buffer
- * which it decompresses into, . Returns the number of bytes uncompressed,
- * or -1 if decompression failed.
+ * Takes the data containing the compressed block, its length, the offset of the compressed block within it, and a
+ * buffer of maxlen bytes which it decompresses into. The buffer should be zeroed, since invalid data may copy from
+ * parts of it which have not been written yet. Returns the number of bytes uncompressed, or -1 if decompression
+ * failed.
  */
-int decomp_(uchar *romBuffer, uint addr, uchar *buffer, int maxlen) {
-        uchar *cdata = &romBuffer[addr];
-        uchar *bpos = buffer, *bpos2, tmp;
-        while(*cdata != 0xFF) {
-                int cmdtype = *cdata >> 5;
-                int len = (*cdata & 0x1F) + 1;
+int decomp_(const uchar *src, int src_length, int addr, uchar *buffer, int maxlen) {
+        const uchar *cdata, *end = src + src_length;
+        uchar *bpos = buffer, *bpos2 = NULL, tmp;
+        int cmdtype, len;
+
+        if(addr < 0 || addr >= src_length) return -1;
+        cdata = &src[addr];
+        while(cdata < end && *cdata != 0xFF) {
+                cmdtype = *cdata >> 5;
+                len = (*cdata & 0x1F) + 1;
                 if(cmdtype == 7) {
+                        if(cdata + 1 >= end) return -1;
                         cmdtype = (*cdata & 0x1C) >> 2;
                         len = ((*cdata & 3) << 8) + *(cdata + 1) + 1;
                         cdata++;
@@ -126,36 +545,46 @@ int decomp_(uchar *romBuffer, uint addr, uchar *buffer, int maxlen) {
                 if(bpos + len > &buffer[maxlen]) return -1;
                 cdata++;
                 if(cmdtype >= 4) {
+                        if(cdata + 2 > end) return -1;
                         bpos2 = &buffer[(*cdata << 8) + *(cdata + 1)];
                         if(bpos2 >= &buffer[maxlen]) return -1;
                         cdata += 2;
                 }
                 switch(cmdtype) {
                         case 0:
+                                if(cdata + len > end) return -1;
                                 memcpy(bpos, cdata, len);
                                 cdata += len;
                                 bpos += len;
                                 break;
                         case 1:
+                                if(cdata >= end) return -1;
                                 memset(bpos, *cdata++, len);
                                 bpos += len;
                                 break;
                         case 2:
+                                if(cdata + 2 > end) return -1;
                                 if(bpos + 2 * len > &buffer[maxlen]) return -1;
                                 while(len--) {
-                                        *(short *)bpos = *(short *)cdata;
-                                        bpos += 2;
+                                        *bpos++ = cdata[0];
+                                        *bpos++ = cdata[1];
                                 }
                                 cdata += 2;
                                 break;
                         case 3:
+                                if(cdata >= end) return -1;
                                 tmp = *cdata++;
                                 while(len--) *bpos++ = tmp++;
                                 break;
                         case 4:
                                 if(bpos2 + len > &buffer[maxlen]) return -1;
-                                memcpy(bpos, bpos2, len);
-                                bpos += len;
+                                if(bpos2 + len <= bpos || bpos2 >= bpos + len) {
+                                        memcpy(bpos, bpos2, len);
+                                        bpos += len;
+                                } else {
+                                        /* Overlapping copies repeat the data, since the game copies byte by byte */
+                                        while(len--) *bpos++ = *bpos2++;
+                                }
                                 break;
                         case 5:
                                 if(bpos2 + len > &buffer[maxlen]) return -1;
@@ -175,18 +604,39 @@ int decomp_(uchar *romBuffer, uint addr, uchar *buffer, int maxlen) {
                                 return -1;
                 }
         }
+        if(cdata >= end) return -1;
         return bpos - buffer;
 }
 
+/* Decompresses the block at an offset in some data into a zeroed scratch buffer of MAX_DECOMP_SIZE bytes.
+ * Returns the decompressed data as a string, or NULL with an exception set if the data could not be decompressed.
+ */
+static PyObject* decompress_to_string(const uchar *src, Py_ssize_t src_length, Py_ssize_t offset, uchar *buffer) {
+	int size;
+
+	if (offset < 0 || offset >= src_length)
+		return PyErr_Format(PyExc_IndexError, "offset 0x%x is out of bounds", (int) offset), NULL;
+	if (src_length > INT_MAX)
+		return PyErr_Format(PyExc_OverflowError, "data is too large"), NULL;
+	memset(buffer, 0, MAX_DECOMP_SIZE);
+	size = decomp_(src, (int) src_length, (int) offset, buffer, MAX_DECOMP_SIZE);
+	if (size < 0)
+		return PyErr_Format(PyExc_ValueError, "invalid compressed data at offset 0x%x", (int) offset), NULL;
+	return PyString_FromStringAndSize((const char*) buffer, size);
+}
+
 static PyObject* comp(PyObject* self, PyObject* args) {
 	PyObject *list, *clist, *o;
-	int size, i, csize;
+	int size, i, csize, level = COMP_LEVEL_NORMAL;
 	long n;
 	uchar *udata, *buffer;
 
-	if (!PyArg_ParseTuple(args, "O", &list))
+	if (!PyArg_ParseTuple(args, "O|i", &list, &level))
 		return NULL;
 
+	if (level < COMP_LEVEL_FAST || level > COMP_LEVEL_OPTIMAL)
+		return PyErr_Format(PyExc_ValueError, "invalid compression level %d", level), NULL;
+
 	if (!PyList_Check(list))
 		return PyErr_Format(PyExc_TypeError, "list of numbers expected ('%s' given)", list->ob_type->tp_name), NULL;
 
@@ -196,22 +646,34 @@ static PyObject* comp(PyObject* self, PyObject* args) {
 		return PyErr_Format(PyExc_TypeError, "got empty list"), NULL;
 
 	udata = (uchar*) malloc(sizeof(uchar) * size);
+	if (udata == NULL)
+		return PyErr_NoMemory();
 	for (i=0; i<size; ++i) {
 		o = PyList_GetItem(list, i);
-		if (!PyInt_Check(o))
+		if (!PyInt_Check(o)) {
+			free(udata);
 			return PyErr_Format(PyExc_TypeError, "list of ints expected ('%s') given", o->ob_type->tp_name), NULL;
+		}
 		n = PyInt_AsLong(o);
-		if (n == -1 && PyErr_Occurred())
+		if (n == -1 && PyErr_Occurred()) {
+			free(udata);
 			return NULL;
-		if (n < 0)
+		}
+		if (n < 0) {
+			free(udata);
 			return PyErr_Format(PyExc_TypeError, "list of positive ints expected (negative found)"), NULL;
+		}
 		udata[i] = (uchar) n;
 	}
 
 	// Allocate a buffer
-	buffer = (uchar*) malloc(sizeof(uchar) * (size + 1));
-	csize = comp_(udata, buffer, size);
+	buffer = (uchar*) malloc(sizeof(uchar) * comp_bound(size));
+	csize = buffer ? comp_(udata, buffer, size, level) : -1;
 	free(udata);
+	if (csize < 0) {
+		free(buffer);
+		return PyErr_NoMemory();
+	}
 
 	clist = PyList_New(csize);
 	for (i=0; i<csize; ++i) {
@@ -222,47 +684,138 @@ static PyObject* comp(PyObject* self, PyObject* args) {
 	return clist;
 }
 
+static PyObject* compress(PyObject* self, PyObject* args) {
+	Py_buffer udata;
+	PyObject *result;
+	int csize, level = COMP_LEVEL_NORMAL;
+	uchar *buffer;
+
+	if (!PyArg_ParseTuple(args, "s*|i", &udata, &level))
+		return NULL;
+
+	if (level < COMP_LEVEL_FAST || level > COMP_LEVEL_OPTIMAL) {
+		PyBuffer_Release(&udata);
+		return PyErr_Format(PyExc_ValueError, "invalid compression level %d", level), NULL;
+	}
+	if (udata.len < 1 || udata.len > INT_MAX / 2) {
+		PyBuffer_Release(&udata);
+		return PyErr_Format(PyExc_ValueError, "cannot compress %zd bytes of data", udata.len), NULL;
+	}
+
+	buffer = (uchar*) malloc(sizeof(uchar) * comp_bound((int) udata.len));
+	csize = buffer ? comp_((uchar*) udata.buf, buffer, (int) udata.len, level) : -1;
+	PyBuffer_Release(&udata);
+	if (csize < 0) {
+		free(buffer);
+		return PyErr_NoMemory();
+	}
+
+	result = PyString_FromStringAndSize((const char*) buffer, csize);
+	free(buffer);
+	return result;
+}
+
 static PyObject* decomp(PyObject* self, PyObject* args) {
-        PyObject *rom, *romArr, *ulist, *o;
-	PyByteArrayObject *romByteArr;
-	int addr, size, new_size, i;
-	uchar *romBuffer, *buffer;
+	PyObject *rom, *rom_data, *udata, *ulist;
+	const void *src;
+	Py_ssize_t src_length, i;
+	int addr;
+	uchar *buffer;
 
-        if (!PyArg_ParseTuple(args, "Oi", &rom, &addr))
-                return NULL;
+	if (!PyArg_ParseTuple(args, "Oi", &rom, &addr))
+		return NULL;
 
-	romArr = PyObject_GetAttr(rom, PyString_FromString("data"));
-	romByteArr = PyByteArray_FromObject(romArr);
+	rom_data = PyObject_GetAttrString(rom, "data");
+	if (rom_data == NULL)
+		return NULL;
+	if (PyObject_AsReadBuffer(rom_data, &src, &src_length) != 0) {
+		Py_DECREF(rom_data);
+		return NULL;
+	}
 
-        if (!PyByteArray_Check(romByteArr))
-                return PyErr_Format(PyExc_TypeError, "bytearray of numbers expected ('%s') given", romArr->ob_type->tp_name), NULL;
+	buffer = (uchar*) malloc(sizeof(uchar) * MAX_DECOMP_SIZE);
+	if (buffer == NULL) {
+		Py_DECREF(rom_data);
+		return PyErr_NoMemory();
+	}
+	udata = decompress_to_string((const uchar*) src, src_length, addr, buffer);
+	free(buffer);
+	Py_DECREF(rom_data);
+	if (udata == NULL)
+		return NULL;
 
-        size = PyByteArray_Size(romByteArr);
+	ulist = PyList_New(PyString_GET_SIZE(udata));
+	if (ulist != NULL) {
+		for (i=0; i<PyString_GET_SIZE(udata); ++i)
+			PyList_SET_ITEM(ulist, i, PyInt_FromLong((long) (uchar) PyString_AS_STRING(udata)[i]));
+	}
+	Py_DECREF(udata);
+	return ulist;
+}
 
-        if (size < 1)
-                return PyErr_Format(PyExc_TypeError, "rom's data attribute was empty"), NULL;
+static PyObject* decompress(PyObject* self, PyObject* args) {
+	Py_buffer data;
+	Py_ssize_t offset;
+	PyObject *result;
+	uchar *buffer;
 
-	romBuffer = (uchar*) PyByteArray_AsString(romByteArr);
+	if (!PyArg_ParseTuple(args, "s*n", &data, &offset))
+		return NULL;
 
-        // Allocate a buffer
-        buffer = (uchar*) malloc(sizeof(uchar) * 65536);
-        new_size = decomp_(romBuffer, addr, buffer, 65536);
+	buffer = (uchar*) malloc(sizeof(uchar) * MAX_DECOMP_SIZE);
+	if (buffer == NULL) {
+		PyBuffer_Release(&data);
+		return PyErr_NoMemory();
+	}
+	result = decompress_to_string((const uchar*) data.buf, data.len, offset, buffer);
+	free(buffer);
+	PyBuffer_Release(&data);
+	return result;
+}
 
-        ulist = PyList_New(new_size);
-        for (i=0; i<new_size; ++i) {
-                o = PyInt_FromLong((long) buffer[i]);
-                PyList_SetItem(ulist, i, o);
-        }
-        free(buffer);
-	//free(romBuffer);
-	Py_DECREF(romBuffer);
-	Py_DECREF(romByteArr);
-        return ulist;
+static PyObject* decompress_many(PyObject* self, PyObject* args) {
+	Py_buffer data;
+	PyObject *offsets, *offsets_seq, *results, *udata;
+	Py_ssize_t num_offsets, offset, i;
+	uchar *buffer;
+
+	if (!PyArg_ParseTuple(args, "s*O", &data, &offsets))
+		return NULL;
+
+	offsets_seq = PySequence_Fast(offsets, "offsets must be a sequence");
+	if (offsets_seq == NULL) {
+		PyBuffer_Release(&data);
+		return NULL;
+	}
+	num_offsets = PySequence_Fast_GET_SIZE(offsets_seq);
+	buffer = (uchar*) malloc(sizeof(uchar) * MAX_DECOMP_SIZE);
+	results = buffer ? PyList_New(num_offsets) : PyErr_NoMemory();
+	for (i=0; results != NULL && i<num_offsets; ++i) {
+		offset = PyNumber_AsSsize_t(PySequence_Fast_GET_ITEM(offsets_seq, i), PyExc_IndexError);
+		udata = (offset == -1 && PyErr_Occurred()) ? NULL
+			: decompress_to_string((const uchar*) data.buf, data.len, offset, buffer);
+		if (udata == NULL) {
+			Py_CLEAR(results);
+			break;
+		}
+		PyList_SET_ITEM(results, i, udata);
+	}
+	free(buffer);
+	Py_DECREF(offsets_seq);
+	PyBuffer_Release(&data);
+	return results;
 }
 
 static PyMethodDef native_compMethods[] = {
 	{"comp", comp, METH_VARARGS, "C implementation of EB's comp()"},
 	{"decomp", decomp, METH_VARARGS, "C implementation of EB's decomp()"},
+	{"compress", compress, METH_VARARGS,
+		"compress(data[, level]) -> string\n\nCompresses a string or buffer, such as an array of bytes."},
+	{"decompress", decompress, METH_VARARGS,
+		"decompress(data, offset) -> string\n\nDecompresses the block at an offset in a string or buffer."},
+	{"decompress_many", decompress_many, METH_VARARGS,
+		"decompress_many(data, offsets) -> list of strings\n\nDecompresses the block at each offset in a string or "
+		"buffer."},
 	{NULL, NULL, 0, NULL}
 };
 
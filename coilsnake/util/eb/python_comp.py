@@ -0,0 +1,495 @@
+"""A pure Python implementation of EarthBound's compression format, with the same interface and output as the native
+compression library, for use where the native library can't be built."""
+
+# The compression levels, as in the native library
+COMP_LEVEL_FAST = 0
+COMP_LEVEL_NORMAL = 1
+COMP_LEVEL_OPTIMAL = 2
+
+# The minimum length of a copy, bit-reversed copy or backward copy
+MIN_MATCH = 5
+# The maximum length of any command
+MAX_LENGTH = 1024
+# The maximum number of earlier occurrences examined per position when looking for the longest match
+MAX_CHAIN = 512
+# The maximum size of decompressed data. Copies can only refer to the first 64KB of the output.
+MAX_DECOMP_SIZE = 65536
+
+_INFINITY = float("inf")
+
+
+def _reverse_bits(x):
+    x = ((x >> 1) & 0x55) | ((x << 1) & 0xAA)
+    x = ((x >> 2) & 0x33) | ((x << 2) & 0xCC)
+    return ((x >> 4) & 0x0F) | ((x << 4) & 0xF0)
+
+_BITREV_TABLE = "".join([chr(_reverse_bits(i)) for i in xrange(256)])
+
+
+def _as_buffer(data, offset=0):
+    """Returns a read-only view of a string or buffer object, starting at an offset, without copying it."""
+    try:
+        return buffer(data, offset)
+    except TypeError:
+        return buffer(memoryview(data).tobytes(), offset)
+
+
+def _common_length(a, a_offset, b, b_offset, n, limit):
+    """Returns the length of the common prefix of a[a_offset:] and b[b_offset:], up to limit, given that the first n
+    bytes are known to match. Slices of increasing size are compared at once, so long matches are found quickly."""
+    step = 8
+    while n < limit:
+        step = min(step, limit - n)
+        if a[a_offset + n:a_offset + n + step] == b[b_offset + n:b_offset + n + step]:
+            n += step
+            step <<= 1
+        elif step == 1:
+            break
+        else:
+            step >>= 1
+    return n
+
+
+def _encode(output, length, type):
+    if length > 32:
+        output.append(0xE0 + 4 * type + ((length - 1) >> 8))
+        output.append((length - 1) & 0xFF)
+    else:
+        output.append(0x20 * type + length - 1)
+
+
+def _encode_raw(output, data, pos, length):
+    if length > 0:
+        _encode(output, length, 0)
+        output.extend(data[pos:pos + length])
+
+
+def _encode_command(output, data, pos, type, length, src):
+    """Writes a command of the given type and length. Types 1 to 3 take their data from pos, and types 4 to 6 copy
+    from src. For type 2, the length is the number of two-byte words."""
+    _encode(output, length, type)
+    if type == 1 or type == 3:
+        output.extend(data[pos])
+    elif type == 2:
+        output.extend(data[pos:pos + 2])
+    else:
+        output.append(src >> 8)
+        output.append(src & 0xFF)
+
+
+class _MatchFinder(object):
+    """Finds earlier occurrences of the MIN_MATCH-byte sequence at a position. Positions are added in increasing
+    order, and each position links to the previous occurrence of its sequence."""
+
+    def __init__(self, data):
+        self.data = data
+        self.length = len(data)
+        # The data with each byte bit-reversed, and the data backwards, so that every type of match can be found by
+        # comparing slices
+        self.bitrev_data = data.translate(_BITREV_TABLE)
+        self.backward_data = data[::-1]
+        self.first = dict()
+        self.last = dict()
+        self.prev = [-1] * (self.length + 1)
+        self.inserted = 0
+
+    def insert_until(self, end):
+        """Adds every position whose sequence ends at or before end."""
+        data, first, last, prev = self.data, self.first, self.last, self.prev
+        for i in xrange(self.inserted, end - MIN_MATCH + 1):
+            key = data[i:i + MIN_MATCH]
+            if key in last:
+                prev[i] = last[key]
+            else:
+                first[key] = i
+            last[key] = i
+        self.inserted = max(self.inserted, end - MIN_MATCH + 1)
+
+    def match_key(self, dst, type):
+        """Returns the sequence which a match of the given type at dst needs to find earlier in the data."""
+        if type == 4:
+            return self.data[dst:dst + MIN_MATCH]
+        elif type == 5:
+            return self.bitrev_data[dst:dst + MIN_MATCH]
+        return self.data[dst:dst + MIN_MATCH][::-1]
+
+    def match_length(self, type, src, dst, n):
+        """Returns the length of the match of the given type from src to dst, given that the first n bytes are known
+        to match. Forward and bit-reversed copies must be entirely before dst."""
+        remaining = min(self.length - dst, MAX_LENGTH)
+        if type == 4:
+            return _common_length(self.data, src, self.data, dst, n, min(dst - src, remaining))
+        elif type == 5:
+            return _common_length(self.data, src, self.bitrev_data, dst, n, min(dst - src, remaining))
+        return _common_length(self.backward_data, self.length - 1 - src, self.data, dst, n, min(src + 1, remaining))
+
+    def find_earliest_match(self, dst, last_type):
+        """Looks for the earliest copy (type 4), bit-reversed copy (type 5) or backward copy (type 6) of earlier data
+        at dst, preferring them in that order at the same position.
+        :return: a (length, type, src) tuple, where length is 0 if there is no match"""
+        if dst + MIN_MATCH > self.length:
+            return 0, 0, 0
+        self.insert_until(dst)
+
+        found_type, found_src = None, None
+        for type in xrange(4, last_type + 1):
+            p = self.first.get(self.match_key(dst, type))
+            if p is None:
+                continue
+            if type == 6:
+                p += MIN_MATCH - 1
+            # Offsets are stored in two bytes
+            if p <= 0xFFFF and (found_type is None or p < found_src):
+                found_type, found_src = type, p
+        if found_type is None:
+            return 0, 0, 0
+        return self.match_length(found_type, found_src, dst, 0), found_type, found_src
+
+    def find_longest_match(self, dst, type):
+        """Looks for the longest match of one type at dst, looking at the most recent occurrences first.
+        :return: a (length, src) tuple, where length is 0 if there is no match"""
+        if dst + MIN_MATCH > self.length:
+            return 0, 0
+        self.insert_until(dst)
+
+        p = self.last.get(self.match_key(dst, type), -1)
+        offset = MIN_MATCH - 1 if type == 6 else 0
+        best_length, best_src = 0, 0
+        prev = self.prev
+        chain = 0
+        while p >= 0 and chain < MAX_CHAIN:
+            if p + offset <= 0xFFFF:
+                length = self.match_length(type, p + offset, dst, MIN_MATCH)
+                if length > best_length:
+                    best_length, best_src = length, p + offset
+                    if length == MAX_LENGTH or dst + length == self.length:
+                        break
+            p = prev[p]
+            chain += 1
+        return best_length, best_src
+
+
+def _get_runs(data):
+    """Returns lists of the lengths of the runs of repeated bytes, repeated two-byte words, and incrementing bytes
+    starting at each position. Word runs are counted in words."""
+    length = len(data)
+    values = bytearray(data)
+    runs = [1] * (length + 1)
+    word_runs = [0] * (length + 2)
+    increment_runs = [1] * (length + 1)
+    for i in xrange(length - 2, -1, -1):
+        if values[i] == values[i + 1]:
+            runs[i] = runs[i + 1] + 1
+        if values[i + 1] == values[i] + 1:
+            increment_runs[i] = increment_runs[i + 1] + 1
+        word_runs[i] = 1
+        if i + 3 < length and values[i] == values[i + 2] and values[i + 1] == values[i + 3]:
+            word_runs[i] += word_runs[i + 2]
+    return runs, word_runs, increment_runs
+
+
+def _compress_greedy(data, level):
+    """Compresses data greedily, taking the first command found at the earliest position possible."""
+    length = len(data)
+    output = bytearray()
+    finder = _MatchFinder(data)
+    last_type = 4 if level == COMP_LEVEL_FAST else 6
+    runs, word_runs, increment_runs = _get_runs(data)
+
+    pos = 0
+    while pos < length:
+        pos2 = pos
+        end = min(length, pos + MAX_LENGTH)
+        while pos2 < end:
+            command = None
+            if runs[pos2] >= 3:
+                command = (1, min(runs[pos2], MAX_LENGTH), 0, min(runs[pos2], MAX_LENGTH))
+            elif word_runs[pos2] >= 3:
+                command = (2, min(word_runs[pos2], MAX_LENGTH), 0, 2 * min(word_runs[pos2], MAX_LENGTH))
+            elif increment_runs[pos2] >= 4:
+                command = (3, min(increment_runs[pos2], MAX_LENGTH), 0, min(increment_runs[pos2], MAX_LENGTH))
+            else:
+                match_length, type, src = finder.find_earliest_match(pos2, last_type)
+                if match_length >= MIN_MATCH:
+                    command = (type, match_length, src, match_length)
+            if command:
+                type, command_length, src, size = command
+                _encode_raw(output, data, pos, pos2 - pos)
+                _encode_command(output, data, pos2, type, command_length, src)
+                pos = pos2 + size
+                break
+            pos2 += 1
+        if pos < pos2:
+            # Can't compress, so just use 0 (raw)
+            _encode_raw(output, data, pos, pos2 - pos)
+            pos = pos2
+    output.append(0xFF)
+    return output
+
+
+class _MinTree(object):
+    """A segment tree for finding the minimum of a range of values, and where it is."""
+
+    def __init__(self, n):
+        self.size = 1
+        while self.size < n:
+            self.size <<= 1
+        self.value = [_INFINITY] * (2 * self.size)
+        self.index = [-1] * (2 * self.size)
+
+    def set(self, i, value):
+        values, indexes = self.value, self.index
+        i += self.size
+        values[i] = value
+        indexes[i] = i - self.size
+        i >>= 1
+        while i > 0:
+            child = 2 * i if values[2 * i] <= values[2 * i + 1] else 2 * i + 1
+            values[i] = values[child]
+            indexes[i] = indexes[child]
+            i >>= 1
+
+    def query(self, lo, hi):
+        """Returns the minimum value in [lo, hi] and its position, or infinity if there is none."""
+        values, indexes = self.value, self.index
+        best, best_index = _INFINITY, -1
+        lo = max(lo, 0) + self.size
+        hi = min(hi, self.size - 1) + self.size + 1
+        while lo < hi:
+            if lo & 1:
+                if values[lo] < best:
+                    best, best_index = values[lo], indexes[lo]
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                if values[hi] < best:
+                    best, best_index = values[hi], indexes[hi]
+            lo >>= 1
+            hi >>= 1
+        return best, best_index
+
+
+def _consider(step, tree, base, lo, hi, scale, offset, payload, type):
+    """Considers commands of one type with lengths from lo to hi, whose cost is the header plus payload bytes plus the
+    cost of the position which they end at, as given by the tree. Positions in the tree are (end - offset) / scale.
+    The step is a [cost, type, length] list, which is updated if a cheaper command is found."""
+    for header in (1, 2):
+        # Commands of up to 32 have one byte headers, and longer ones have two
+        if header == 1:
+            range_lo, range_hi = lo, min(hi, 32)
+        else:
+            range_lo, range_hi = max(lo, 33), hi
+        if range_lo > range_hi:
+            continue
+        cost, index = tree.query((base + range_lo * scale - offset) // scale,
+                                 (base + range_hi * scale - offset) // scale)
+        if cost == _INFINITY:
+            continue
+        cost += header + payload
+        if cost < step[0]:
+            step[0] = cost
+            step[1] = type
+            step[2] = (index * scale + offset - base) // scale
+
+
+def _compress_optimal(data):
+    """Compresses data into the smallest possible output, by finding the cheapest sequence of commands which covers
+    it, in the same way as the native compressor."""
+    length = len(data)
+    values = bytearray(data)
+    finder = _MatchFinder(data)
+
+    # Find the longest copy of each type at each position. A long match continues at the next position, so it is
+    # extended instead of searching for a new one.
+    match_lengths = [[0] * length for t in xrange(3)]
+    match_src = [[0] * length for t in xrange(3)]
+    for i in xrange(length):
+        for t in xrange(3):
+            lengths, srcs = match_lengths[t], match_src[t]
+            if i > 0 and lengths[i - 1] > 32 and srcs[i - 1] < 0xFFFF:
+                srcs[i] = srcs[i - 1] + (-1 if t == 2 else 1)
+                lengths[i] = finder.match_length(t + 4, srcs[i], i, lengths[i - 1] - 1)
+            else:
+                lengths[i], srcs[i] = finder.find_longest_match(i, t + 4)
+
+    # Find the cheapest encoding of each suffix of the data, from the end backwards
+    steps = [None] * (length + 1)
+    steps[length] = [0, 0, 0]
+    cost_tree = _MinTree(length + 1)
+    raw_tree = _MinTree(length + 1)
+    word_trees = [_MinTree(length // 2 + 1), _MinTree(length // 2 + 1)]
+    cost_tree.set(length, 0)
+    raw_tree.set(length, length)
+    word_trees[length & 1].set(length // 2, 0)
+    run = increment_run = 1
+    next_word_runs = [0, 0]
+    for i in xrange(length - 1, -1, -1):
+        # The lengths of the runs of repeated bytes, repeated words and incrementing bytes starting here
+        run = min(run + 1, MAX_LENGTH) if (i + 1 < length and values[i] == values[i + 1]) else 1
+        if i + 3 < length and values[i] == values[i + 2] and values[i + 1] == values[i + 3]:
+            word_run = min(next_word_runs[1] + 1, MAX_LENGTH)
+        else:
+            word_run = 1
+        next_word_runs = [word_run, next_word_runs[0]]
+        increment_run = min(increment_run + 1, MAX_LENGTH) if (i + 1 < length and values[i + 1] == values[i] + 1) \
+            else 1
+
+        step = [_INFINITY, 0, 0]
+        _consider(step, raw_tree, i, 1, min(length - i, MAX_LENGTH), 1, 0, -i, 0)
+        if run >= 3:
+            _consider(step, cost_tree, i, 3, run, 1, 0, 1, 1)
+        if word_run >= 3:
+            _consider(step, word_trees[i & 1], i, 3, word_run, 2, i & 1, 2, 2)
+        if increment_run >= 4:
+            _consider(step, cost_tree, i, 4, increment_run, 1, 0, 1, 3)
+        for t in xrange(3):
+            if match_lengths[t][i] >= MIN_MATCH:
+                _consider(step, cost_tree, i, MIN_MATCH, match_lengths[t][i], 1, 0, 2, t + 4)
+        steps[i] = step
+
+        cost_tree.set(i, step[0])
+        raw_tree.set(i, step[0] + i)
+        word_trees[i & 1].set(i // 2, step[0])
+
+    # Write out the cheapest encoding
+    output = bytearray()
+    i = 0
+    while i < length:
+        _, type, command_length = steps[i]
+        if type == 0:
+            _encode_raw(output, data, i, command_length)
+            i += command_length
+        else:
+            _encode_command(output, data, i, type, command_length, match_src[type - 4][i] if type >= 4 else 0)
+            i += 2 * command_length if type == 2 else command_length
+    output.append(0xFF)
+    return output
+
+
+def _decompress(cdata):
+    """Decompresses the compressed block at the start of a buffer.
+    :return: the decompressed data as a bytearray, or None if the data is invalid"""
+    buffer_ = bytearray(MAX_DECOMP_SIZE)
+    end = len(cdata)
+    pos = 0
+    bpos = 0
+    while pos < end and cdata[pos] != "\xff":
+        command = ord(cdata[pos])
+        type = command >> 5
+        length = (command & 0x1F) + 1
+        if type == 7:
+            if pos + 1 >= end:
+                return None
+            type = (command & 0x1C) >> 2
+            length = ((command & 3) << 8) + ord(cdata[pos + 1]) + 1
+            pos += 1
+        if bpos + length > MAX_DECOMP_SIZE:
+            return None
+        pos += 1
+        if type >= 4:
+            if pos + 2 > end:
+                return None
+            bpos2 = (ord(cdata[pos]) << 8) + ord(cdata[pos + 1])
+            pos += 2
+
+        if type == 0:
+            if pos + length > end:
+                return None
+            buffer_[bpos:bpos + length] = cdata[pos:pos + length]
+            pos += length
+        elif type == 1:
+            if pos >= end:
+                return None
+            buffer_[bpos:bpos + length] = cdata[pos] * length
+            pos += 1
+        elif type == 2:
+            if pos + 2 > end:
+                return None
+            length *= 2
+            if bpos + length > MAX_DECOMP_SIZE:
+                return None
+            buffer_[bpos:bpos + length] = cdata[pos:pos + 2] * (length // 2)
+            pos += 2
+        elif type == 3:
+            if pos >= end:
+                return None
+            value = ord(cdata[pos])
+            buffer_[bpos:bpos + length] = bytearray([(value + i) & 0xFF for i in xrange(length)])
+            pos += 1
+        elif type == 4:
+            if bpos2 + length > MAX_DECOMP_SIZE:
+                return None
+            if bpos2 < bpos < bpos2 + length:
+                # Overlapping copies repeat the data, since the game copies byte by byte
+                period = buffer_[bpos2:bpos]
+                buffer_[bpos:bpos + length] = (period * (length // len(period) + 1))[:length]
+            else:
+                buffer_[bpos:bpos + length] = buffer_[bpos2:bpos2 + length]
+        elif type == 5:
+            if bpos2 + length > MAX_DECOMP_SIZE:
+                return None
+            if bpos2 < bpos < bpos2 + length:
+                for i in xrange(length):
+                    buffer_[bpos + i] = _reverse_bits(buffer_[bpos2 + i])
+            else:
+                buffer_[bpos:bpos + length] = str(buffer_[bpos2:bpos2 + length]).translate(_BITREV_TABLE)
+        elif type == 6:
+            if bpos2 - length + 1 < 0:
+                return None
+            if bpos2 < bpos:
+                buffer_[bpos:bpos + length] = buffer_[bpos2 - length + 1:bpos2 + 1][::-1]
+            else:
+                for i in xrange(length):
+                    buffer_[bpos + i] = buffer_[bpos2 - i]
+        else:
+            return None
+        bpos += length
+    if pos >= end:
+        return None
+    return buffer_[:bpos]
+
+
+def _check_level(level):
+    if level < COMP_LEVEL_FAST or level > COMP_LEVEL_OPTIMAL:
+        raise ValueError("invalid compression level {}".format(level))
+
+
+def compress(data, level=COMP_LEVEL_NORMAL):
+    """Compresses a string or buffer, such as an array of bytes.
+    :return: the compressed data as a string"""
+    _check_level(level)
+    data = str(_as_buffer(data))
+    if not data:
+        raise ValueError("cannot compress 0 bytes of data")
+    if level == COMP_LEVEL_OPTIMAL:
+        return str(_compress_optimal(data))
+    return str(_compress_greedy(data, level))
+
+
+def decompress(data, offset):
+    """Decompresses the block at an offset in a string or buffer.
+    :return: the decompressed data as a string"""
+    if offset < 0 or offset >= len(data):
+        raise IndexError("offset {:#x} is out of bounds".format(offset))
+    udata = _decompress(_as_buffer(data, offset))
+    if udata is None:
+        raise ValueError("invalid compressed data at offset {:#x}".format(offset))
+    return str(udata)
+
+
+def decompress_many(data, offsets):
+    """Decompresses the block at each offset in a string or buffer.
+    :return: a list of strings"""
+    return [decompress(data, offset) for offset in offsets]
+
+
+def comp(udata, level=COMP_LEVEL_NORMAL):
+    """Compresses a list of bytes into a list of bytes."""
+    if not udata:
+        raise TypeError("got empty list")
+    return list(bytearray(compress(bytearray(udata), level)))
+
+
+def decomp(rom, addr):
+    """Decompresses the block at an offset in a block's data into a list of bytes."""
+    return list(bytearray(decompress(rom.data, addr)))
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+from coilsnake.util.common.cache import CACHE_DIRECTORY_ENVIRONMENT_VARIABLE
+
+# Keep the caches created while testing out of the user's cache directory
+os.environ[CACHE_DIRECTORY_ENVIRONMENT_VARIABLE] = os.path.join(tempfile.gettempdir(), "coilsnake-test-cache")
@@ -1,4 +1,5 @@
 from itertools import izip_longest
+import shutil
 import tempfile
 
 import os
@@ -6,6 +7,8 @@ from PIL import Image, ImageChops
 from nose.tools import assert_is_none
 from nose.tools.trivial import eq_
 
+from coilsnake.util.common.cache import CACHE_DIRECTORY_ENVIRONMENT_VARIABLE
+
 
 TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), "test_data")
 TEST_IMAGE_DIR = os.path.join(TEST_DATA_DIR, "images")
@@ -36,6 +39,20 @@ class TemporaryWritableFileTestCase(object):
         os.remove(self.temporary_wo_file_name)
 
 
+class TemporaryCacheDirectoryTestCase(object):
+    def setup(self):
+        self.temporary_cache_directory = tempfile.mkdtemp()
+        self.previous_cache_directory = os.environ.get(CACHE_DIRECTORY_ENVIRONMENT_VARIABLE)
+        os.environ[CACHE_DIRECTORY_ENVIRONMENT_VARIABLE] = self.temporary_cache_directory
+
+    def teardown(self):
+        if self.previous_cache_directory is None:
+            del os.environ[CACHE_DIRECTORY_ENVIRONMENT_VARIABLE]
+        else:
+            os.environ[CACHE_DIRECTORY_ENVIRONMENT_VARIABLE] = self.previous_cache_directory
+        shutil.rmtree(self.temporary_cache_directory)
+
+
 class TilesetImageTestCase(object):
     def setup(self):
         self.tile_image_01_fp = open(os.path.join(TEST_IMAGE_DIR, "tile_image_01.png"), 'rb')
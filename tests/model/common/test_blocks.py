@@ -1,10 +1,17 @@
+import hashlib
+import mmap
 import os
+import tempfile
 
 from nose.tools import assert_equal, assert_not_equal, assert_raises, assert_list_equal, assert_false, assert_true, \
     assert_is_instance
 from nose.tools.nontrivial import raises
 
-from coilsnake.model.common.blocks import Block, AllocatableBlock, Rom, ROM_TYPE_NAME_UNKNOWN
+from functools import partial
+
+from coilsnake.model.common.blocks import Block, AllocatableBlock, Rom, ROM_TYPE_NAME_UNKNOWN, ALLOCATION_POLICIES, \
+    RomFileInfoCache
+from coilsnake.util.eb.helper import is_in_bank
 from tests.coilsnake_test import BaseTestCase, TEST_DATA_DIR
 from coilsnake.exceptions.common.exceptions import FileAccessError, OutOfBoundsError, InvalidArgumentError, \
     CouldNotAllocateError, NotEnoughUnallocatedSpaceError
@@ -79,6 +86,30 @@ class TestBlock(BaseTestCase):
         assert_raises(InvalidArgumentError, self.block.__getitem__, slice(1024, -1))
         assert_raises(InvalidArgumentError, self.block.__getitem__, slice(1022, 3))
 
+    def test_getitem_slice_view(self):
+        self.block.from_list(range(10))
+
+        view = self.block[2:8]
+        sub_view = view[1:3]
+        assert_list_equal(sub_view.to_list(), [3, 4])
+        assert_equal(view.read_multi(0, 2), 0x0302)
+        assert_equal(view[5], 7)
+        assert_raises(OutOfBoundsError, view.__getitem__, 6)
+        assert_equal(view, view[0:6])
+
+        # Writing to a view does not change the block it was taken from
+        view[0] = 0xff
+        assert_equal(view[0], 0xff)
+        assert_equal(self.block[2], 2)
+        assert_list_equal(sub_view.to_list(), [3, 4])
+
+        # Writing to a block does not change the views which were taken from it
+        sub_view = self.block[3:5]
+        self.block[3:5] = [0xaa, 0xbb]
+        self.block.write_multi(0, 0xffff, 2)
+        assert_list_equal(sub_view.to_list(), [3, 4])
+        assert_list_equal(self.block[0:5].to_list(), [0xff, 0xff, 2, 0xaa, 0xbb])
+
     def test_setitem(self):
         self.block.from_file(os.path.join(TEST_DATA_DIR, "binaries", "1kb_rand.bin"))
 
@@ -149,6 +180,46 @@ class TestBlock(BaseTestCase):
         assert_raises(OutOfBoundsError, self.block.write_multi, 1, 0, 6)
         assert_raises(OutOfBoundsError, self.block.write_multi, 3, 0, 4)
 
+    def test_write_back_to_file(self):
+        size = mmap.PAGESIZE * 4
+        temporary_file = tempfile.NamedTemporaryFile(delete=False)
+        temporary_file.close()
+        try:
+            self.block.from_list([0] * size)
+            assert_equal(self.block.write_back_to_file(temporary_file.name), size)
+
+            # Only the pages which changed are written
+            self.block[1] = 0x11
+            self.block[mmap.PAGESIZE * 3 + 5] = 0x22
+            assert_equal(self.block.write_back_to_file(temporary_file.name), mmap.PAGESIZE * 2)
+            assert_equal(self.block.write_back_to_file(temporary_file.name), 0)
+
+            written_block = Block()
+            written_block.from_file(temporary_file.name)
+            assert_equal(written_block.to_list(), self.block.to_list())
+
+            # Files of a different size are completely rewritten
+            self.block.from_list([1] * 10)
+            assert_equal(self.block.write_back_to_file(temporary_file.name), 10)
+            written_block.from_file(temporary_file.name)
+            assert_equal(written_block.to_list(), [1] * 10)
+        finally:
+            os.remove(temporary_file.name)
+
+    def test_record_writes(self):
+        self.block.from_list([0] * 16)
+        self.block.start_recording_writes()
+        self.block[0] = 0
+        self.block[1] = 1
+        self.block.write_multi(4, 0x1234, 2)
+        self.block[5:8] = [0, 0, 0]
+        self.block[12:14] = [1, 2]
+        assert_list_equal(self.block.stop_recording_writes(), [(0, 2), (4, 8), (12, 14)])
+
+        # Writes are not recorded after recording is stopped
+        self.block[15] = 1
+        assert_list_equal(self.block.stop_recording_writes(), [])
+
     def test_len(self):
         self.block.from_list([0x03, 0xa1, 0x44, 0x15, 0x92, 0x65])
         assert_equal(len(self.block), 6)
@@ -215,6 +286,8 @@ class TestAllocatableBlock(TestBlock):
         assert_list_equal(self.block.unallocated_ranges, [(2, 2)])
 
         self.block.from_list([0] * 0x50)
+        # Adjacent unallocated ranges are only kept separate at bank boundaries
+        self.block.BANK_SIZE = 0x10
         self.block.unallocated_ranges = [(0, 0xf), (0x10, 0x1f), (0x20, 0x2f), (0x30, 0x3f)]
         # Mark a range free that spans multiple unallocated ranges
         self.block.mark_allocated((0x5, 0x25))
@@ -260,7 +333,9 @@ class TestAllocatableBlock(TestBlock):
         assert_true(self.block.is_unallocated((9, 9)))
         assert_true(self.block.is_unallocated((1, 1)))
         assert_false(self.block.is_unallocated((0, 1)))
-        assert_false(self.block.is_unallocated((1, 4)))
+        # Adjacent unallocated ranges are merged
+        assert_true(self.block.is_unallocated((1, 4)))
+        assert_true(self.block.is_unallocated((1, 5)))
         assert_false(self.block.is_unallocated((0, 4)))
         assert_false(self.block.is_unallocated((0, 9)))
         assert_false(self.block.is_unallocated((1, 9)))
@@ -294,9 +369,160 @@ class TestAllocatableBlock(TestBlock):
     def test_allocate_across_ranges(self):
         self.block.from_list([0] * 100)
         self.block.deallocate((0, 5))
-        self.block.deallocate((6, 9))
+        self.block.deallocate((7, 9))
         assert_raises(NotEnoughUnallocatedSpaceError, self.block.allocate, None, 10)
 
+        # Once the gap between them is deallocated, the ranges are merged
+        self.block.deallocate((6, 6))
+        assert_equal(self.block.allocate(size=10), 0)
+
+    def test_deallocate_coalescing(self):
+        self.block.from_list([0] * 0x20000)
+        self.block.deallocate((0x10, 0x1f))
+        self.block.deallocate((0x30, 0x3f))
+        self.block.deallocate((0x20, 0x2f))
+        assert_list_equal(self.block.unallocated_ranges, [(0x10, 0x3f)])
+        # Overlapping ranges are merged
+        self.block.deallocate((0x8, 0x14))
+        self.block.deallocate((0x3a, 0x4f))
+        assert_list_equal(self.block.unallocated_ranges, [(0x8, 0x4f)])
+        self.block.deallocate((0x0, 0x100))
+        assert_list_equal(self.block.unallocated_ranges, [(0x0, 0x100)])
+
+        # Ranges in different banks are not merged
+        self.block.deallocate((0xff00, 0xffff))
+        self.block.deallocate((0x10000, 0x100ff))
+        assert_list_equal(self.block.unallocated_ranges, [(0x0, 0x100), (0xff00, 0xffff), (0x10000, 0x100ff)])
+        assert_raises(NotEnoughUnallocatedSpaceError, self.block.allocate, None, 0x200)
+        assert_true(self.block.is_allocated((0xfff0, 0x1000f)))
+
+    def test_set_unallocated_ranges(self):
+        self.block.from_list([0] * 0x20000)
+        # Overlapping and adjacent ranges are merged, except for adjacent ranges in different banks
+        self.block.unallocated_ranges = [(0x30, 0x3f), (0x10, 0x1f), (0x20, 0x28), (0x25, 0x2f), (0x100, 0x1ff),
+                                         (0x180, 0x18f), (0xff00, 0xffff), (0x10000, 0x100ff)]
+        assert_list_equal(self.block.unallocated_ranges, [(0x10, 0x3f), (0x100, 0x1ff), (0xff00, 0xffff),
+                                                          (0x10000, 0x100ff)])
+        self.block.deallocate((0x40, 0xff))
+        assert_list_equal(self.block.unallocated_ranges, [(0x10, 0x1ff), (0xff00, 0xffff), (0x10000, 0x100ff)])
+
+    def test_allocate_many_small_ranges(self):
+        self.block.from_list([0] * 0x20000)
+        # Leave thousands of ranges which are too small, followed by a few which are large enough
+        for offset in xrange(0, 0x18000, 0x10):
+            self.block.deallocate((offset, offset + 0x7))
+        self.block.deallocate((0x1a000, 0x1a0ff))
+        self.block.deallocate((0x1c000, 0x1c3ff))
+
+        assert_equal(self.block.allocate(size=0x100), 0x1a000)
+        assert_equal(self.block.allocate(size=0x9), 0x1c000)
+        assert_equal(self.block.allocate(size=0x8), 0)
+        assert_equal(self.block.allocate(size=0x4), 0x10)
+        assert_equal(self.block.allocate(size=0x4), 0x14)
+        assert_equal(self.block.allocate(size=0x100, policy=ALLOCATION_POLICIES["best-fit"]), 0x1c009)
+        assert_raises(NotEnoughUnallocatedSpaceError, self.block.allocate, None, 0x400)
+
+        # Allocations agree with a search of every unallocated range
+        for size in [0x2f7, 0x8, 0x3, 0x5, 0x8, 0x1]:
+            expected_offset = next(begin for begin, end in self.block.unallocated_ranges if end - begin + 1 >= size)
+            assert_equal(self.block.allocate(size=size), expected_offset)
+
+    def test_get_allocation_statistics(self):
+        self.block.from_list([0] * 100)
+        statistics = self.block.get_allocation_statistics()
+        assert_equal(statistics.num_unallocated_ranges, 0)
+        assert_equal(statistics.unallocated_size, 0)
+        assert_equal(statistics.fragmentation, 0)
+
+        self.block.deallocate((0, 29))
+        self.block.deallocate((50, 59))
+        statistics = self.block.get_allocation_statistics()
+        assert_equal(statistics.num_unallocated_ranges, 2)
+        assert_equal(statistics.unallocated_size, 40)
+        assert_equal(statistics.largest_unallocated_size, 30)
+        assert_equal(statistics.fragmentation, 0.25)
+
+    def test_get_allocation_statistics_by_bank(self):
+        self.block.from_list([0] * 0x30000)
+        self.block.unallocated_ranges = [(0x100, 0x1ff), (0xff00, 0x100ff), (0x20000, 0x2000f)]
+        statistics_by_bank = self.block.get_allocation_statistics_by_bank()
+        assert_equal(sorted(statistics_by_bank.keys()), [0, 1, 2])
+        assert_equal(statistics_by_bank[0].num_unallocated_ranges, 2)
+        assert_equal(statistics_by_bank[0].unallocated_size, 0x200)
+        assert_equal(statistics_by_bank[1].unallocated_size, 0x100)
+        assert_equal(statistics_by_bank[2].unallocated_size, 0x10)
+
+    def test_allocate_in_bank_inside_range(self):
+        self.block.from_list([0] * 0x30000)
+        self.block.unallocated_ranges = [(0xff00, 0x100ff)]
+        # The range begins in bank 0, but part of it is in bank 1
+        assert_equal(self.block.allocate(size=0x10, can_write_to=partial(is_in_bank, 1)), 0x10000)
+        assert_list_equal(self.block.unallocated_ranges, [(0xff00, 0xffff), (0x10010, 0x100ff)])
+        assert_raises(NotEnoughUnallocatedSpaceError, self.block.allocate, None, 0x101, partial(is_in_bank, 0))
+
+    def test_allocate_best_fit(self):
+        self.block.from_list([0] * 100)
+        self.block.unallocated_ranges = [(0, 19), (30, 39), (50, 54)]
+        assert_equal(self.block.allocate(size=5, policy=ALLOCATION_POLICIES["first-fit"]), 0)
+        assert_equal(self.block.allocate(size=5, policy=ALLOCATION_POLICIES["best-fit"]), 50)
+        assert_equal(self.block.allocate(size=5, policy=ALLOCATION_POLICIES["best-fit"]), 30)
+        self.block.allocation_policy = ALLOCATION_POLICIES["best-fit"]
+        assert_equal(self.block.allocate(size=5), 35)
+        assert_list_equal(self.block.unallocated_ranges, [(5, 19)])
+
+    def test_allocate_bank_best_fit(self):
+        self.block.from_list([0] * 0x30000)
+        self.block.unallocated_ranges = [(0x100, 0x1ff), (0xffd0, 0x1002f)]
+        # Best-fit uses the range crossing the bank boundary, but the data doesn't fit in either of its banks
+        assert_equal(self.block.allocate(size=0x40, policy=ALLOCATION_POLICIES["best-fit"]), 0xffd0)
+        self.block.unallocated_ranges = [(0x100, 0x1ff), (0xffd0, 0x1002f)]
+        assert_equal(self.block.allocate(size=0x40, policy=ALLOCATION_POLICIES["bank-best-fit"]), 0x100)
+        assert_equal(self.block.allocate(size=0x20, policy=ALLOCATION_POLICIES["bank-best-fit"]), 0xffd0)
+        assert_equal(self.block.allocate(size=0x30, policy=ALLOCATION_POLICIES["bank-best-fit"]), 0x10000)
+
+    def test_allocate_batch(self):
+        self.block.from_list([0] * 100)
+        self.block.unallocated_ranges = [(0, 4), (10, 19)]
+        # Allocating in order would put the first item in the first range, leaving no room for the second
+        assert_list_equal(self.block.allocate_batch(data_list=[[1, 2, 3], [4] * 10, [5, 6]]), [0, 10, 3])
+        assert_list_equal(self.block[0:5].to_list(), [1, 2, 3, 5, 6])
+        assert_list_equal(self.block[10:20].to_list(), [4] * 10)
+        assert_list_equal(self.block.unallocated_ranges, [])
+
+        # Nothing is allocated if one of the items does not fit
+        self.block.unallocated_ranges = [(0, 4), (10, 19)]
+        assert_raises(NotEnoughUnallocatedSpaceError, self.block.allocate_batch, None, [10, 6])
+        assert_list_equal(self.block.unallocated_ranges, [(0, 4), (10, 19)])
+
+        # Nor if one of the items can't be written
+        self.block[0:5] = [9] * 5
+        assert_raises(TypeError, self.block.allocate_batch, [[1, 2, 3], (4, 5)])
+        assert_list_equal(self.block.unallocated_ranges, [(0, 4), (10, 19)])
+        assert_list_equal(self.block[0:5].to_list(), [9] * 5)
+        assert_list_equal(self.block[10:20].to_list(), [4] * 10)
+
+    def test_allocate_all(self):
+        self.block.from_list([0] * 100)
+        self.block.unallocated_ranges = [(0, 9), (20, 22)]
+        # Data is allocated in order unless batch allocation is enabled
+        assert_raises(NotEnoughUnallocatedSpaceError, self.block.allocate_all, [[1, 2, 3], [4] * 10])
+
+        self.block.unallocated_ranges = [(0, 9), (20, 22)]
+        self.block.batch_allocation = True
+        assert_list_equal(self.block.allocate_all([[1, 2, 3], [4] * 10]), [20, 0])
+
+    def test_first_fit_layout(self):
+        self.block.from_list([0] * 0x30000)
+        self.block.unallocated_ranges = [(0x100, 0x10f), (0xff00, 0x100ff), (0x20000, 0x200ff)]
+        # Without a can_write_to predicate, data is allocated at the beginning of the first range it fits in
+        assert_equal(self.block.allocate(size=0x20), 0xff00)
+        # A range beginning in a bank which the predicate rejects is used from the next bank boundary inside of it,
+        # rather than being skipped in favor of a later range
+        assert_equal(self.block.allocate(size=0x20, can_write_to=partial(is_in_bank, 1)), 0x10000)
+        assert_equal(self.block.allocate(size=0x20, can_write_to=lambda x: not is_in_bank(0, x)), 0x10020)
+        assert_list_equal(self.block.unallocated_ranges, [(0x100, 0x10f), (0xff20, 0xffff), (0x10040, 0x100ff),
+                                                          (0x20000, 0x200ff)])
+
 
 class TestRom(TestAllocatableBlock):
     def setup(self):
@@ -316,6 +542,50 @@ class TestRom(TestAllocatableBlock):
         self.block.from_file(os.path.join(TEST_DATA_DIR, "roms", "real_EarthBound.smc"))
         assert_equal(self.block.type, "Earthbound")
 
+    def test_detect_rom_type_from_header(self):
+        # A headered HiROM image with just enough data to be detected as EarthBound
+        data = [0] * 0x10400
+        data[0x200 + 0xffc0:0x200 + 0xffcb] = [ord(x) for x in "EARTH BOUND"]
+        data[0x200 + 0xffdc:0x200 + 0xffe0] = [0x34, 0x12, 0xcb, 0xed]
+        data[-1] = 0xff
+        temporary_file = tempfile.NamedTemporaryFile(delete=False)
+        temporary_file.write(bytearray(data))
+        temporary_file.close()
+        try:
+            # The second time, the type is taken from the cache
+            for i in range(2):
+                self.block.from_file(temporary_file.name)
+                assert_equal(self.block.type, "Earthbound")
+                assert_equal(self.block.to_list(), data[0x200:])
+
+            unheadered_data = bytearray(data[0x200:])
+            assert_equal(self.block.get_md5(), hashlib.md5(unheadered_data).hexdigest())
+            unheadered_data[-1] = 0
+            assert_equal(self.block.get_md5(last_byte=0), hashlib.md5(unheadered_data).hexdigest())
+
+            assert_equal(Rom._detect_file_type(temporary_file.name), ("Earthbound", 0x200))
+        finally:
+            os.remove(temporary_file.name)
+
+    def test_rom_file_info_cache(self):
+        temporary_file = tempfile.NamedTemporaryFile(delete=False)
+        temporary_file.write("\0" * 16)
+        temporary_file.close()
+        try:
+            file_info_cache = RomFileInfoCache(temporary_file.name + ".cache")
+            assert_equal(file_info_cache.get(temporary_file.name), None)
+            file_info_cache.set(temporary_file.name, "info")
+            assert_equal(file_info_cache.get(temporary_file.name), "info")
+            assert_equal(RomFileInfoCache(temporary_file.name + ".cache").get(temporary_file.name), "info")
+
+            # Changing the file invalidates its entry
+            with open(temporary_file.name, "ab") as f:
+                f.write("\0")
+            assert_equal(RomFileInfoCache(temporary_file.name + ".cache").get(temporary_file.name), None)
+        finally:
+            os.remove(temporary_file.name)
+            os.remove(temporary_file.name + ".cache")
+
     @raises(NotImplementedError)
     def test_add_header_unknown(self):
         self.block.from_list([0])
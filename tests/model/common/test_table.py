@@ -4,7 +4,8 @@ from nose.tools.nontrivial import raises
 from coilsnake.exceptions.common.exceptions import TableError, \
     TableEntryInvalidYmlRepresentationError, TableEntryMissingDataError, TableSchemaError
 from coilsnake.model.common.blocks import Block
-from coilsnake.model.common.table import Table, GenericLittleEndianRowTableEntry, BitfieldTableEntry
+from coilsnake.model.common.table import Table, GenericLittleEndianRowTableEntry, BitfieldTableEntry, \
+    LittleEndianIntegerTableEntry, RowTableEntry
 from coilsnake.util.common.type import GenericEnum
 from tests.coilsnake_test import BaseTestCase
 
@@ -206,6 +207,84 @@ class TestGenericLittleEndianTable(GenericTestTable):
     ]
 
 
+class ReversedIntegerTableEntry(LittleEndianIntegerTableEntry):
+    @classmethod
+    def from_block(cls, block, offset):
+        return block.read_multi(offset, cls.size) ^ 0xff
+
+    @classmethod
+    def to_block(cls, block, offset, value):
+        block.write_multi(offset, value ^ 0xff, cls.size)
+
+
+class TestRowTableEntryStruct(BaseTestCase):
+    schema = RowTableEntry.from_schema(name="test", schema=[
+        LittleEndianIntegerTableEntry.create(name="a", size=3),
+        type("b", (ReversedIntegerTableEntry,), {"name": "b", "size": 1}),
+        LittleEndianIntegerTableEntry.create(name="c", size=2)])
+
+    def test_from_block(self):
+        block = Block()
+        block.from_list([0x01, 0x02, 0x03, 0x0f, 0x34, 0x12])
+        assert_list_equal(self.schema.from_block(block, 0), [0x030201, 0xf0, 0x1234])
+
+    def test_to_block(self):
+        block = Block()
+        block.from_list([0] * 6)
+        self.schema.to_block(block, 0, [0x030201, 0xf0, 0x1234])
+        assert_list_equal(block.to_list(), [0x01, 0x02, 0x03, 0x0f, 0x34, 0x12])
+
+    def test_from_block_out_of_bounds(self):
+        block = Block()
+        block.from_list([0x01, 0x02, 0x03, 0x0f, 0x34])
+        try:
+            self.schema.from_block(block, 0)
+            assert False
+        except TableSchemaError as e:
+            assert_equal(e.field, "c")
+
+
+class TestRowTableEntryCodec(BaseTestCase):
+    schema = GenericLittleEndianRowTableEntry.from_schema_specification(
+        name="test",
+        schema_specification=[{"name": "a", "size": 2},
+                              {"name": "b", "type": "bytearray", "size": 2},
+                              {"name": "c", "type": "boolean"},
+                              {"name": "d", "size": 1}],
+        hidden_columns=["d"])
+
+    def test_yml_rep(self):
+        assert_dict_equal(self.schema.to_yml_rep([0x1234, [1, 2], True, 5]), {"a": 0x1234, "b": [1, 2], "c": True})
+        assert_list_equal(self.schema.from_yml_rep({"a": 0x1234, "b": [1, 2], "c": True}), [0x1234, [1, 2], True, None])
+
+    def test_to_block(self):
+        block = Block()
+        block.from_list([0] * 6)
+        self.schema.to_block(block, 0, [0x1234, [1, 2], True, 5])
+        assert_list_equal(block.to_list(), [0x34, 0x12, 1, 2, 1, 5])
+        assert_list_equal(self.schema.from_block(block, 0), [0x1234, [1, 2], True, 5])
+
+    def test_to_block_invalid_byte_list(self):
+        block = Block()
+        block.from_list([0] * 6)
+        try:
+            self.schema.to_block(block, 0, [0x1234, [1, 2, 3], True, 5])
+            assert False
+        except TableError as e:
+            assert_equal(e.field, "b")
+
+    def test_table_from_yml_rep_error(self):
+        table = Table(schema=self.schema, num_rows=3)
+        yml_rep = dict((i, {"a": i, "b": [i, i], "c": False}) for i in range(3))
+        yml_rep[2]["c"] = 1
+        try:
+            table.from_yml_rep(yml_rep)
+            assert False
+        except TableError as e:
+            assert_equal(e.entry, 2)
+            assert_equal(e.field, "c")
+
+
 class TestBitfieldTableEntry(BaseTestCase):
     enumeration_class = GenericEnum.create(name="test", values=["a", "b", "c"])
     entry_class = BitfieldTableEntry.create(name="test", enumeration_class=enumeration_class, size=1)
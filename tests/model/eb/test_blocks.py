@@ -0,0 +1,132 @@
+import array
+import os
+import shutil
+import tempfile
+
+from nose.tools import assert_equal, assert_list_equal, assert_less_equal, assert_raises
+
+from coilsnake.exceptions.common.exceptions import InvalidArgumentError
+from coilsnake.exceptions.eb.exceptions import InvalidEbCompressedDataError
+from coilsnake.model.eb.blocks import EbCompressibleBlock, CompressionReport
+from coilsnake.modules.eb.EbModule import COMPRESSION_LEVELS, compress, decompress, decompress_many, \
+    get_compression_codec, set_compression_codec
+from coilsnake.util.common.cache import DiskCache
+from tests.coilsnake_test import BaseTestCase, TEST_DATA_DIR
+
+
+class TestEbCompressibleBlock(BaseTestCase):
+    def setup(self):
+        with open(os.path.join(TEST_DATA_DIR, "binaries", "compressible.bin"), "rb") as f:
+            self.uncompressed_data = list(bytearray(f.read()))
+        # Data which needs every type of compression command
+        self.mixed_data = [(i * 37) % 251 for i in range(300)]
+        self.mixed_data += [7] * 10 + [1, 2] * 8 + range(20, 40)
+        self.mixed_data += self.mixed_data[50:90] + self.mixed_data[120:80:-1]
+        self.mixed_data += [int("{:08b}".format(x)[::-1], 2) for x in self.mixed_data[10:60]]
+
+    def compress_and_decompress(self, data, level):
+        block = EbCompressibleBlock()
+        block.from_list(data)
+        block.compress(level)
+        compressed_size = block.size
+
+        compressed_block = EbCompressibleBlock()
+        compressed_block.from_list(block.to_list() + [0] * 4)
+        block.from_compressed_block(compressed_block)
+        assert_list_equal(block.to_list(), data)
+        return compressed_size
+
+    def test_compress_levels(self):
+        assert_equal(self.compress_and_decompress(self.uncompressed_data, None), 58)
+        for data in [self.uncompressed_data, self.mixed_data, range(256) * 5, [0] * 0x4000]:
+            sizes = dict((level, self.compress_and_decompress(data, level)) for level in COMPRESSION_LEVELS)
+            assert_less_equal(sizes["optimal"], sizes["normal"])
+
+        # Data for which taking the first match found is far from the best choice
+        data = [((i * 7919) >> 3) & 3 for i in range(2000)]
+        assert_less_equal(self.compress_and_decompress(data, "optimal"),
+                          self.compress_and_decompress(data, "normal") / 2)
+
+    def test_compression_report(self):
+        report = CompressionReport()
+        EbCompressibleBlock.compression_report = report
+        try:
+            with report.recording("Test"):
+                self.compress_and_decompress(self.mixed_data, "optimal")
+                self.compress_and_decompress(self.mixed_data, "normal")
+            self.compress_and_decompress(self.uncompressed_data, "normal")
+        finally:
+            EbCompressibleBlock.compression_report = None
+
+        num_blocks, uncompressed_size, normal_size, compressed_size = report.entries["Test"]
+        assert_equal(num_blocks, 2)
+        assert_equal(uncompressed_size, 2 * len(self.mixed_data))
+        assert_equal(normal_size - compressed_size, report.get_bytes_saved())
+        assert_equal(report.entries["Other"], [1, len(self.uncompressed_data), 58, 58])
+
+    def test_compression_cache(self):
+        directory = tempfile.mkdtemp()
+        EbCompressibleBlock.compression_cache = DiskCache(directory, max_size=0x10000)
+        try:
+            for i in range(2):
+                assert_equal(self.compress_and_decompress(self.uncompressed_data, "normal"), 58)
+                assert_equal(len(os.listdir(directory)), 1)
+            # Each compression level is cached separately
+            self.compress_and_decompress(self.uncompressed_data, "optimal")
+            assert_equal(sum([len(files) for _, _, files in os.walk(directory)]), 2)
+        finally:
+            EbCompressibleBlock.compression_cache = None
+            shutil.rmtree(directory)
+
+    def test_compress_invalid_level(self):
+        block = EbCompressibleBlock()
+        block.from_list([0] * 16)
+        assert_raises(InvalidArgumentError, block.compress, "invalid")
+
+    def test_many_from_compressed_block(self):
+        first_block = EbCompressibleBlock()
+        first_block.from_list(self.mixed_data)
+        first_block.compress()
+        second_block = EbCompressibleBlock()
+        second_block.from_list(self.uncompressed_data)
+        second_block.compress()
+
+        compressed_block = EbCompressibleBlock()
+        compressed_block.from_list([0] * 3 + first_block.to_list() + second_block.to_list())
+        blocks = EbCompressibleBlock.many_from_compressed_block(compressed_block, [3 + first_block.size, 3])
+        assert_equal(len(blocks), 2)
+        assert_list_equal(blocks[0].to_list(), self.uncompressed_data)
+        assert_list_equal(blocks[1].to_list(), self.mixed_data)
+        assert_equal(blocks[1].size, len(self.mixed_data))
+
+    def test_from_invalid_compressed_block(self):
+        compressed_block = EbCompressibleBlock()
+        # An invalid command, and data which ends without a terminator
+        for data in [[0xfc, 0x00, 0xff], [0x03, 1, 2]]:
+            compressed_block.from_list(data)
+            assert_raises(InvalidEbCompressedDataError, EbCompressibleBlock().from_compressed_block,
+                          compressed_block, 0)
+        assert_raises(InvalidEbCompressedDataError, EbCompressibleBlock().from_compressed_block, compressed_block, 3)
+        assert_raises(InvalidEbCompressedDataError, EbCompressibleBlock.many_from_compressed_block,
+                      compressed_block, [0])
+
+    def test_compress_buffers(self):
+        data = array.array('B', self.mixed_data)
+        compressed_data = compress(data)
+        assert_equal(compressed_data, compress(bytearray(data)))
+        assert_equal(compressed_data, compress(data.tostring()))
+        assert_equal(decompress(compressed_data, 0), data)
+        assert_equal(decompress(bytearray(compressed_data), 0), data)
+        assert_equal(decompress_many(buffer(compressed_data), [0, 0]), [data, data])
+
+    def test_python_codec(self):
+        native_sizes = dict((level, self.compress_and_decompress(self.mixed_data, level))
+                            for level in COMPRESSION_LEVELS)
+        codec = get_compression_codec()
+        set_compression_codec("python")
+        try:
+            for level in COMPRESSION_LEVELS:
+                assert_equal(self.compress_and_decompress(self.mixed_data, level), native_sizes[level])
+        finally:
+            set_compression_codec(codec)
+        assert_raises(InvalidArgumentError, set_compression_codec, "invalid")
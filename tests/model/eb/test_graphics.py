@@ -1,9 +1,10 @@
 from array import array
 
+from PIL import Image
 from nose.tools import assert_equal, assert_raises, assert_list_equal, assert_false, assert_true, assert_is_instance, \
     assert_not_equal, assert_set_equal, nottest
 
-from coilsnake.exceptions.common.exceptions import InvalidArgumentError
+from coilsnake.exceptions.common.exceptions import InvalidArgumentError, InvalidUserDataError, OutOfBoundsError
 from coilsnake.model.common.blocks import Block
 from coilsnake.model.eb.graphics import EbGraphicTileset, EbTileArrangementItem, EbTileArrangement
 from coilsnake.model.eb.palettes import EbPalette, EbColor
@@ -389,6 +390,51 @@ class TestEbGraphicTileset(BaseTestCase, TilesetImageTestCase):
                                             0b01100000,
                                             0b11101110])
 
+    def test_block_round_trip_16x16_1bpp(self):
+        data = [(i * 37 + 11) & 0xff for i in range(64)]
+        block = Block()
+        block.from_list(data)
+        tileset = EbGraphicTileset(num_tiles=2, tile_width=16, tile_height=16)
+        tileset.from_block(block, offset=0, bpp=1)
+        # Each tile is stored as its left 8x16 half followed by its right 8x16 half
+        assert_list_equal(tileset[1][3], [int(x) for x in "{:08b}{:08b}".format(data[32 + 3], data[48 + 3])])
+
+        tileset.tiles[0] = [[(x + y) % 2 for x in range(16)] for y in range(16)]
+        tileset.to_block(block, offset=0, bpp=1)
+        assert_list_equal(block.to_list(), [0b01010101, 0b10101010] * 16 + data[32:])
+
+    def test_edit_tile_in_place(self):
+        block = Block()
+        block.from_list([0] * 16)
+        tileset = EbGraphicTileset(num_tiles=2, tile_width=8, tile_height=8)
+        tileset.from_block(block, offset=0, bpp=1)
+
+        tileset.tiles[0][0][7] = 1
+        tileset[0][1][6:8] = [1, 1]
+        tile = tileset[1]
+        tile[2] = [1] * 8
+        tile[2][0] = 0
+        assert_list_equal(tileset[0][0], [0, 0, 0, 0, 0, 0, 0, 1])
+        assert_list_equal(tileset[1][2], [0, 1, 1, 1, 1, 1, 1, 1])
+
+        tileset.to_block(block, offset=0, bpp=1)
+        assert_list_equal(block.to_list(), [0b00000001, 0b00000011] + [0] * 8 + [0b01111111] + [0] * 5)
+
+        assert_raises(InvalidArgumentError, tileset[0].__setitem__, 0, [1] * 7)
+        assert_raises(InvalidArgumentError, tileset[0][0].append, 1)
+
+    def test_from_block_16x8_2bpp(self):
+        block = Block()
+        block.from_list([0b11110000, 0b00001111] * 8)
+        tileset = EbGraphicTileset(num_tiles=1, tile_width=16, tile_height=8)
+        tileset.from_block(block, offset=0, bpp=2)
+        # Only the left 8 columns of tiles wider than 8 pixels are stored
+        assert_list_equal(tileset[0], [[1, 1, 1, 1, 2, 2, 2, 2] + [0] * 8] * 8)
+
+        block.from_list([0] * 16)
+        tileset.to_block(block, offset=0, bpp=2)
+        assert_list_equal(block.to_list(), [0b11110000, 0b00001111] * 8)
+
     def test_block_size(self):
         assert_equal(EbGraphicTileset(num_tiles=2, tile_width=8, tile_height=8).block_size(2), 32)
         assert_equal(EbGraphicTileset(num_tiles=10, tile_width=8, tile_height=8).block_size(2), 160)
@@ -552,6 +598,36 @@ class TestEbGraphicTileset(BaseTestCase, TilesetImageTestCase):
         assert_not_equal(tile2_id, tile1_id)
 
 
+    def test_hash(self):
+        tileset = EbGraphicTileset(num_tiles=2, tile_width=8, tile_height=8)
+        other_tileset = EbGraphicTileset(num_tiles=2, tile_width=8, tile_height=8)
+        tile = [[(x * y) % 4 for x in range(8)] for y in range(8)]
+        tileset.add_tile(tile)
+        other_tileset.add_tile(tile)
+        assert_equal(tileset, other_tileset)
+        assert_equal(tileset.hash(), other_tileset.hash())
+
+        other_tileset.clear_tile(0, color=1)
+        assert_not_equal(tileset.hash(), other_tileset.hash())
+
+    def test_add_tile_hash_collision(self):
+        tileset = EbGraphicTileset(num_tiles=5, tile_width=8, tile_height=8)
+        # The last rows of these tiles are different but have the same CRC32
+        tile1 = [array('B', [0] * 8)] * 7 + [array('B', "plumless")]
+        tile2 = [array('B', [0] * 8)] * 7 + [array('B', "buckeroo")]
+        tile1_id, tile1_vflip, tile1_hflip = tileset.add_tile(tile1)
+        tile2_id, tile2_vflip, tile2_hflip = tileset.add_tile(tile2)
+        assert_not_equal(tile2_id, tile1_id)
+        assert_list_equal(tileset[tile2_id][7], list(bytearray("buckeroo"[::-1])))
+
+    def test_add_tile_no_flip(self):
+        tileset = EbGraphicTileset(num_tiles=5, tile_width=8, tile_height=8)
+        tile = [[x for x in range(8)] for y in range(8)]
+        assert_equal(tileset.add_tile(tile, no_flip=True), (0, False, False))
+        assert_list_equal(tileset[0], tile)
+        assert_equal(tileset.add_tile([row[::-1] for row in tile], no_flip=True), (1, False, False))
+        assert_raises(InvalidArgumentError, tileset.add_tile, tile[1:])
+
 class TestEbTileArrangementItem(BaseTestCase):
     def test_init(self):
         arrangement_item = EbTileArrangementItem(tile=12, subpalette=3, is_vertically_flipped=False,
@@ -661,6 +737,39 @@ class TestEbTileArrangement(BaseTestCase, TilesetImageTestCase):
         assert_equal(arrangement[0, 1].subpalette, 2)
         assert_equal(arrangement[0, 1].tile, 0x3f5)
 
+    def test_to_block(self):
+        arrangement = EbTileArrangement(2, 1)
+        arrangement[0, 0].is_vertically_flipped = True
+        arrangement[0, 0].is_priority = True
+        arrangement[0, 0].subpalette = 7
+        arrangement[0, 0].tile = 0x120
+        arrangement[1, 0].is_horizontally_flipped = True
+        arrangement[1, 0].subpalette = 2
+        arrangement[1, 0].tile = 0x3f5
+
+        block = Block()
+        block.from_list([1] * 5)
+        arrangement.to_block(block, 1)
+        assert_equal(block[0], 1)
+        assert_equal(block.read_multi(1, 2), 0x8000 | 0x2000 | (7 << 10) | 0x120)
+        assert_equal(block.read_multi(3, 2), 0x4000 | (2 << 10) | 0x3f5)
+
+        other_arrangement = EbTileArrangement(2, 1)
+        assert_not_equal(arrangement, other_arrangement)
+        other_arrangement.from_block(block, 1)
+        assert_equal(arrangement, other_arrangement)
+        assert_equal(arrangement.hash(), other_arrangement.hash())
+        assert_equal(arrangement[1, 0], EbTileArrangementItem(tile=0x3f5, subpalette=2, is_horizontally_flipped=True))
+
+        arrangement[1, 0].is_horizontally_flipped = False
+        assert_false(arrangement[1, 0].is_horizontally_flipped)
+        assert_equal(arrangement[1, 0].tile, 0x3f5)
+        assert_not_equal(arrangement, other_arrangement)
+
+        assert_raises(InvalidArgumentError, setattr, arrangement[0, 0], "tile", 0x400)
+        assert_raises(InvalidArgumentError, setattr, arrangement[0, 0], "subpalette", 8)
+        assert_raises(OutOfBoundsError, arrangement.from_block, block, 2)
+
     def test_getitem(self):
         arrangement = EbTileArrangement(2, 1)
         assert_is_instance(arrangement[0, 0], EbTileArrangementItem)
@@ -741,6 +850,12 @@ class TestEbTileArrangement(BaseTestCase, TilesetImageTestCase):
         assert_equal(arrangement[3, 0].tile, 3)
         assert_equal(arrangement[3, 0].subpalette, 1)
 
+    def test_from_image_too_small(self):
+        palette = EbPalette(2, 4)
+        tileset = EbGraphicTileset(num_tiles=5, tile_width=8, tile_height=8)
+        arrangement = EbTileArrangement(width=5, height=1)
+        assert_raises(InvalidUserDataError, arrangement.from_image, self.tile_8x8_2bpp_3_img, tileset, palette)
+
     def test_to_image_single_subpalette(self):
         palette = EbPalette(1, 2)
         tileset = EbGraphicTileset(num_tiles=6, tile_width=8, tile_height=8)
@@ -748,4 +863,24 @@ class TestEbTileArrangement(BaseTestCase, TilesetImageTestCase):
         arrangement.from_image(self.tile_8x8_2bpp_2_img, tileset=tileset, palette=palette)
 
         new_image = arrangement.image(tileset, palette)
-        assert_images_equal(self.tile_8x8_2bpp_2_img, new_image)
\ No newline at end of file
+        assert_images_equal(self.tile_8x8_2bpp_2_img, new_image)
+    def test_to_image_flipped_with_subpalettes(self):
+        palette = EbPalette(2, 4)
+        tileset = EbGraphicTileset(num_tiles=1, tile_width=8, tile_height=8)
+        tileset.tiles = [[[(x + 2 * y) % 4 for x in range(8)] for y in range(8)]]
+        arrangement = EbTileArrangement(width=2, height=2)
+        arrangement[1, 0].is_horizontally_flipped = True
+        arrangement[0, 1].is_vertically_flipped = True
+        arrangement[0, 1].subpalette = 1
+        arrangement[1, 1].is_vertically_flipped = True
+        arrangement[1, 1].is_horizontally_flipped = True
+
+        image = Image.new("P", (16, 16))
+        arrangement.to_image(image, tileset, palette)
+        image_data = image.load()
+        for y in range(8):
+            for x in range(8):
+                assert_equal(image_data[x, y], tileset[0][y][x])
+                assert_equal(image_data[8 + x, y], tileset[0][y][7 - x])
+                assert_equal(image_data[x, 8 + y], tileset[0][7 - y][x] + 4)
+                assert_equal(image_data[8 + x, 8 + y], tileset[0][7 - y][7 - x])
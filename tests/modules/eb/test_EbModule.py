@@ -49,12 +49,10 @@ class TestEbModule(BaseTestCase):
         assert_equal(len(reuncompressed_data), len(uncompressed_data))
         assert_equal(reuncompressed_data, uncompressed_data)
 
-    @nottest
-    def _test_python_comp(self):
-        self.test_comp(EbModule._comp, EbModule.decomp)
+    def test_python_comp(self):
+        self.test_comp(EbModule._comp, EbModule._decomp)
 
-    @nottest
-    def _test_python_decomp(self):
+    def test_python_decomp(self):
         self.test_decomp(EbModule._decomp)
 
     def test_native_comp(self):
@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+
+from nose.tools import assert_equal, assert_list_equal, assert_is_none, assert_is_not_none, assert_not_equal
+
+from coilsnake.model.common.blocks import Rom
+from coilsnake.modules.common.GenericModule import GenericModule
+from coilsnake.modules.eb.CharacterSubstitutionsModule import CharacterSubstitutionsModule
+from coilsnake.modules.eb.EbModule import EbModule
+from coilsnake.ui.build_cache import BuildCache
+from coilsnake.ui.scheduler import compile_modules
+from coilsnake.util.common.project import Project
+from tests.coilsnake_test import BaseTestCase
+
+
+class AllocatingModule(GenericModule):
+    NAME = "Allocating"
+    num_writes = 0
+
+    def read_from_project(self, resource_open):
+        with resource_open(self.__class__.__name__, "txt") as f:
+            self.data = [int(x) for x in f.read().split()]
+
+    def write_to_rom(self, rom):
+        AllocatingModule.num_writes += 1
+        offset = rom.allocate(data=self.data)
+        rom[0] = offset
+
+
+class OtherAllocatingModule(AllocatingModule):
+    pass
+
+
+class OverwritingModule(GenericModule):
+    NAME = "Overwriting"
+
+    def read_from_project(self, resource_open):
+        with resource_open(self.__class__.__name__, "txt") as f:
+            self.value = int(f.read())
+
+    def write_to_rom(self, rom):
+        rom[1] = self.value
+
+
+class OtherOverwritingModule(OverwritingModule):
+    pass
+
+
+class TextModule(EbModule):
+    pass
+
+
+MODULES = [("test.AllocatingModule", AllocatingModule),
+           ("test.OtherAllocatingModule", OtherAllocatingModule)]
+
+
+class TestBuildCache(BaseTestCase):
+    def setup(self):
+        self.project_dir = tempfile.mkdtemp()
+        self.project = Project()
+        self.project.load(os.path.join(self.project_dir, "Project.snake"), romtype="Unknown")
+        self.write_resource("test.AllocatingModule", "AllocatingModule", "1 2 3")
+        self.write_resource("test.OtherAllocatingModule", "OtherAllocatingModule", "4 5")
+        AllocatingModule.num_writes = 0
+
+    def teardown(self):
+        shutil.rmtree(self.project_dir)
+
+    def write_resource(self, module_name, resource_name, data):
+        with self.project.get_resource(module_name, resource_name, "txt", "w") as f:
+            f.write(data)
+
+    def compile(self, modules=MODULES):
+        rom = Rom()
+        rom.from_list([0] * 32)
+        rom.deallocate((16, 31))
+        build_cache = BuildCache(project_path=self.project_dir, base_rom_digest="base")
+        compile_modules(modules, rom, self.project, build_cache=build_cache)
+        build_cache.save()
+        return rom
+
+    def test_reuse(self):
+        first_rom = self.compile()
+        assert_equal(AllocatingModule.num_writes, 2)
+        assert_equal(first_rom[0], 19)
+        assert_list_equal(first_rom[16:21].to_list(), [1, 2, 3, 4, 5])
+
+        second_rom = self.compile()
+        assert_equal(AllocatingModule.num_writes, 2)
+        assert_equal(first_rom, second_rom)
+        assert_equal(first_rom.unallocated_ranges, second_rom.unallocated_ranges)
+
+    def test_changed_resource(self):
+        self.compile()
+        build_cache = BuildCache(project_path=self.project_dir, base_rom_digest="base")
+        assert_is_not_none(build_cache.get_entry("test.AllocatingModule", AllocatingModule, self.project))
+        assert_is_none(BuildCache(project_path=self.project_dir, base_rom_digest="other base").get_entry(
+            "test.AllocatingModule", AllocatingModule, self.project))
+
+        # Changing the size of the first module's data moves the second module's data, so both must be rewritten
+        self.write_resource("test.AllocatingModule", "AllocatingModule", "1 2 3 6")
+        rom = self.compile()
+        assert_equal(AllocatingModule.num_writes, 4)
+        assert_equal(rom[0], 20)
+        assert_list_equal(rom[16:22].to_list(), [1, 2, 3, 6, 4, 5])
+
+    def test_replay_rewrites_unchanged_data(self):
+        modules = [("test.OverwritingModule", OverwritingModule),
+                   ("test.OtherOverwritingModule", OtherOverwritingModule)]
+        self.write_resource("test.OverwritingModule", "OverwritingModule", "5")
+        self.write_resource("test.OtherOverwritingModule", "OtherOverwritingModule", "5")
+        assert_equal(self.compile(modules)[1], 5)
+
+        # The second module's cached output has to overwrite what the first module now writes, even though it wrote
+        # the same value as the first module did last time
+        self.write_resource("test.OverwritingModule", "OverwritingModule", "7")
+        assert_equal(self.compile(modules)[1], 5)
+
+    def test_character_substitutions_changed(self):
+        with self.project.get_resource("eb.CharacterSubstitutionsModule", CharacterSubstitutionsModule.FILE, "yml",
+                                       "w") as f:
+            f.write("'~': '[B0]'\n")
+        build_cache = BuildCache(project_path=self.project_dir, base_rom_digest="base")
+        key = build_cache.get_key("test.TextModule", TextModule, self.project)
+
+        with self.project.get_resource("eb.CharacterSubstitutionsModule", CharacterSubstitutionsModule.FILE, "yml",
+                                       "w") as f:
+            f.write("'~': '[B0 B1]'\n")
+        assert_not_equal(build_cache.get_key("test.TextModule", TextModule, self.project), key)
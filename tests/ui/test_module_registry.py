@@ -0,0 +1,70 @@
+import os
+
+from nose.tools import assert_equal, assert_false, assert_list_equal, assert_raises, assert_true
+
+from coilsnake.exceptions.common.exceptions import CoilSnakeError
+from coilsnake.model.common.blocks import ROM_TYPE_NAME_UNKNOWN
+import coilsnake.modules
+from coilsnake.ui import module_registry
+from coilsnake.ui.module_registry import get_module_classes, get_module_manifest, get_module_names, \
+    import_module_class
+from coilsnake.util.common.cache import load_pickle
+from tests.coilsnake_test import BaseTestCase, TemporaryCacheDirectoryTestCase
+
+
+class TestModuleRegistry(BaseTestCase, TemporaryCacheDirectoryTestCase):
+    def test_manifest_matches_modules(self):
+        modules = get_module_classes()
+        assert_list_equal([name for name, _ in modules], get_module_names())
+
+        for module_name, lazy_class in modules:
+            module_class = import_module_class(module_name)
+            assert_equal(lazy_class.NAME, module_class.NAME)
+            assert_equal(lazy_class.__name__, module_class.__name__)
+            assert_list_equal(lazy_class.FREE_RANGES, list(module_class.FREE_RANGES))
+            assert_list_equal(lazy_class.DEPENDENCIES, list(module_class.DEPENDENCIES))
+            for romtype in ["Earthbound", "Super Mario Bros", ROM_TYPE_NAME_UNKNOWN]:
+                assert_equal(lazy_class.is_compatible_with_romtype(romtype),
+                             module_class.is_compatible_with_romtype(romtype))
+
+        module_name, lazy_class = modules[0]
+        assert_true(isinstance(lazy_class(), import_module_class(module_name)))
+
+    def test_manifest_is_cached(self):
+        manifest = get_module_manifest()
+        cache = load_pickle(os.path.join(self.temporary_cache_directory, "modules.pickle"))
+        assert_list_equal(cache["manifest"], manifest)
+
+        # A manifest whose key doesn't match is created again
+        original_get_sources_key = module_registry._get_sources_key
+        module_registry._get_sources_key = lambda: "changed"
+        try:
+            assert_list_equal(get_module_manifest(), manifest)
+        finally:
+            module_registry._get_sources_key = original_get_sources_key
+        assert_equal(load_pickle(os.path.join(self.temporary_cache_directory, "modules.pickle"))["key"], "changed")
+
+    def test_sources_key_ignores_compiled_files(self):
+        key = module_registry._get_sources_key()
+        # Creating the manifest imports every module, which may write their compiled files
+        filename = os.path.join(os.path.dirname(coilsnake.modules.__file__), "test_module_registry.pyc")
+        with open(filename, "wb"):
+            pass
+        try:
+            assert_equal(module_registry._get_sources_key(), key)
+        finally:
+            os.remove(filename)
+
+    def test_module_subset(self):
+        modules = get_module_classes(["eb.MiscTextModule"])
+        module_names = [name for name, _ in modules]
+        assert_true("eb.MiscTextModule" in module_names)
+        assert_true("eb.CccInterfaceModule" in module_names)
+        assert_true("eb.CharacterSubstitutionsModule" in module_names)
+        assert_false("eb.TilesetModule" in module_names)
+
+        # Modules are returned in the order in which they are run
+        all_module_names = get_module_names()
+        assert_list_equal(module_names, [x for x in all_module_names if x in module_names])
+
+        assert_raises(CoilSnakeError, get_module_classes, ["eb.InvalidModule"])
@@ -0,0 +1,177 @@
+from contextlib import contextmanager
+import os
+import shutil
+import tempfile
+
+from nose.tools import assert_equal, assert_list_equal, assert_raises
+
+from coilsnake.exceptions.common.exceptions import CoilSnakeError
+from coilsnake.model.common.blocks import Rom
+from coilsnake.model.common.table import Table, LittleEndianIntegerTableEntry
+from coilsnake.model.eb.table import EbStandardTextTableEntry
+from coilsnake.modules.common.GenericModule import GenericModule
+from coilsnake.modules.eb.CharacterSubstitutionsModule import CharacterSubstitutionsModule
+from coilsnake.modules.eb.EbModule import EbModule
+from coilsnake.ui.scheduler import compile_modules, decompile_modules, get_number_of_jobs, _get_dependency_names
+from coilsnake.util.common.project import Project
+from coilsnake.util.eb.text import CharacterSubstitutions
+from tests.coilsnake_test import BaseTestCase
+
+
+class ByteTableModule(GenericModule):
+    NAME = "Byte Table"
+    OFFSET = 0
+
+    def __init__(self):
+        super(ByteTableModule, self).__init__()
+        self.table = Table(schema=LittleEndianIntegerTableEntry.create("Byte", 1), num_rows=16)
+
+    def read_from_rom(self, rom):
+        self.table.from_block(rom, self.OFFSET)
+
+    def write_to_rom(self, rom):
+        self.table.to_block(rom, self.OFFSET)
+
+    def read_from_project(self, resource_open):
+        with resource_open(self.__class__.__name__, "yml") as f:
+            self.table.from_yml_file(f)
+
+    def write_to_project(self, resource_open):
+        with resource_open(self.__class__.__name__, "yml") as f:
+            self.table.to_yml_file(f)
+
+
+class FirstByteTableModule(ByteTableModule):
+    OFFSET = 0
+
+
+class SecondByteTableModule(ByteTableModule):
+    OFFSET = 16
+
+
+class ThirdByteTableModule(ByteTableModule):
+    OFFSET = 32
+    DEPENDENCIES = ["test.FirstByteTableModule"]
+
+
+class TextTableModule(EbModule):
+    NAME = "Text Table"
+
+    def __init__(self):
+        super(TextTableModule, self).__init__()
+        self.table = Table(schema=EbStandardTextTableEntry.create(4), num_rows=2)
+
+    def write_to_rom(self, rom):
+        self.table.to_block(rom, 0)
+
+    def read_from_project(self, resource_open):
+        with resource_open("TextTable", "yml") as f:
+            self.table.from_yml_file(f)
+
+
+class OtherTextTableModule(TextTableModule):
+    def write_to_rom(self, rom):
+        self.table.to_block(rom, 8)
+
+
+class CircularModule(GenericModule):
+    DEPENDENCIES = ["test.OtherCircularModule"]
+
+
+class OtherCircularModule(GenericModule):
+    DEPENDENCIES = ["test.CircularModule"]
+
+
+MODULES = [("test.FirstByteTableModule", FirstByteTableModule),
+           ("test.SecondByteTableModule", SecondByteTableModule),
+           ("test.ThirdByteTableModule", ThirdByteTableModule)]
+
+
+class TestScheduler(BaseTestCase):
+    def setup(self):
+        self.temporary_dir = tempfile.mkdtemp()
+        self.rom = Rom()
+        self.rom.from_list(range(48))
+
+    def teardown(self):
+        shutil.rmtree(self.temporary_dir)
+
+    def create_project(self, name):
+        project = Project()
+        project.load(os.path.join(self.temporary_dir, name, "Project.snake"), romtype="Unknown")
+        return project
+
+    def test_get_number_of_jobs(self):
+        assert_equal(get_number_of_jobs(None), 1)
+        assert_equal(get_number_of_jobs(-1), 1)
+        assert_equal(get_number_of_jobs(4), 4)
+        assert get_number_of_jobs(0) >= 1
+
+    def test_get_dependency_names(self):
+        assert_list_equal(_get_dependency_names(MODULES), ["test.FirstByteTableModule"])
+        assert_raises(CoilSnakeError, _get_dependency_names, [("test.CircularModule", CircularModule),
+                                                              ("test.OtherCircularModule", OtherCircularModule)])
+
+    def test_parallel_matches_sequential(self):
+        sequential_project = self.create_project("sequential")
+        parallel_project = self.create_project("parallel")
+        decompile_modules(MODULES, self.rom, sequential_project, jobs=1)
+        decompile_modules(MODULES, self.rom, parallel_project, jobs=3)
+
+        for module_name, module_class in MODULES:
+            assert_equal(sequential_project.get_resources(module_name), parallel_project.get_resources(module_name))
+            with sequential_project.get_resource(module_name, module_class.__name__, "yml", "r") as f:
+                sequential_data = f.read()
+            with parallel_project.get_resource(module_name, module_class.__name__, "yml", "r") as f:
+                assert_equal(sequential_data, f.read())
+
+        sequential_rom = Rom()
+        sequential_rom.from_list([0] * 48)
+        parallel_rom = Rom()
+        parallel_rom.from_list([0] * 48)
+        compile_modules(MODULES, sequential_rom, sequential_project, jobs=1)
+        compile_modules(MODULES, parallel_rom, parallel_project, jobs=3)
+        assert_list_equal(sequential_rom.to_list(), range(48))
+        assert_list_equal(parallel_rom.to_list(), range(48))
+
+    def test_parallel_character_substitutions(self):
+        modules = [("eb.CharacterSubstitutionsModule", CharacterSubstitutionsModule),
+                   ("test.TextTableModule", TextTableModule),
+                   ("test.OtherTextTableModule", OtherTextTableModule)]
+        project = self.create_project("project")
+        with project.get_resource("eb.CharacterSubstitutionsModule", "Fonts/character_substitutions", "yml",
+                                  "wb") as f:
+            f.write("'~': '[B0]'\n")
+        for module_name, _ in modules[1:]:
+            with project.get_resource(module_name, "TextTable", "yml", "wb") as f:
+                f.write("0: ab~\n1: '~'\n")
+
+        roms = []
+        try:
+            for jobs in [1, 2]:
+                CharacterSubstitutions.character_substitutions = dict()
+                rom = Rom()
+                rom.from_list([0] * 16)
+                compile_modules(modules, rom, project, jobs=jobs)
+                roms.append(rom.to_list())
+        finally:
+            CharacterSubstitutions.character_substitutions = dict()
+
+        assert_list_equal(roms[0][:8], [0x91, 0x92, 0xb0, 0, 0xb0, 0, 0, 0])
+        assert_list_equal(roms[0], roms[1])
+
+    def test_write_context(self):
+        project = self.create_project("project")
+        decompile_modules(MODULES, self.rom, project)
+        written_module_names = []
+
+        @contextmanager
+        def write_context(module_class):
+            written_module_names.append(module_class.__name__)
+            yield
+
+        rom = Rom()
+        rom.from_list([0] * 48)
+        compile_modules(MODULES, rom, project, jobs=2, write_context=write_context)
+        assert_list_equal(written_module_names, ["FirstByteTableModule", "SecondByteTableModule",
+                                                 "ThirdByteTableModule"])
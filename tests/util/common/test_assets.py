@@ -0,0 +1,53 @@
+import os
+
+import yaml
+from nose.tools import assert_equal, assert_list_equal, assert_not_equal, assert_raises
+
+from coilsnake.util.common import assets
+from coilsnake.util.common.assets import load_asset_index, open_asset
+from coilsnake.util.common.cache import load_pickle, save_pickle
+from tests.coilsnake_test import BaseTestCase, TemporaryCacheDirectoryTestCase
+
+
+class TestAssetIndex(BaseTestCase, TemporaryCacheDirectoryTestCase):
+    def setup(self):
+        super(TestAssetIndex, self).setup()
+        assets._asset_indexes.clear()
+        with open_asset("romtypes.yml") as f:
+            self.rom_types = yaml.load(f, Loader=yaml.CSafeLoader)
+
+    def teardown(self):
+        assets._asset_indexes.clear()
+        super(TestAssetIndex, self).teardown()
+
+    def cache_filename(self):
+        return os.path.join(self.temporary_cache_directory, "assets", "romtypes.yml.0.pickle")
+
+    def test_load_asset_index(self):
+        index = load_asset_index(["romtypes.yml"])
+        assert_list_equal(index.keys(), self.rom_types.keys())
+        assert_equal(dict(index.iteritems()), self.rom_types)
+        assert_raises(KeyError, index.__getitem__, "Invalid ROM type")
+
+        # Each lookup returns a new copy of the value
+        type_name = self.rom_types.keys()[0]
+        index[type_name]["offset"] = -1
+        assert_equal(index[type_name], self.rom_types[type_name])
+
+    def test_load_asset_index_from_cache(self):
+        load_asset_index(["romtypes.yml"])
+        cache = load_pickle(self.cache_filename())
+        assert_equal(len(cache["entries"]), len(self.rom_types))
+
+        # The cached index is used as long as the asset has not changed
+        assets._asset_indexes.clear()
+        cache["entries"] = cache["entries"][:1]
+        save_pickle(self.cache_filename(), cache)
+        assert_equal(len(load_asset_index(["romtypes.yml"])), 1)
+
+        # The index is built again if the asset has changed
+        assets._asset_indexes.clear()
+        cache["digest"] = "0" * 32
+        save_pickle(self.cache_filename(), cache)
+        assert_equal(len(load_asset_index(["romtypes.yml"])), len(self.rom_types))
+        assert_not_equal(load_pickle(self.cache_filename())["digest"], "0" * 32)
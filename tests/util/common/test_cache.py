@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+
+from nose.tools import assert_equal, assert_is_none
+
+from coilsnake.util.common.cache import DiskCache, load_pickle, save_pickle
+from tests.coilsnake_test import BaseTestCase
+
+
+class TestDiskCache(BaseTestCase):
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_and_set(self):
+        cache = DiskCache(self.directory, max_size=1024)
+        assert_is_none(cache.get("abcdef"))
+        cache.set("abcdef", "value")
+        assert_equal(cache.get("abcdef"), "value")
+        assert_equal(DiskCache(self.directory, max_size=1024).get("abcdef"), "value")
+
+    def test_damaged_file(self):
+        cache = DiskCache(self.directory, max_size=1024)
+        cache.set("abcdef", "value")
+        with open(os.path.join(self.directory, "ab", "abcdef"), "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            f.write("x")
+        assert_is_none(cache.get("abcdef"))
+
+    def test_evict_least_recently_used(self):
+        cache = DiskCache(self.directory, max_size=200)
+        for i, key in enumerate(["aa1", "bb2", "cc3"]):
+            cache.set(key, "x" * 50)
+            os.utime(os.path.join(self.directory, key[:2], key), (i, i))
+        # Using the oldest file makes it the most recently used one
+        assert_equal(cache.get("aa1"), "x" * 50)
+
+        cache.set("dd4", "x" * 50)
+        assert_equal(cache.get("aa1"), "x" * 50)
+        assert_is_none(cache.get("bb2"))
+        assert_is_none(cache.get("cc3"))
+        assert_equal(cache.get("dd4"), "x" * 50)
+
+    def test_pickle(self):
+        filename = os.path.join(self.directory, "subdirectory", "test.pickle")
+        assert_equal(load_pickle(filename, default=5), 5)
+        save_pickle(filename, {"a": [1, 2]})
+        assert_equal(load_pickle(filename), {"a": [1, 2]})
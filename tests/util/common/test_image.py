@@ -0,0 +1,70 @@
+from functools import partial
+import os
+import shutil
+import tempfile
+
+from PIL import Image
+from nose.tools import assert_equal, assert_is_none, assert_list_equal, assert_raises
+
+from coilsnake.exceptions.common.exceptions import CoilSnakeError
+from coilsnake.util.common.image import read_images, write_images
+from tests.coilsnake_test import BaseTestCase
+
+
+def create_image(i):
+    image = Image.new("P", (16, 8), 0)
+    image.putdata([(i * x) % 16 for x in range(16 * 8)])
+    image.putpalette([x % 256 for x in range(48)])
+    return image
+
+
+class TestImageIo(BaseTestCase):
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def resource_open(self, directory, name, extension, mode):
+        filename = os.path.join(self.directory, directory, "{}.{}".format(name, extension))
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        return open(filename, mode)
+
+    def read_file(self, directory, name):
+        with self.resource_open(directory, name, "png", "rb") as f:
+            return f.read()
+
+    def test_write_images(self):
+        images = [(str(i), partial(create_image, i)) for i in range(20)]
+        write_images(partial(self.resource_open, "sequential", mode="wb"), images, num_threads=1, transparency=0)
+        write_images(partial(self.resource_open, "parallel", mode="wb"), images, num_threads=4, transparency=0)
+
+        for i in range(20):
+            assert_equal(self.read_file("sequential", str(i)), self.read_file("parallel", str(i)))
+
+    def test_read_images(self):
+        write_images(partial(self.resource_open, "images", mode="wb"),
+                     [(str(i), partial(create_image, i)) for i in range(20)])
+
+        for num_threads in [1, 4]:
+            images = read_images(partial(self.resource_open, "images", mode="rb"), [str(i) for i in range(20)],
+                                 num_threads=num_threads)
+            assert_list_equal([list(image.getdata()) for image in images],
+                              [list(create_image(i).getdata()) for i in range(20)])
+
+    def test_read_missing_images(self):
+        write_images(partial(self.resource_open, "images", mode="wb"), [("0", partial(create_image, 0))])
+        resource_open = partial(self.resource_open, "images", mode="rb")
+
+        images = list(read_images(resource_open, ["0", "1"], ignore_missing=True))
+        assert_list_equal(list(images[0].getdata()), list(create_image(0).getdata()))
+        assert_is_none(images[1])
+
+        assert_raises(IOError, read_images, resource_open, ["0", "1"])
+
+    def test_read_non_indexed_image(self):
+        with self.resource_open("images", "rgb", "png", "wb") as f:
+            Image.new("RGB", (8, 8)).save(f, "png")
+        images = read_images(partial(self.resource_open, "images", mode="rb"), ["rgb"], num_threads=2)
+        assert_raises(CoilSnakeError, list, images)
@@ -1,8 +1,13 @@
 import os
+import shutil
+import tempfile
 
-from nose.tools import assert_equal
+from nose.tools import assert_equal, assert_raises, assert_true
 
-from coilsnake.util.common.yml import replace_field_in_yml, convert_values_to_hex_repr
+from coilsnake.exceptions.common.exceptions import InvalidYmlFileError
+from coilsnake.util.common import yml
+from coilsnake.util.common.cache import DiskCache
+from coilsnake.util.common.yml import replace_field_in_yml, yml_dump, yml_load, HexInt
 from tests.coilsnake_test import BaseTestCase, TemporaryWritableFileTestCase, TEST_DATA_DIR, assert_files_equal
 
 
@@ -50,8 +55,52 @@ class TestReplaceFieldInYml(BaseTestCase, TemporaryWritableFileTestCase):
                 open(self.temporary_wo_file_name, "r"))
 
 
-def test_convert_values_to_hex_repr():
-    assert_equal(convert_values_to_hex_repr("ABC: 0", "ABC"), "ABC: 0x0")
-    assert_equal(convert_values_to_hex_repr("ABC: 55", "ABC"), "ABC: 0x37")
-    assert_equal(convert_values_to_hex_repr("ABC: 55", "ABCD"), "ABC: 55")
-    assert_equal(convert_values_to_hex_repr("A:\n  - {ABC: 16}", "ABC"), "A:\n  - {ABC: 0x10}")
\ No newline at end of file
+def test_yml_dump_hex_keys():
+    result = yml_dump({"ABC": 0}, default_flow_style=False, hex_keys=["ABC"])
+    assert_true(isinstance(result, str))
+    assert_equal(yml_dump({"ABC": 0}, default_flow_style=False, hex_keys=["ABC"]), "ABC: 0x0\n")
+    assert_equal(yml_dump({"ABC": 55}, default_flow_style=False, hex_keys=["ABC"]), "ABC: 0x37\n")
+    assert_equal(yml_dump({"ABC": 55}, default_flow_style=False, hex_keys=["ABCD"]), "ABC: 55\n")
+    assert_equal(yml_dump({"ABC": 55}, default_flow_style=False, hex_keys=["BC"]), "ABC: 55\n")
+    assert_equal(yml_dump({"A": [{"ABC": 16}]}, default_flow_style=None, hex_keys=["ABC"]), "A:\n- {ABC: 0x10}\n")
+    assert_equal(yml_dump({"ABC": [16], "DEF": True, "GHI": -1, "JKL": "16"}, default_flow_style=False,
+                          hex_keys=["ABC", "DEF", "GHI", "JKL"]),
+                 "ABC:\n- 16\nDEF: true\nGHI: -1\nJKL: '16'\n")
+
+
+def test_yml_dump_hex_int():
+    assert_equal(yml_dump([HexInt(0x1234), 0x1234], default_flow_style=True), "[0x1234, 4660]\n")
+    assert_equal(yml_load(yml_dump({"ABC": 0x1234}, hex_keys=["ABC"])), {"ABC": 0x1234})
+
+
+class TestYmlCache(BaseTestCase):
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "test.yml")
+        yml.yml_cache = DiskCache(os.path.join(self.directory, "cache"), max_size=0x10000)
+
+    def teardown(self):
+        yml.yml_cache = None
+        shutil.rmtree(self.directory)
+
+    def load(self, contents):
+        with open(self.filename, "w") as f:
+            f.write(contents)
+        with open(self.filename, "r") as f:
+            return yml_load(f)
+
+    def test_yml_load(self):
+        assert_equal(self.load("0: {Name: abc, Value: 0x10}"), {0: {"Name": "abc", "Value": 16}})
+        assert_equal(len(os.listdir(os.path.join(self.directory, "cache"))), 1)
+
+        # A cached file is read from the cache, and the caller gets its own copy of it
+        yml_rep = self.load("0: {Name: abc, Value: 0x10}")
+        assert_equal(yml_rep, {0: {"Name": "abc", "Value": 16}})
+        yml_rep[0]["Name"] = "def"
+        assert_equal(self.load("0: {Name: abc, Value: 0x10}"), {0: {"Name": "abc", "Value": 16}})
+
+        # A changed file is parsed again
+        assert_equal(self.load("0: {Name: abc, Value: 0x11}"), {0: {"Name": "abc", "Value": 17}})
+
+    def test_yml_load_invalid(self):
+        assert_raises(InvalidYmlFileError, self.load, "0: {Name: @abc}")
@@ -1,8 +1,12 @@
+import random
+
 from nose.tools import assert_list_equal, assert_equal
 
 from coilsnake.model.common.blocks import Block
 from coilsnake.util.eb.graphics import read_1bpp_graphic_from_block, write_1bpp_graphic_to_block, \
-    read_2bpp_graphic_from_block, write_2bpp_graphic_to_block, write_4bpp_graphic_to_block, read_4bpp_graphic_from_block
+    read_2bpp_graphic_from_block, write_2bpp_graphic_to_block, write_4bpp_graphic_to_block, \
+    read_4bpp_graphic_from_block, read_8bpp_graphic_from_block, write_8bpp_graphic_to_block, read_bitplane_rows, \
+    write_bitplane_rows
 
 
 def test_read_1bpp_graphic_from_block():
@@ -481,4 +485,34 @@ def test_write_4bpp_graphic_to_block():
 
                           0b01100000,
                           0b11101110
-                      ])
\ No newline at end of file
+                      ])
+
+def test_bitplane_rows_match_single_tile_codecs():
+    random.seed(1)
+    readers = {1: read_1bpp_graphic_from_block,
+               2: read_2bpp_graphic_from_block,
+               4: read_4bpp_graphic_from_block,
+               8: read_8bpp_graphic_from_block}
+    writers = {1: write_1bpp_graphic_to_block,
+               2: write_2bpp_graphic_to_block,
+               4: write_4bpp_graphic_to_block,
+               8: write_8bpp_graphic_to_block}
+    for bpp in [1, 2, 4, 8]:
+        data = [random.randint(0, 255) for i in range(8 * bpp * 3)]
+        block = Block()
+        block.from_list(data)
+
+        rows = read_bitplane_rows(bytearray(data), bpp)
+        assert_equal(len(rows), 8 * 8 * 3)
+        for tile_id in range(3):
+            tile = [[0] * 8 for y in range(8)]
+            readers[bpp](source=block, target=tile, offset=tile_id * 8 * bpp)
+            assert_list_equal([list(bytearray(rows[offset:offset + 8]))
+                               for offset in range(tile_id * 64, tile_id * 64 + 64, 8)], tile)
+
+            written_block = Block()
+            written_block.from_list([0] * 8 * bpp)
+            writers[bpp](source=tile, target=written_block, offset=0)
+            assert_list_equal(written_block.to_list(), data[tile_id * 8 * bpp:(tile_id + 1) * 8 * bpp])
+
+        assert_list_equal(list(write_bitplane_rows(rows, bpp)), data)
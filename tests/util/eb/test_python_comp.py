@@ -0,0 +1,47 @@
+import os
+
+from nose.tools import assert_equal, assert_raises
+
+from coilsnake.util.eb import native_comp, python_comp
+from tests.coilsnake_test import TEST_DATA_DIR
+
+
+def get_test_data():
+    with open(os.path.join(TEST_DATA_DIR, "binaries", "compressible.bin"), "rb") as f:
+        compressible_data = f.read()
+    # Data which needs every type of compression command
+    mixed_data = [(i * 37) % 251 for i in range(300)]
+    mixed_data += [7] * 10 + [1, 2] * 8 + range(20, 40)
+    mixed_data += mixed_data[50:90] + mixed_data[120:80:-1]
+    mixed_data += [int("{:08b}".format(x)[::-1], 2) for x in mixed_data[10:60]]
+    return [compressible_data, str(bytearray(mixed_data)), str(bytearray([((i * 7919) >> 3) & 3 for i in range(2000)]))]
+
+
+def test_same_output_as_native():
+    for data in get_test_data():
+        for level in [python_comp.COMP_LEVEL_FAST, python_comp.COMP_LEVEL_NORMAL, python_comp.COMP_LEVEL_OPTIMAL]:
+            compressed_data = python_comp.compress(data, level)
+            assert_equal(compressed_data, native_comp.compress(data, level))
+            assert_equal(python_comp.decompress(compressed_data, 0), data)
+
+
+def test_decompress_many():
+    compressed_data = [native_comp.compress(data) for data in get_test_data()]
+    offsets = [0, len(compressed_data[0]), len(compressed_data[0]) + len(compressed_data[1])]
+    assert_equal(python_comp.decompress_many(bytearray("".join(compressed_data)), offsets), get_test_data())
+
+
+def test_decompress_invalid_data():
+    for data in ["\xfc\x00\xff", "\x03\x01\x02", "\xf3\xff\xff\xff\xff", "\xc3\x00\x00\xff"]:
+        assert_raises(ValueError, native_comp.decompress, data, 0)
+        assert_raises(ValueError, python_comp.decompress, data, 0)
+    assert_raises(IndexError, python_comp.decompress, "\xff", 1)
+    assert_raises(ValueError, python_comp.compress, "")
+    assert_raises(ValueError, python_comp.compress, "\x00", 3)
+
+
+def test_decompress_overlapping_copies():
+    # Copies of data which is still being written repeat it, as in the game
+    for data in ["\x01\x01\x02\x82\x00\x00\xff", "\x01\x01\x02\xa2\x00\x00\xff", "\x01\x01\x02\xc2\x00\x03\xff"]:
+        assert_equal(python_comp.decompress(data, 0), native_comp.decompress(data, 0))
+    assert_equal(python_comp.decompress("\x01\x01\x02\x82\x00\x00\xff", 0), "\x01\x02\x01\x02\x01")